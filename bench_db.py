@@ -0,0 +1,359 @@
+#-----------------------------------------------
+# bench_db.py
+#-----------------------------------------------
+# the module measures the performance of the program
+# every bench_xxx function works in a temporary directory, so the data files
+# in the working directory are not touched
+# usage:
+#       python bench_db.py              # run all the benchmarks
+#       python bench_db.py insert       # run bench_insert only
+#-----------------------------------------------
+
+import os
+import sys
+import time
+import struct
+import operator
+import tempfile
+import contextlib
+import io
+
+import ply.lex as lex
+import ply.yacc as yacc
+
+import common_db
+import block_db
+import buffer_db
+import wal_db
+import storage_db
+import lex_db
+import parser_db
+import codec_db
+import vector_db
+import prefetch_db
+import parallel_db
+
+
+BENCH_FIELD_LIST = [('name', 0, 10), ('age', 2, 4), ('city', 0, 10)]  # (field name, field type, field length)
+
+
+#-----------------------------
+# to generate rows for BENCH_FIELD_LIST
+#-------------------------------
+def make_rows(num_of_rows):
+    for i in range(num_of_rows):
+        yield ['name%d' % i, str(i % 100), 'city%d' % (i % 37)]
+
+
+#-----------------------------
+# to run func in a temporary directory, the buffer pool is emptied before and after
+#-------------------------------
+def run_in_temp_dir(func, *args):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        try:
+            return func(*args)
+        finally:
+            pool = buffer_db.get_buffer_pool()
+            wal_db.get_wal().checkpoint()
+            wal_db.get_wal().close()
+            common_db.global_wal = None  # the log of the temporary directory
+            for file_name in list(pool.file_dict):
+                pool.drop_file(file_name)
+            os.chdir(old_dir)
+
+
+#-----------------------------
+# to create a table quietly, the messages of Storage are not printed
+#-------------------------------
+def open_table(table_name, field_list=BENCH_FIELD_LIST):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return storage_db.Storage(table_name, field_list)
+
+
+def timed(func, *args):
+    begin = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - begin, result
+
+
+#-----------------------------
+# insert_record row by row against insert_many
+#-------------------------------
+def bench_insert(num_of_rows=50000):
+    def one_by_one():
+        table = open_table('row')
+        for row in make_rows(num_of_rows):
+            table.insert_record(row)
+
+    def bulk():
+        table = open_table('bulk')
+        table.insert_many(make_rows(num_of_rows))
+
+    row_time, _ = timed(one_by_one)
+    bulk_time, _ = timed(bulk)
+    print('insert %d rows: insert_record %.3fs (%d rows/s), insert_many %.3fs (%d rows/s), speedup %.2fx' % (
+        num_of_rows, row_time, num_of_rows / row_time, bulk_time, num_of_rows / bulk_time, row_time / bulk_time))
+
+
+#-----------------------------
+# insert_record with different group commit sizes of the write-ahead log
+#-------------------------------
+def bench_group_commit(num_of_rows=5000):
+    for group_size in [1, 8, 32, 128]:
+        wal = wal_db.get_wal()
+        wal.group_size, wal.window, wal.num_of_syncs = group_size, 1.0, 0
+        table = open_table('group%d' % group_size)
+        row_time, _ = timed(lambda: [table.insert_record(row) for row in make_rows(num_of_rows)])
+        print('group commit size %3d: %d rows/s, %d syncs' % (group_size, num_of_rows / row_time, wal.num_of_syncs))
+
+
+#-----------------------------
+# the lexer and the parser built for every query against built once with cached LALR tables
+#-------------------------------
+def bench_parser(num_of_queries=200):
+    sql_str = 'select people.name,orders.amount from people,orders where people.age = orders.pid'
+    table_file = os.path.join(os.getcwd(), 'parsetab_db.pickle')
+
+    def build_handles():
+        common_db.global_lexer = None
+        common_db.global_parser = None
+        lex_db.set_lex_handle()
+        parser_db.set_handle(table_file)
+
+    def rebuilt_every_query():
+        for i in range(num_of_queries):
+            common_db.global_lexer = lex.lex(module=lex_db)
+            common_db.global_parser = yacc.yacc(module=parser_db, write_tables=0, debug=False)
+            common_db.global_parser.parse(sql_str, lexer=common_db.global_lexer)
+
+    def built_once():
+        for i in range(num_of_queries):
+            lex_db.set_lex_handle()
+            parser_db.set_handle(table_file)
+            common_db.global_parser.parse(sql_str, lexer=common_db.global_lexer)
+
+    # the parser prints the syntax tree and PLY prints the warnings of the grammar
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        cold_time, _ = timed(build_handles)  # there is no table file yet
+        warm_time, _ = timed(build_handles)
+        rebuilt_time, _ = timed(rebuilt_every_query)
+        once_time, _ = timed(built_once)
+    common_db.global_lexer = None
+    common_db.global_parser = None  # the handles of the table file in the temporary directory
+
+    print('parser start: %.2fms without the table file, %.2fms with the table file' % (
+        cold_time * 1000, warm_time * 1000))
+    print('%d queries: %.3fms per query when rebuilt, %.3fms per query when built once, speedup %.2fx' % (
+        num_of_queries, rebuilt_time * 1000 / num_of_queries, once_time * 1000 / num_of_queries,
+        rebuilt_time / once_time))
+
+
+#-----------------------------
+# the record codec of codec_db against the loops which build the struct formats for every record,
+# the records are kept in one buffer, so only the encoding and decoding are measured
+#-------------------------------
+def bench_codec(num_of_rows=100000):
+    codec = codec_db.get_codec(BENCH_FIELD_LIST)
+    row_list = list(make_rows(num_of_rows))
+    record_len = codec.head_len + codec.content_len
+    buf = bytearray(num_of_rows * record_len)
+    offset_list = range(0, len(buf), record_len)
+
+    def encode_by_format():
+        content_list = []
+        for row in row_list:
+            value_list = []
+            for (value, field) in zip(row, BENCH_FIELD_LIST):
+                value = str(value).strip()
+                if field[1] == 2:
+                    int(value)
+                value = value.encode('utf-8')
+                value_list.append(b' ' * (field[2] - len(value)) + value)
+            content_list.append(b''.join(value_list))
+        for (offset, content) in zip(offset_list, content_list):
+            struct.pack_into('!ii10s', buf, offset, struct.calcsize('!iii'), codec.content_len, b'2016-11-16')
+            struct.pack_into('!' + str(codec.content_len) + 's', buf, offset + struct.calcsize('!ii10s'), content)
+
+    def encode_by_codec():
+        for (offset, row) in zip(offset_list, row_list):
+            codec.write(buf, offset, codec.encode(row))
+
+    def decode_by_format():
+        record_list = []
+        for offset in offset_list:
+            head_len = struct.calcsize('!ii10s')
+            content = struct.unpack_from('!%ds' % codec.content_len, buf, offset + head_len)[0]
+            value_list = []
+            begin = 0
+            for field in BENCH_FIELD_LIST:
+                value = content[begin:begin + field[2]].strip()
+                if field[1] == 2:
+                    value = int(value)
+                value_list.append(value)
+                begin += field[2]
+            record_list.append(tuple(value_list))
+        return record_list
+
+    def decode_by_codec():
+        decoder = codec.get_decoder()
+        return [codec.decode(buf, offset, decoder) for offset in offset_list]
+
+    format_encode_time, _ = timed(encode_by_format)
+    codec_encode_time, _ = timed(encode_by_codec)
+    format_decode_time, format_records = timed(decode_by_format)
+    codec_decode_time, codec_records = timed(decode_by_codec)
+    if format_records != codec_records:
+        print('the records decoded by the codec are wrong')
+    print('encode %d rows: by format %d rows/s, by codec %d rows/s, speedup %.2fx' % (
+        num_of_rows, num_of_rows / format_encode_time, num_of_rows / codec_encode_time,
+        format_encode_time / codec_encode_time))
+    print('decode %d rows: by format %d rows/s, by codec %d rows/s, speedup %.2fx' % (
+        num_of_rows, num_of_rows / format_decode_time, num_of_rows / codec_decode_time,
+        format_decode_time / codec_decode_time))
+
+
+#-----------------------------
+# a full scan with a filter on an int field, record by record against vector_db.scan
+#-------------------------------
+def bench_vector_scan(num_of_rows=200000):
+    if vector_db.numpy is None:
+        print('vector scan: numpy is not installed')
+        return
+    table = open_table('vector')
+    table.insert_many(make_rows(num_of_rows))
+
+    row_time, row_records = timed(lambda: [record for record in table.cursor() if record[1] < 10])
+    vector_time, vector_records = timed(lambda: list(vector_db.scan(table, [(1, operator.lt, 10, None)])))
+    if row_records != vector_records:
+        print('the records of the vector scan are wrong')
+    print('scan %d rows where age < 10: by rows %d rows/s, by vectors %d rows/s, speedup %.2fx' % (
+        num_of_rows, num_of_rows / row_time, num_of_rows / vector_time, row_time / vector_time))
+
+
+#-----------------------------
+# write back blocks of a file, by seek and write on a file object against block_db.BlockFile.write_blocks
+#-------------------------------
+def bench_block_write(num_of_blocks=4096):
+    page_list = [bytes([i % 256]) * common_db.BLOCK_SIZE for i in range(num_of_blocks)]
+
+    def write_by_seek():
+        with open('seek.dat', 'wb+') as f_handle:
+            for (block_id, page) in enumerate(page_list):
+                f_handle.seek(block_id * common_db.BLOCK_SIZE)
+                f_handle.write(page)
+
+    block_file = block_db.BlockFile('block.dat')
+    seek_time, _ = timed(write_by_seek)
+    block_time, _ = timed(block_file.write_blocks, list(enumerate(page_list)))
+    block_file.close()
+    with open('seek.dat', 'rb') as seek_file, open('block.dat', 'rb') as block_file_copy:
+        if seek_file.read() != block_file_copy.read():
+            print('the blocks written by write_blocks are wrong')
+    print('write %d blocks: by seek %.3fs, by write_blocks %.3fs in %d calls, speedup %.2fx' % (
+        num_of_blocks, seek_time, block_time, block_file.write_calls, seek_time / block_time))
+
+
+#-----------------------------
+# a full scan of a cold file, i.e. a file out of the page cache, without and with the read-ahead thread
+# the scans are run twice
+#   (1) on the file itself, which is dropped from the page cache by posix_fadvise on linux
+#   (2) on a simulated disk, every read of block_db.BlockFile waits for SIMULATED_READ_LATENCY
+#       and SIMULATED_READ_RATE, and the synchronous scan reads each block before it decodes it
+#-------------------------------
+SIMULATED_READ_LATENCY = 0.0001  # seconds per read call
+SIMULATED_READ_RATE = 100 * 1024 * 1024  # bytes per second
+
+
+def bench_read_ahead(num_of_rows=400000):
+    table = open_table('ahead')
+    table.insert_many(make_rows(num_of_rows))
+    pool = buffer_db.get_buffer_pool()
+    end_block = table.data_block_num + 1
+
+    def drop_cache():
+        pool.sync_all()
+        for file_name in list(pool.file_dict):
+            pool.drop_file(file_name)  # the frames and the map of the table are dropped too
+        if hasattr(os, 'posix_fadvise'):
+            fd = os.open(table.file_name, os.O_RDONLY)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            os.close(fd)
+
+    def scan_by_cursor(read_ahead):
+        drop_cache()
+        prefetch_db.READ_AHEAD = read_ahead
+        try:
+            return timed(lambda: [record for record in table.cursor() if record[1] < 10])
+        finally:
+            prefetch_db.READ_AHEAD = False
+
+    def scan_by_reads(read_ahead):
+        drop_cache()
+        block_file = pool.get_handle(pool.normalize(table.file_name))
+        if read_ahead:
+            block_iter = prefetch_db.read_ahead(pool, table.file_name, 1, end_block)
+        else:
+            block_iter = ((block_id, block_file.read_block(block_id)) for block_id in range(1, end_block))
+        return timed(lambda: [record for (block_id, page) in block_iter
+                              for record in table.read_block_records(block_id, None, False, page) if record[1] < 10])
+
+    sync_time, sync_records = scan_by_cursor(False)
+    ahead_time, ahead_records = scan_by_cursor(True)
+    if sync_records != ahead_records:
+        print('the records of the read-ahead scan are wrong')
+    print('cold scan of %d blocks: synchronous %.3fs, read ahead %.3fs, speedup %.2fx' % (
+        table.data_block_num, sync_time, ahead_time, sync_time / ahead_time))
+
+    pread = block_db.BlockFile.pread
+
+    def slow_pread(block_file, length, offset):
+        time.sleep(SIMULATED_READ_LATENCY + float(length) / SIMULATED_READ_RATE)  # the GIL is released as by a read
+        return pread(block_file, length, offset)
+
+    block_db.BlockFile.pread = slow_pread
+    try:
+        sync_time, sync_records = scan_by_reads(False)
+        ahead_time, ahead_records = scan_by_reads(True)
+    finally:
+        block_db.BlockFile.pread = pread
+    if sync_records != ahead_records:
+        print('the records of the read-ahead scan are wrong')
+    print('simulated disk scan of %d blocks: synchronous %.3fs, read ahead %.3fs, speedup %.2fx' % (
+        table.data_block_num, sync_time, ahead_time, sync_time / ahead_time))
+
+
+#-----------------------------
+# a full scan with a filter on an int field, by the cursor against parallel_db.scan
+#-------------------------------
+def bench_parallel_scan(num_of_rows=400000):
+    table = open_table('parallel')
+    table.insert_many(make_rows(num_of_rows))
+    check_list = [(1, operator.lt, 10, None)]
+    workers = parallel_db.PARALLEL_SCAN_WORKERS
+    if workers < 2:
+        parallel_db.PARALLEL_SCAN_WORKERS = 2  # the overhead of the workers is measured on one core
+    try:
+        parallel_db.get_process_pool()  # the processes are started before the scan is timed
+        serial_time, serial_records = timed(lambda: [record for record in table.cursor() if record[1] < 10])
+        parallel_time, parallel_records = timed(lambda: list(parallel_db.scan(table, check_list)))
+    finally:
+        parallel_db.shutdown_process_pool()
+        parallel_db.PARALLEL_SCAN_WORKERS = workers
+    if serial_records != parallel_records:
+        print('the records of the parallel scan are wrong')
+    print('scan %d rows where age < 10 on %d cores: serial %d rows/s, by %d workers %d rows/s, speedup %.2fx' % (
+        num_of_rows, os.cpu_count() or 1, num_of_rows / serial_time, max(workers, 2),
+        num_of_rows / parallel_time, serial_time / parallel_time))
+
+
+BENCH_DICT = {'insert': bench_insert, 'group_commit': bench_group_commit, 'parser': bench_parser,
+              'codec': bench_codec, 'vector_scan': bench_vector_scan, 'block_write': bench_block_write,
+              'read_ahead': bench_read_ahead, 'parallel_scan': bench_parallel_scan}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCH_DICT)
+    for name in names:
+        run_in_temp_dir(BENCH_DICT[name])
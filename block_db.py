@@ -0,0 +1,146 @@
+#-----------------------------------------------
+# block_db.py
+#-----------------------------------------------
+# the module reads and writes whole blocks of a file by their positions
+#   (1) a block is read by os.pread and written by os.pwrite, so an access is one system call
+#       and there is no file offset shared by the callers, e.g. the threads of a scan
+#   (2) the blocks written together are sorted and every run of consecutive blocks is
+#       written by one os.pwritev
+#   (3) the blocks beyond the end of the file are read as zeros
+# all the blocks of .dat, .ind and all.sch files are read and written by buffer_db.BufferPool
+# through this module
+# usage:
+#       block_file = BlockFile('people.dat')
+#       page = block_file.read_block(1)
+#       block_file.write_blocks([(1, page), (2, next_page)])
+#-----------------------------------------------
+
+import os
+import threading
+
+from common_db import BLOCK_SIZE
+
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')  # the most buffers of one vectored write
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+
+class BlockFile(object):
+
+    #------------------------------
+    # constructor of the class, the file is created if it does not exist
+    # input:
+    #       file_name
+    #-------------------------------------
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.fd = os.open(file_name, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        self.closed = False
+        self.lock = threading.Lock()  # only used where there is no os.pread, since the file offset is shared there
+        self.write_calls = 0  # the system calls which write blocks
+
+    def fileno(self):
+        return self.fd
+
+    # the number of bytes in the file
+    def size(self):
+        return os.fstat(self.fd).st_size
+
+    #------------------------------
+    # read a block
+    # input:
+    #       block_id
+    # output:
+    #       the bytes of the block, which are zeros beyond the end of the file
+    #-------------------------------------
+    def read_block(self, block_id):
+        data = self.pread(BLOCK_SIZE, block_id * BLOCK_SIZE)
+        if len(data) < BLOCK_SIZE:
+            data += bytes(BLOCK_SIZE - len(data))
+        return data
+
+    #------------------------------
+    # read consecutive blocks by one system call
+    # input:
+    #       block_id        : the first block
+    #       num_of_blocks
+    # output:
+    #       a list of the pages of the blocks which are in the file, each page is a memoryview
+    #       over the bytes read
+    #-------------------------------------
+    def read_blocks(self, block_id, num_of_blocks):
+        data = memoryview(self.pread(num_of_blocks * BLOCK_SIZE, block_id * BLOCK_SIZE))
+        return [data[begin:begin + BLOCK_SIZE] for begin in range(0, len(data) - BLOCK_SIZE + 1, BLOCK_SIZE)]
+
+    #------------------------------
+    # write a block
+    # input:
+    #       block_id
+    #       buf      : the page of the block, e.g. a bytearray of BLOCK_SIZE bytes
+    #-------------------------------------
+    def write_block(self, block_id, buf):
+        self.pwrite(buf, block_id * BLOCK_SIZE)
+
+    #------------------------------
+    # write some blocks, every run of consecutive blocks is written by one system call
+    # input:
+    #       block_list : a list of (block_id, buf)
+    #-------------------------------------
+    def write_blocks(self, block_list):
+        block_list = sorted(block_list, key=lambda block: block[0])
+        begin = 0
+        while begin < len(block_list):
+            end = begin + 1
+            while (end < len(block_list) and end - begin < IOV_MAX
+                   and block_list[end][0] == block_list[end - 1][0] + 1):
+                end += 1
+            self.pwritev([buf for (block_id, buf) in block_list[begin:end]], block_list[begin][0] * BLOCK_SIZE)
+            begin = end
+
+    #------------------------------
+    # the positional calls, they fall back on seek under the lock where os does not have them
+    #-------------------------------------
+    def pread(self, length, offset):
+        if hasattr(os, 'pread'):
+            return os.pread(self.fd, length, offset)
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            return os.read(self.fd, length)
+
+    def pwrite(self, buf, offset):
+        data = memoryview(buf)
+        while len(data) > 0:  # a write may be short
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(self.fd, data, offset)
+            else:
+                with self.lock:
+                    os.lseek(self.fd, offset, os.SEEK_SET)
+                    written = os.write(self.fd, data)
+            self.write_calls += 1
+            data = data[written:]
+            offset += written
+
+    def pwritev(self, buf_list, offset):
+        if len(buf_list) == 1 or not hasattr(os, 'pwritev'):
+            self.pwrite(b''.join(buf_list) if len(buf_list) > 1 else buf_list[0], offset)
+            return
+        total = sum(len(buf) for buf in buf_list)
+        written = os.pwritev(self.fd, buf_list, offset)
+        self.write_calls += 1
+        if written < total:  # the rest of a short write is written as one buffer
+            self.pwrite(b''.join(buf_list)[written:], offset + written)
+
+    #------------------------------
+    # sync the file to disk
+    #-------------------------------------
+    def sync(self):
+        os.fsync(self.fd)
+
+    def close(self):
+        if not self.closed:
+            os.close(self.fd)
+            self.closed = True
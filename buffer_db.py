@@ -0,0 +1,383 @@
+#-----------------------------------------------
+# buffer_db.py
+#-----------------------------------------------
+# the module is the buffer manager of the program
+# the blocks of .dat, .ind and all.sch files are read into frames of one
+# process-wide buffer pool and each frame is identified by (file_name, block_id)
+#   (1) a frame is pinned while it is used and unpinned after that
+#   (2) a modified frame is marked dirty and it is written back when it is
+#       evicted or when its file is flushed
+#   (3) an unpinned frame is evicted in LRU order when the pool is full
+#   (4) the changed bytes of dirty frames are appended to the write-ahead log
+#       of wal_db.py at every commit, and the log is synced before a dirty
+#       frame is written back to its file, a frame written back before its
+#       commit is logged with its bytes before the change too, so that the
+#       change can be undone at startup
+#   (5) the files are read and written by block_db.BlockFile, which has no shared file
+#       offset, and the dirty frames of a file are written back by vectored writes
+#   (6) the blocks which are only read, i.e. the data blocks read by scans and the nodes
+#       of indexes, are taken as memoryviews over a read-only mmap of the file by view,
+#       so they are neither copied into frames nor read by system calls
+#-----------------------------------------------
+
+import os
+import mmap
+import collections
+
+import block_db
+import common_db
+import wal_db
+from common_db import BLOCK_SIZE
+
+
+#-----------------------------
+# one frame of the buffer pool
+#-------------------------------
+class Frame(object):
+    def __init__(self, page):
+        self.page = page  # a bytearray of BLOCK_SIZE bytes
+        self.image = bytes(page)  # the content of the page when it was logged last time
+        self.pin_count = 0
+        self.dirty = False
+
+
+#-----------------------------
+# the ranges of bytes which differ in two pages of the same length, the pages are compared
+# segment by segment so that the changes at both ends of a data block are not logged as one range
+# output:
+#       a list of (begin, end)
+#-------------------------------
+LOG_SEGMENT_SIZE=512
+
+def changed_ranges(old_page, new_page):
+    range_list = []
+    for seg in range(0, len(new_page), LOG_SEGMENT_SIZE):
+        old_seg = old_page[seg:seg + LOG_SEGMENT_SIZE]
+        new_seg = new_page[seg:seg + LOG_SEGMENT_SIZE]
+        if old_seg == new_seg:
+            continue
+        diff = int.from_bytes(old_seg, 'big') ^ int.from_bytes(new_seg, 'big')
+        begin = seg + len(new_seg) - (diff.bit_length() + 7) // 8
+        end = seg + len(new_seg) - ((diff & -diff).bit_length() - 1) // 8
+        if range_list and range_list[-1][1] == seg and begin == seg:  # it goes on from the last segment
+            range_list[-1] = (range_list[-1][0], end)
+        else:
+            range_list.append((begin, end))
+    return range_list
+
+
+ZERO_PAGE=memoryview(bytes(BLOCK_SIZE))  # the view of a block beyond the end of its file
+
+
+class BufferPool(object):
+
+    #------------------------------
+    # constructor of the class
+    # input:
+    #       capacity: the maximum number of frames in the pool
+    #-------------------------------------
+    def __init__(self, capacity=common_db.BUFFER_POOL_CAPACITY):
+        self.capacity = capacity
+        self.frame_dict = collections.OrderedDict()  # (file_name,block_id)->Frame, the last one is the most recently used
+        self.file_dict = {}  # file_name->block_db.BlockFile
+        self.file_block_num = {}  # file_name->number of blocks, including the blocks which are not written back yet
+        self.unlogged = set()  # the keys of the frames modified since the last commit
+        self.map_dict = {}  # file_name->read-only mmap of the file, it is remapped when the file grows
+
+        # the following counters are used to size the pool
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        self.mapped = 0  # the misses served by the maps without frames
+
+    #------------------------------
+    # the file name is the key of frames, so bytes and str names must be the same key
+    #-------------------------------------
+    def normalize(self, file_name):
+        return os.fsdecode(file_name)
+
+    def get_handle(self, file_name):
+        if file_name not in self.file_dict or self.file_dict[file_name].closed:  # a handle may be closed at exit
+            self.file_dict[file_name] = block_db.BlockFile(file_name)
+            if file_name not in self.file_block_num:
+                self.file_block_num[file_name] = (self.file_dict[file_name].size() + BLOCK_SIZE - 1) // BLOCK_SIZE
+        return self.file_dict[file_name]
+
+    #------------------------------
+    # the number of blocks in the file, the dirty blocks in the pool are counted
+    # input:
+    #       file_name
+    #-------------------------------------
+    def get_num_of_blocks(self, file_name):
+        file_name = self.normalize(file_name)
+        self.get_handle(file_name)
+        return self.file_block_num[file_name]
+
+    #------------------------------
+    # pin a block in the pool, it is read from the file if it is not in the pool
+    # input:
+    #       file_name
+    #       block_id
+    # output:
+    #       the page of the block, which is a bytearray
+    #-------------------------------------
+    def pin(self, file_name, block_id):
+        file_name = self.normalize(file_name)
+        key = (file_name, block_id)
+        frame = self.frame_dict.get(key)
+        if frame is not None:
+            self.hits += 1
+            self.frame_dict.move_to_end(key)
+        else:
+            self.misses += 1
+            self.make_room()
+            file_map = self.get_map(file_name, block_id)
+            if file_map is not None:
+                page = bytearray(memoryview(file_map)[block_id * BLOCK_SIZE:(block_id + 1) * BLOCK_SIZE])
+            else:  # the block is at the end of the file or beyond it
+                page = bytearray(self.get_handle(file_name).read_block(block_id))
+            frame = Frame(page)
+            self.frame_dict[key] = frame
+        frame.pin_count += 1
+        return frame.page
+
+    #------------------------------
+    # read a block without pinning it, the block must not be modified through the result
+    # input:
+    #       file_name
+    #       block_id
+    #       page     : the block read ahead by prefetch_db, which is used if the block is not in the pool
+    # output:
+    #       the page of its frame if the block is in the pool, which may be dirty, or else a read-only
+    #       memoryview over the map of the file, it is valid until the file is changed by the pool
+    # note: the block is not put into the pool, so a block read by view does not evict other frames
+    #-------------------------------------
+    def view(self, file_name, block_id, page=None):
+        file_name = self.normalize(file_name)
+        key = (file_name, block_id)
+        frame = self.frame_dict.get(key)
+        if frame is not None:
+            self.hits += 1
+            self.frame_dict.move_to_end(key)
+            return frame.page
+
+        self.misses += 1
+        if page is not None:
+            return page
+        file_map = self.get_map(file_name, block_id)
+        if file_map is None:
+            return ZERO_PAGE
+        self.mapped += 1
+        return memoryview(file_map)[block_id * BLOCK_SIZE:(block_id + 1) * BLOCK_SIZE]
+
+    #------------------------------
+    # the map of a file which covers a block
+    # output:
+    #       a mmap, or None if the block is not wholly in the file
+    #-------------------------------------
+    def get_map(self, file_name, block_id):
+        f_handle = self.get_handle(file_name)
+        end = (block_id + 1) * BLOCK_SIZE
+        file_map = self.map_dict.get(file_name)
+        if file_map is None or len(file_map) < end:
+            if f_handle.size() < end:
+                return None
+            self.close_map(file_name)
+            file_map = self.map_dict[file_name] = mmap.mmap(f_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return file_map
+
+    def close_map(self, file_name):
+        file_map = self.map_dict.pop(file_name, None)
+        if file_map is not None:
+            try:
+                file_map.close()
+            except BufferError:  # a view is still alive, the map is unmapped when the view is released
+                pass
+
+    #------------------------------
+    # unpin a block, dirty is True if the page has been modified
+    #-------------------------------------
+    def unpin(self, file_name, block_id, dirty=False):
+        file_name = self.normalize(file_name)
+        frame = self.frame_dict[(file_name, block_id)]
+        if frame.pin_count > 0:
+            frame.pin_count -= 1
+        if dirty:
+            self.mark_dirty(file_name, block_id)
+
+    def mark_dirty(self, file_name, block_id):
+        file_name = self.normalize(file_name)
+        self.frame_dict[(file_name, block_id)].dirty = True
+        self.unlogged.add((file_name, block_id))
+        if block_id >= self.file_block_num[file_name]:
+            self.file_block_num[file_name] = block_id + 1
+
+    #------------------------------
+    # evict the least recently used unpinned frames until there is a free frame
+    #-------------------------------------
+    def make_room(self):
+        while len(self.frame_dict) >= self.capacity:
+            victim = None
+            for key, frame in self.frame_dict.items():
+                if frame.pin_count == 0:
+                    victim = key
+                    break
+            if victim is None:
+                print('all the frames in the buffer pool are pinned, the pool grows beyond', self.capacity)
+                return
+            self.write_frame(victim)
+            del self.frame_dict[victim]
+            self.evictions += 1
+
+    def write_frame(self, key):
+        self.write_frames([key])
+
+    #------------------------------
+    # write some frames back, the log is synced once before all of them and the dirty
+    # frames of a file are written by block_db.BlockFile.write_blocks
+    # input:
+    #       key_list : a list of (file_name, block_id)
+    #-------------------------------------
+    def write_frames(self, key_list):
+        block_dict = {}  # file_name->list of (block_id, frame)
+        for key in key_list:
+            frame = self.frame_dict[key]
+            if frame.dirty:
+                if key in self.unlogged:  # the frame is written back before its commit
+                    self.log_frame(key, True)
+                block_dict.setdefault(key[0], []).append((key[1], frame))
+        if not block_dict:
+            return
+        if common_db.global_wal is not None:
+            common_db.global_wal.sync()  # the log is always on disk before the blocks
+
+        for (file_name, block_list) in block_dict.items():
+            self.get_handle(file_name).write_blocks([(block_id, frame.page) for (block_id, frame) in block_list])
+            for (block_id, frame) in block_list:
+                frame.dirty = False
+            self.writes += len(block_list)
+
+    #------------------------------
+    # read or write bytes which may cross the boundary of blocks, it is used by all.sch
+    # input:
+    #       file_name
+    #       offset  : the position in the file
+    #-------------------------------------
+    def read_bytes(self, file_name, offset, length):
+        buf = bytearray()
+        while length > 0:
+            block_id, begin = divmod(offset, BLOCK_SIZE)
+            size = min(length, BLOCK_SIZE - begin)
+            page = self.pin(file_name, block_id)
+            buf.extend(page[begin:begin + size])
+            self.unpin(file_name, block_id)
+            offset += size
+            length -= size
+        return bytes(buf)
+
+    def write_bytes(self, file_name, offset, data):
+        data = bytes(data)
+        while data:
+            block_id, begin = divmod(offset, BLOCK_SIZE)
+            size = min(len(data), BLOCK_SIZE - begin)
+            page = self.pin(file_name, block_id)
+            page[begin:begin + size] = data[:size]
+            self.unpin(file_name, block_id, True)
+            offset += size
+            data = data[size:]
+
+    #------------------------------
+    # commit the frames modified since the last commit, their images are appended to the log
+    # and the log is synced by group, so the frames are not written back here
+    #-------------------------------------
+    def commit(self):
+        for key in sorted(self.unlogged):
+            self.log_frame(key)
+        wal_db.get_wal().commit()
+
+    #------------------------------
+    # append the changed bytes of a frame to the log
+    # input:
+    #       key     : (file_name, block_id)
+    #       undo    : whether the bytes before the change are appended too, the frame
+    #                 is going to be written back before its commit
+    #-------------------------------------
+    def log_frame(self, key, undo=False):
+        frame = self.frame_dict[key]
+        range_list = changed_ranges(frame.image, frame.page)
+        for (begin, end) in range_list:
+            if undo:
+                wal_db.get_wal().append_undo(key[0], key[1], begin, frame.image[begin:end])
+            wal_db.get_wal().append_page(key[0], key[1], begin, frame.page[begin:end])
+        if range_list:
+            frame.image = bytes(frame.page)
+        self.unlogged.discard(key)
+
+    #------------------------------
+    # write all the dirty frames of the file back to the file
+    #-------------------------------------
+    def flush_file(self, file_name):
+        file_name = self.normalize(file_name)
+        self.write_frames([k for k in self.frame_dict if k[0] == file_name])
+
+    def flush_all(self):
+        for file_name in list(self.file_dict):
+            self.flush_file(file_name)
+
+    #------------------------------
+    # write all the dirty frames back and sync the files to disk, it is used by the checkpoint
+    #-------------------------------------
+    def sync_all(self):
+        self.flush_all()
+        for f_handle in self.file_dict.values():
+            if not f_handle.closed:
+                f_handle.sync()
+
+    #------------------------------
+    # discard all the frames of the file and close it, it is called before a file is removed or truncated
+    #-------------------------------------
+    def drop_file(self, file_name):
+        file_name = self.normalize(file_name)
+        if common_db.global_wal is not None:
+            common_db.global_wal.checkpoint()  # the log must not bring the removed blocks back
+        for key in [k for k in self.frame_dict if k[0] == file_name]:
+            self.unlogged.discard(key)
+            del self.frame_dict[key]
+        self.close_map(file_name)
+        if file_name in self.file_dict:
+            self.file_dict[file_name].close()
+            del self.file_dict[file_name]
+        self.file_block_num.pop(file_name, None)
+
+    #------------------------------
+    # change the number of frames in the pool
+    #-------------------------------------
+    def resize(self, capacity):
+        self.capacity = capacity
+        self.make_room()
+
+    #------------------------------
+    # the hit and miss counters of the pool
+    # output:
+    #       a dictionary
+    #-------------------------------------
+    def get_stats(self):
+        requests = self.hits + self.misses
+        return {'capacity': self.capacity, 'frames': len(self.frame_dict), 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions, 'writes': self.writes,
+                'write_calls': sum(f_handle.write_calls for f_handle in self.file_dict.values()),
+                'mapped': self.mapped,
+                'hit_ratio': float(self.hits) / requests if requests else 0.0}
+
+    def show_stats(self):
+        print('buffer pool:', self.get_stats())
+
+
+#------------------------------------------
+# to get the global_buffer_pool in common_db.py, it is created at the first call
+#-------------------------------------------
+def get_buffer_pool():
+    if common_db.global_buffer_pool is None:
+        common_db.global_buffer_pool = BufferPool()
+    return common_db.global_buffer_pool
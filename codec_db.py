@@ -0,0 +1,202 @@
+#-----------------------------------------------
+# codec_db.py
+#-----------------------------------------------
+# the module turns the records of a table into the bytes of data blocks and back
+# the field list of a table is compiled once into a RecordCodec, which keeps
+#   (1) a struct.Struct with one field per column for the record content, so a record
+#       is unpacked by one call instead of slicing the content field by field
+#   (2) the converters of the fields, e.g. int for an int field
+#   (3) the decoders of the subsets of fields read by queries, the other fields are skipped
+#       by pad bytes of the struct
+#   (4) a format string which right-aligns all the fields of a record by one % operation,
+#       so a record of strings is encoded without a Python loop over its fields
+# the codecs are shared by all the Storage objects of tables with the same field list
+# usage:
+#       codec = get_codec(field_list)
+#       content = codec.encode(['xuyidan', '23', '123456'])
+#       record = codec.decode(page, offset, codec.get_decoder())
+#-----------------------------------------------
+
+import struct
+
+import common_db
+
+
+# structure of one record, see storage_db.py
+# -----------------------------
+# pointer|length of record content|time stamp of last update|field_0_value|...|field_n_value
+# note: every field value is stored in its field length, right-aligned with spaces
+# -----------------------------
+RECORD_HEAD_FORMAT='!ii10s'
+RECORD_SCHEMA_ADDRESS=struct.calcsize('!iii')  # the pointer to the table schema in block 0
+UPDATE_TIME=b'2016-11-16'
+
+
+# the converters from the bytes of a field to its value, by field type 0->str,1->varstr,2->int,3->bool
+# note: int() skips the spaces around the digits, so the int fields are not stripped
+CONVERTER_DICT={
+    0: bytes.strip,
+    1: bytes.strip,
+    2: int,
+    3: lambda value: bool(value.strip()),
+}
+
+
+class RecordCodec(object):
+
+    #------------------------------
+    # constructor of the class
+    # input:
+    #       field_list : a list of (field name, field type, field length)
+    #-------------------------------------
+    def __init__(self, field_list):
+        self.field_list = [(field[0], int(field[1]), int(field[2])) for field in field_list]
+        self.begin_list = []  # the position of every field in the record content
+        begin = 0
+        for field in self.field_list:
+            self.begin_list.append(begin)
+            begin += field[2]
+        self.content_len = begin
+
+        self.head_len = struct.calcsize(RECORD_HEAD_FORMAT)
+        self.content_struct = struct.Struct('!' + ''.join('%ds' % field[2] for field in self.field_list))
+        self.record_struct = struct.Struct(RECORD_HEAD_FORMAT + '%ds' % self.content_len)  # head and content
+        self.decoder_dict = {}  # tuple of field positions or None->decoder
+        self.content_format = ''.join('%%%ds' % field[2] for field in self.field_list)  # e.g. '%10s%4s'
+        self.int_index_list = [idx for (idx, field) in enumerate(self.field_list) if field[1] == 2]
+
+    #------------------------------
+    # the decoder of some fields, it is compiled at the first call
+    # input:
+    #       field_index_list : the positions of the fields to be decoded, None means all the fields
+    # output:
+    #       (unpack, converter list, order), order is None if the fields are in the order of the record
+    #-------------------------------------
+    def get_decoder(self, field_index_list=None):
+        key = None if field_index_list is None else tuple(field_index_list)
+        decoder = self.decoder_dict.get(key)
+        if decoder is None:
+            decoder = self.decoder_dict[key] = self.compile_decoder(key)
+        return decoder
+
+    def compile_decoder(self, field_index_list):
+        if field_index_list is None:
+            field_index_list = range(len(self.field_list))
+        index_list = sorted(set(field_index_list))
+
+        format_list = ['!']
+        end = 0
+        for idx in index_list:
+            if self.begin_list[idx] > end:  # the fields in between are skipped
+                format_list.append('%dx' % (self.begin_list[idx] - end))
+            format_list.append('%ds' % self.field_list[idx][2])
+            end = self.begin_list[idx] + self.field_list[idx][2]
+
+        converter_list = [CONVERTER_DICT[self.field_list[idx][1]] for idx in index_list]
+        order = [index_list.index(idx) for idx in field_index_list]
+        if order == list(range(len(index_list))):
+            order = None
+        return struct.Struct(''.join(format_list)).unpack_from, converter_list, order
+
+    #------------------------------
+    # decode the record beginning at offset of a data page
+    # input:
+    #       page    : the page of the data block
+    #       offset  : where the record head begins
+    #       decoder : returned by get_decoder
+    # output:
+    #       the record, which is a tuple
+    #-------------------------------------
+    def decode(self, page, offset, decoder):
+        unpack, converter_list, order = decoder
+        value_list = [convert(value) for (convert, value) in zip(converter_list, unpack(page, offset + self.head_len))]
+        if order is None:
+            return tuple(value_list)
+        return tuple(value_list[i] for i in order)
+
+    #------------------------------
+    # to check a record and turn it into the record content
+    # input:
+    #       insert_record : list of field values
+    # output:
+    #       the bytes of the record content, or None if the record is wrong
+    #-------------------------------------
+    def encode(self, insert_record):
+        if len(insert_record) != len(self.field_list):
+            return None
+
+        # the usual record is a list of str, e.g. a line of a csv file, which is formatted at once,
+        # the result has content_len bytes only if every value fits its field and is ASCII
+        try:
+            value_tuple = tuple(map(str.strip, insert_record))
+            for field_index in self.int_index_list:
+                int(value_tuple[field_index])
+            content = (self.content_format % value_tuple).encode('utf-8')
+            if len(content) == self.content_len:
+                return content
+        except TypeError:  # a value is not a str, e.g. bytes
+            pass
+        except ValueError:  # an int field is wrong
+            return None
+
+        value_list = [self.encode_field(field_index, value) for (field_index, value) in enumerate(insert_record)]
+        if None in value_list:
+            return None
+        return self.content_struct.pack(*value_list)
+
+    #------------------------------
+    # to check the value of one field and turn it into the bytes stored in the record
+    # input:
+    #       field_index : the position of the field
+    #       value       : the value given by the user, e.g. '23'
+    # output:
+    #       the bytes of the field, or None if the value is wrong or longer than the field
+    #-------------------------------------
+    def encode_field(self, field_index, value):
+        field = self.field_list[field_index]
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        value = str(value).strip()
+        if field[1] == 2:
+            try:
+                int(value)
+            except ValueError:
+                return None
+        value = value.encode('utf-8')
+        if len(value) > field[2]:
+            return None
+        return value.rjust(field[2])
+
+    #------------------------------
+    # the value of a field given by the user as it is decoded from the record, e.g. 23 for '23'
+    # output:
+    #       the value, or None if the value cannot be stored in the field
+    #-------------------------------------
+    def convert_field(self, field_index, value):
+        content = self.encode_field(field_index, value)
+        if content is None:
+            return None
+        return CONVERTER_DICT[self.field_list[field_index][1]](content)
+
+    #------------------------------
+    # write the head and the content of a record into a data page
+    # input:
+    #       page    : the page of the data block
+    #       offset  : where the record head begins
+    #       content : returned by encode
+    #-------------------------------------
+    def write(self, page, offset, content):
+        self.record_struct.pack_into(page, offset, RECORD_SCHEMA_ADDRESS, self.content_len, UPDATE_TIME, content)
+
+
+#------------------------------------------
+# to get the codec of a field list from global_codec_cache in common_db.py, it is compiled at the first call
+# input:
+#       field_list : a list of (field name, field type, field length)
+#-------------------------------------------
+def get_codec(field_list):
+    key = tuple((field[0], int(field[1]), int(field[2])) for field in field_list)
+    codec = common_db.global_codec_cache.get(key)
+    if codec is None:
+        codec = common_db.global_codec_cache[key] = RecordCodec(key)
+    return codec
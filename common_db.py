@@ -7,11 +7,22 @@
 # are used for all the program
 #--------------------------------------------------
 BLOCK_SIZE=4096 # the size of one block during reading files
+BUFFER_POOL_CAPACITY=256 # the number of blocks kept in the buffer pool
+PLAN_CACHE_CAPACITY=128 # the number of query plans kept in the plan cache
+RESULT_CACHE_SIZE=0 # the number of records kept in the query result cache, 0 turns the cache off
 
 global_lexer=None   # the global lex, which is filled in the moudle lex_db.py
 global_parser=None  # the global yacc, which is filled in the module yacc_db.py
 global_syn_tree=None # the global syntax tree, which is filled in parser_db.py
 global_logical_tree=None # global variable, which is to store the logical query plan tree
+global_buffer_pool=None # the global buffer pool, which is filled in the module buffer_db.py
+global_wal=None # the global write-ahead log, which is filled in the module wal_db.py
+global_plan_cache=None # the global plan cache, which is filled in the module plan_cache_db.py
+global_result_cache=None # the global query result cache, which is filled in the module query_plan_db.py
+global_table_versions={} # table name->version of the table, which is changed in the module storage_db.py
+global_index_version=0 # the version of the set of index files, which is changed in the module index_db.py
+global_codec_cache={} # field list->record codec, which is filled in the module codec_db.py
+global_process_pool=None # the worker processes of parallel scans, which is filled in the module parallel_db.py
 
 #-----------------------------
 # the following is the structure of tree node
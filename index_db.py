@@ -1,16 +1,18 @@
 '''
 index_db.py
-in this module, B tree is implemented
+in this module, B+ tree is implemented
 '''
 
 import struct
 
 # The 0 block stores the meta information of the tree
 '''
-block_id|has_root|num_of_levels|root_node_ptr
-# note: the root_node_ptr is a block id
+block_id|has_root|num_of_levels|root_node_ptr|num_of_blocks|field_name|field_type
+# note: the root_node_ptr is a block id, num_of_blocks is the number of blocks used in the index file
 '''
+META_FORMAT='!i?iii10si'
 MAX_NUM_OF_KEYS=200#the number of keys in each block
+FILL_FACTOR=0.8 # how full the nodes are when the index is built in one run
 
 
 
@@ -18,6 +20,7 @@ MAX_NUM_OF_KEYS=200#the number of keys in each block
 '''
 block_id|node_type|number_of_keys|key_0|ptr_0|...|key_i|ptr_i|...|key_n|ptr_n|...free space...|last_ptr
 note: for leaf node, ptr is a block id+entry id (8 bytes) except for the last one
+      the last_ptr is the block id of the next leaf node, so the leaves are linked from left to right
 '''
 LEAF_NODE_TYPE=1
 LEN_OF_LEAF_NODE=10+4+4  # key takes 10 bytes, block_id takes 4 bytes and offset takes 4 bytes
@@ -26,9 +29,12 @@ LEN_OF_LEAF_NODE=10+4+4  # key takes 10 bytes, block_id takes 4 bytes and offset
 # structure of internal node
 '''
 block_id|node_type|number_of_keys|key_0|ptr_0|key_1|ptr_1|...|key_n|ptr_n|...free space...|last_ptr|
-note: For internal node, ptr is just a block id( 4 bytes) 
+note: For internal node, ptr is just a block id( 4 bytes)
+      ptr_i points to the node whose keys are smaller than key_i, and last_ptr points to the node
+      whose keys are not smaller than key_n
 '''
 INTERNAL_NODE_TYPE=0
+LEN_OF_INTERNAL_NODE=10+4
 
 
 SPECIAL_INDEX_BLOCK_PTR=-1 # this is the last ptr for last leaf node when the next node is unknown
@@ -36,8 +42,12 @@ SPECIAL_INDEX_BLOCK_PTR=-1 # this is the last ptr for last leaf node when the ne
 
 
 import os
+import glob
+import bisect
 import common_db
 import ctypes
+import buffer_db
+import storage_db
 
 def test():
     my_dict={}
@@ -55,7 +65,44 @@ def test():
     (a,b)=my_list[0]
 
     print (a,b)
-    
+
+
+
+#-----------------------------
+# the index on field_name of table_name is stored in the file table_name.field_name.ind
+#--------------------------------
+def index_file_name(table_name,field_name):
+    return os.fsdecode(table_name).strip()+'.'+os.fsdecode(field_name).strip()+'.ind'
+
+
+#-----------------------------
+# the names of the indexed fields of a table
+# input
+#       table_name
+# output
+#       a list of field names (str)
+#--------------------------------
+def get_index_field_list(table_name):
+    prefix=os.fsdecode(table_name).strip()+'.'
+    return [name[len(prefix):-len('.ind')] for name in sorted(glob.glob(glob.escape(prefix)+'*.ind'))]
+
+
+#-----------------------------
+# turn a field value into a key of 10 bytes, the order of keys is the same as the order of values
+# input
+#       field_value
+#       field_type: 0->str,1->varstr,2->int,3->bool
+# note: a string longer than 10 bytes is cut, so the records found by the key must be checked again
+#--------------------------------
+def encode_key(field_value,field_type):
+    if field_type==2:
+        return struct.pack('!Q',int(field_value)+2**63).ljust(10,b'\x00')
+    if field_type==3:
+        return b'\x01'.ljust(10,b'\x00') if field_value else bytes(10)
+    if isinstance(field_value,str):
+        field_value=field_value.encode('utf-8')
+    return field_value.strip()[:10].ljust(10,b'\x00')
+
 
 
 class Index(object):
@@ -63,110 +110,235 @@ class Index(object):
     # constructor of the class
     # input
     #       tablename : the table to be indexed
+    #       field_name: the field to be indexed
     #-----------------------------------------
-    def __init__(self,tablename):
+    def __init__(self,tablename,field_name):
 
         print ("__init__ of ",Index.__name__)
-        tablename.strip()
-        if  not os.path.exists(tablename+'.ind'): # in this case, the index file does not exist
-            
-            print ('index file '+tablename+'.ind does not exist')
-            self.f_handle=open(tablename+'.ind','wb+')
-            print (tablename+'.ind has been created')
-            
-        else: # the index file exists and we read its first block
-            
-            self.f_handle=open(tablename+'.ind','rb+')
-            print ('index file '+tablename+'.ind has been opened')
+        if isinstance(tablename,bytes):
+            tablename=tablename.decode('utf-8')
+        if isinstance(field_name,bytes):
+            field_name=field_name.decode('utf-8')
+        self.table_name=tablename.strip()
+        self.field_name=field_name.strip()
+        self.file_name=index_file_name(self.table_name,self.field_name)
+        self.buffer_pool=buffer_db.get_buffer_pool() # the blocks of the index are read and written through the pool
+
+        self.has_root=False
+        self.num_of_levels=0
+        self.root_node_ptr=SPECIAL_INDEX_BLOCK_PTR
+        self.num_of_blocks=1
+        self.field_type=0
+        if  not os.path.exists(self.file_name): # in this case, the index file does not exist
+
+            print ('index file '+self.file_name+' does not exist')
+            self.buffer_pool.get_num_of_blocks(self.file_name) # the pool creates the file
+            print (self.file_name+' has been created')
             self.open=True
 
-            self.first_block_buf=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-            self.f_handle.seek(0)
-            self.first_block_buf=self.f_handle.read(common_db.BLOCK_SIZE)
+        else: # the index file exists and we read its first block
+
+            print ('index file '+self.file_name+' has been opened')
+            self.open=True
 
-            
+            if self.buffer_pool.get_num_of_blocks(self.file_name)>0:
+                self.first_block_buf=self.buffer_pool.read_bytes(self.file_name,0,struct.calcsize(META_FORMAT))
+                temp_block_id,self.has_root,self.num_of_levels,self.root_node_ptr,self.num_of_blocks,\
+                    temp_field_name,self.field_type=struct.unpack_from(META_FORMAT,self.first_block_buf,0)
 
 
-            # to view all the index entries
-            # to be inserted here
-            
+    #---------------------------------
+    # destructor of the class
+    #-----------------------------------
+    def __del__(self):
+        print ("__del__ of ",Index.__name__)
+        self.open=False
 
 
-  
-            
-            
+    #---------------------------------
+    # write the meta information into the block 0
+    #-----------------------------------
+    def write_meta(self):
+        meta_index_block=ctypes.create_string_buffer(struct.calcsize(META_FORMAT))
+        struct.pack_into(META_FORMAT,meta_index_block,0,0,self.has_root,self.num_of_levels,self.root_node_ptr,
+                         self.num_of_blocks,self.field_name.encode('utf-8')[:10],self.field_type)
+        self.buffer_pool.write_bytes(self.file_name,0,meta_index_block.raw)
 
-           
 
+    #---------------------------------
+    # read a node from the index file
+    # input
+    #       block_id
+    # output
+    #       node_type
+    #       key_list
+    #       ptr_list    : for leaf node each element is a tuple (block_id,offset_id), for internal node it is a block id
+    #       last_ptr
+    #-----------------------------------
+    def read_node(self,block_id):
+        current_index_block=self.buffer_pool.view(self.file_name,block_id) # the node is only read, so it is not pinned
+        current_node_type,current_num_of_keys=struct.unpack_from('!ii',current_index_block,struct.calcsize('!i'))
+        key_list=[]
+        ptr_list=[]
+        if current_node_type==LEAF_NODE_TYPE:
+            for i in range(current_num_of_keys):
+                current_key,block_ptr,current_offset=struct.unpack_from('!10sii',current_index_block,struct.calcsize('!iii')+i*LEN_OF_LEAF_NODE)
+                key_list.append(current_key)
+                ptr_list.append((block_ptr,current_offset))
+        else:
+            for i in range(current_num_of_keys):
+                current_key,current_ptr=struct.unpack_from('!10si',current_index_block,struct.calcsize('!iii')+i*LEN_OF_INTERNAL_NODE)
+                key_list.append(current_key)
+                ptr_list.append(current_ptr)
+        last_ptr,=struct.unpack_from('!i',current_index_block,common_db.BLOCK_SIZE-struct.calcsize('!i'))
+        return current_node_type,key_list,ptr_list,last_ptr
 
 
     #---------------------------------
-    # destructor of the class
+    # write a node into the index file
     #-----------------------------------
-    def __del__(self):
-        print ("__del__ of ",Index.__name__)
-        self.f_handle.close()
-        self.open=False
+    def write_node(self,block_id,node_type,key_list,ptr_list,last_ptr):
+        current_index_block=self.buffer_pool.pin(self.file_name,block_id)
+        current_index_block[:]=bytes(common_db.BLOCK_SIZE)
+        struct.pack_into('!iii',current_index_block,0,block_id,node_type,len(key_list))
+        for i in range(len(key_list)):
+            if node_type==LEAF_NODE_TYPE:
+                (current_id,current_offset)=ptr_list[i]
+                struct.pack_into('!10sii',current_index_block,struct.calcsize('!iii')+i*LEN_OF_LEAF_NODE,key_list[i],current_id,current_offset)
+            else:
+                struct.pack_into('!10si',current_index_block,struct.calcsize('!iii')+i*LEN_OF_INTERNAL_NODE,key_list[i],ptr_list[i])
+        struct.pack_into('!i',current_index_block,common_db.BLOCK_SIZE-struct.calcsize('!i'),last_ptr)
+        self.buffer_pool.unpin(self.file_name,block_id,True)
+
+
+    def new_block(self):
+        self.num_of_blocks+=1
+        return self.num_of_blocks-1
 
 
-    
     #-----------------------------
     # create index for all indexed items in one run
+    # the (key,(block_id,offset)) pairs of the table are sorted once and the leaves are packed
+    # from left to right, then each level of internal nodes is built on the level below it
+    # input
+    #       index_field : the field to be indexed, it is the field_name of the object if it is None
+    #       fill_factor : how full the nodes are
     #-----------------------------------
-    def create_index(self,index_field):
+    def create_index(self,index_field=None,fill_factor=FILL_FACTOR):
         print ('create_index begins to execute')
-        #field_value_address=[] # its element is a tuple (field_value,address)
-        # to be inserted here
+        if index_field is not None:
+            self.field_name=os.fsdecode(index_field).strip()
+
+        table_obj=storage_db.Storage(self.table_name)
+        field_names=[x[0].decode('utf-8').strip() for x in table_obj.getFieldList()]
+        if self.field_name not in field_names:
+            print ('there is no field',self.field_name,'in table',self.table_name)
+            self.buffer_pool.drop_file(self.file_name) # the empty index file is removed
+            os.remove(self.file_name)
+            return False
+        field_index=field_names.index(self.field_name)
+        self.field_type=table_obj.getFieldList()[field_index][1]
+
+        field_value_address=[] # its element is a tuple (field_value,address)
+        for (position,record) in table_obj.cursor([field_index],True):
+            field_value_address.append((encode_key(record[0],self.field_type),position))
+        field_value_address.sort()
+
+        # the old blocks are discarded
+        self.num_of_blocks=1
+        node_size=max(2,int(MAX_NUM_OF_KEYS*fill_factor))
+
+        # the leaves, each element of level is (first key of the node, block id)
+        level=[]
+        leaf_chunks=[field_value_address[i:i+node_size] for i in range(0,len(field_value_address),node_size)] or [[]]
+        leaf_ids=[self.new_block() for chunk in leaf_chunks]
+        for i in range(len(leaf_chunks)):
+            next_leaf=leaf_ids[i+1] if i+1<len(leaf_ids) else SPECIAL_INDEX_BLOCK_PTR
+            key_list=[x[0] for x in leaf_chunks[i]]
+            self.write_node(leaf_ids[i],LEAF_NODE_TYPE,key_list,[x[1] for x in leaf_chunks[i]],next_leaf)
+            level.append((key_list[0] if key_list else bytes(10),leaf_ids[i]))
+        self.num_of_levels=1
+
+        # the internal nodes, a node with n keys has n+1 children and each node has 2 children at least
+        while len(level)>1:
+            num_of_nodes=(len(level)+node_size)//(node_size+1)
+            upper_level=[]
+            begin=0
+            for i in range(num_of_nodes):
+                end=begin+len(level)//num_of_nodes+(1 if i<len(level)%num_of_nodes else 0)
+                children=level[begin:end]
+                block_id=self.new_block()
+                self.write_node(block_id,INTERNAL_NODE_TYPE,[x[0] for x in children[1:]],[x[1] for x in children[:-1]],children[-1][1])
+                upper_level.append((children[0][0],block_id))
+                begin=end
+            level=upper_level
+            self.num_of_levels+=1
+
+        self.has_root=True
+        self.root_node_ptr=level[0][1]
+        self.write_meta()
+        self.buffer_pool.commit()
+        common_db.global_index_version+=1 # the Storage objects of the table open the new index at their next change
+        if common_db.global_plan_cache is not None: # the cached plans do not know the new index
+            common_db.global_plan_cache.clear()
+        print (len(field_value_address),'index entries in',self.num_of_blocks-1,'blocks,',self.num_of_levels,'levels')
+        return True
 
     #-----------------------------
     # get the internal node to follow
     # input
     #       current_value:
     #       index_key_list:
-    #       index_ptr_list:
+    #       index_ptr_list: the ptrs of the internal node and its last_ptr
+    #       leftmost      : whether equal keys go to the left child, it is True when searching
     #output
     #       the block_id to follow
     #--------------------------------
-    def get_next_block_ptr(self,current_value,index_key_list,index_ptr_list):
-        ret_value=-1
+    def get_next_block_ptr(self,current_value,index_key_list,index_ptr_list,leftmost=False):
+        if leftmost:
+            ret_value=index_ptr_list[bisect.bisect_left(index_key_list,current_value)]
+        else:
+            ret_value=index_ptr_list[bisect.bisect_right(index_key_list,current_value)]
         return ret_value
 
-    
+
     #---------------------------------
     # insert the index entry into main memory list, which needs to determine the poistion
     # input
     #       inert_key
     #       insert_block_id
     #       insert_oofset
-    # output 
+    # output
     #       key_list
     #       ptr_list    : of which each element is a tuple (block_id,offset_id)
     def insert_key_value_into_leaf_list(self,insert_key,ptr_tuple,key_list,ptr_list):
-       
-        if len(key_list)>0:
-            pos=-1
-            for i in range(len(key_list)):
-                current_key=key_list[i]
-                if current_key==insert_key:
-                    pos=i
-                    break
-                elif current_key>insert_key:
-                    pos=i
-                    break
-
-            if pos==-1:
-                pos=len(key_list)-1
-
-            key_list.insert(pos,insert_key)           
-            ptr_list.insert(pos,ptr_tuple)                 
-                           
-        
-        elif len(key_list)==0:
-            key_list.append(insert_key)
-            ptr_list.append(ptr_tuple)
-            
-         
-        
+
+        pos=bisect.bisect_right(key_list,insert_key) # the equal keys are kept in insertion order
+        key_list.insert(pos,insert_key)
+        ptr_list.insert(pos,ptr_tuple)
+
+
+    #---------------------------------
+    # go down from the root to the leaf for a key
+    # input
+    #       key
+    #       leftmost: whether equal keys go to the left child
+    # output
+    #       the list of block ids from the root to the leaf
+    #-----------------------------------
+    def find_leaf_path(self,key,leftmost=False):
+        path=[]
+        next_node_ptr=self.root_node_ptr
+        for temp_count in range(self.num_of_levels-1):# to search through the internal nodes
+            path.append(next_node_ptr)
+            current_node_type,key_list,ptr_list,last_ptr=self.read_node(next_node_ptr)
+            if current_node_type!=INTERNAL_NODE_TYPE:
+                print ('the internal node type is wrong')
+                return []
+            next_node_ptr=self.get_next_block_ptr(key,key_list,ptr_list+[last_ptr],leftmost)
+        path.append(next_node_ptr)
+        return path
+
 
     #-------------------------------
     # to insert a index entry into the index file
@@ -174,150 +346,218 @@ class Index(object):
     #       field_value     # field value
     #       block_id        # block id
     #       offset          # offset in offset table, it is an integer
+    #       commit          # whether the change is committed, it is False when the caller commits it
     #--------------------------------------
 
-    def insert_index_entry(self,field_value,block_id,offset):
+    def insert_index_entry(self,field_value,block_id,offset,commit=True):
         print ('insert_index_entry begins to execute')
-        if len(field_value.strip())>0 and block_id>0 and offset>0:# the following is to insert an index entry into the index file
-            if len(self.first_block_buf.strip())==0:# there is no data in the index file
-                # to prepare the data in the index node, which is stored in block 1 
-                first_index_block=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-
-                #block_id|node_type|number_of_keys|key_0|ptr_0
-                struct.pack_into('!iii10sii',first_index_block,0,1,LEAF_NODE_TYPE,1,field_value,block_id,offset)
-                struct.pack_into('!i',first_index_block,common_db.BLOCK_SIZE-struct.calcsize('!i'),SPECIAL_INDEX_BLOCK_PTR)
-
-                
-
-                # to prepare the meta block node, which is stored in block 0
-                self.meta_index_block=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-                struct.pack_into('!i?ii',self.meta_index_block,0,0,True,1,1) #block_id,has_root,number of levels,root_node_ptr(block_id)
+        if block_id>0 and offset>=0:# the following is to insert an index entry into the index file
+            insert_key=encode_key(field_value,self.field_type)
+            if not self.has_root:# there is no data in the index file
+                # to prepare the data in the index node, which is stored in block 1
+                self.num_of_blocks=1
+                self.root_node_ptr=self.new_block()
+                self.write_node(self.root_node_ptr,LEAF_NODE_TYPE,[insert_key],[(block_id,offset)],SPECIAL_INDEX_BLOCK_PTR)
 
                 # record the meta information in the main memory data structures
                 self.has_root=True
-                self.number_of_levels=1
-                self.root_node_ptr=1
-
-
-                # the following is to write data to index file
-                self.f_handle.seek(0)
-                self.f_handle.write(self.meta_index_block)
-                self.f_handle.write(first_index_block)
-                self.f_handle.flush()
-                
-                
-               
+                self.num_of_levels=1
+
             else:# there is data in the file
-                self.meta_index_block=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-                self.f_handle.seek(0)
-                self.meta_index_block=self.f_handle.read(common_db.BLOCK_SIZE)
-
-                temp_block_id,self.has_root,self.num_of_levels,self.root_node_ptr=struct.unpack_from('!i?ii',self.meta_index_block,0)
-                if self.has_root==True and self.num_of_levels>0 and self.root_node_ptr>0:
-                    
-                    temp_count=0
-                    next_node_ptr=self.root_node_ptr
-                    
-                    while(temp_count<self.num_of_levels-1):# to search through the internal nodes
-                        
-                        current_index_block=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-                        read_pos=next_node_ptr*common_db.BLOCK_SIZE # the begining of the target block
-                        
-                        self.f_handle.seek(read_pos)
-                        current_index_block=self.f_handle.read(common_db.BLOCK_SIZE)
-                        current_node_type,current_num_of_keys=struct.unpack_from('!ii',current_index_block,struct.calcsize('!i'))
-
-                        if current_node_type!=INTERNAL_NODE_TYPE:
-                            print ('the internal node type is wrong')
-                            return
-
-                        if current_num_of_keys <=0:
-                            print ('the current_num_of_keys is wrong in internal node')
-                            return
-
-                        internal_key_list=[]
-                        internal_ptr_list=[]
-                        key_list=[]
-                        ptr_list=[]
-                        for i in range(current_num_of_keys):
-                            current_key,current_ptr=struct.unpack_from('!10si',current_index_block,struct.calcsize('!iii')+i*(10+4))
-                            internal_key_list.append(current_key)
-                            internal_ptr_list.append(current_ptr)
-                            
-                        last_ptr,=struct.unpack_from('!i',current_index_block,common_db.BLOCK_SIZE-4)
-                        ptr_list.append(last_ptr)
-                        
-                        # now it is to determine which path we should follow
-                        next_node_ptr= self.get_next_block_ptr(field_value, key_list, ptr_list)
-                        temp_count+=1
-                        
-                    # now it is at the leaf node
-                    current_index_block=ctypes.create_string_buffer(common_db.BLOCK_SIZE)
-                    read_pos=next_node_ptr*common_db.BLOCK_SIZE    # where the leaf node lies
-                    self.f_handle.seek(read_pos)
-                    
-                    current_index_block=self.f_handle.read(common_db.BLOCK_SIZE)
-                    current_node_type,current_num_of_keys=struct.unpack_from('!ii',current_index_block,struct.calcsize('!i'))
-                    
-                    if current_node_type==LEAF_NODE_TYPE:# it is leaf node
-                        if current_num_of_keys<MAX_NUM_OF_KEYS:# insert the value into the leaf node
-
-                            # the following is to read index entry into main memory list
-                            key_list=[]
-                            ptr_list=[]
-                            for i in range(current_num_of_keys):
-                                current_key,block_ptr,current_offset=struct.unpack_from('!10sii',current_index_block,struct.calcsize('!iii')+i*LEN_OF_LEAF_NODE)
-                                key_list.append(current_key)
-                                my_tuple=(block_ptr,current_offset)
-                                ptr_list.append(my_tuple)
-                            self.insert_key_value_into_leaf_list(field_value, my_tuple, key_list, ptr_list)
-
-                            # the following is to write the new index entry list to buffer
-                            for i in range(len(key_list)):
-                                curent_key=key_list[i]
-                                (current_id,current_offset)=ptr_list[i]
-                                struct.pack_into('!10sii',current_index_block,struct.calcsize('!iii')+i*LEN_OF_LEAF_NODE,current_key,current_id,current_offset)
-                                
-                            # change the nmber_of_keys
-                            current_num_of_keys+=1
-                            struct.pack_into('!i',current_index_block,8,current_num_of_keys)
-                            
-
-                            self.f_handle.seek(read_pos)
-                            self.f_handle.write(current_index_block)
-                            self.f_handle.flush()                       
-
-                            
-                            
-                            
-                            
-                            
-                        else:
-                            print ("the leaf node is full, we should split")
-                            
-                        
-                        
-                    else:
-                        print ('wrong, it is should be a leaf node')
-                    
-                    
-                else:
+                path=self.find_leaf_path(insert_key)
+                if not path:
                     print ('the information in the index file is wrong')
-                
-                
-            
-            
-            
-        
-        
+                    return
+
+                # now it is at the leaf node
+                leaf_ptr=path.pop()
+                current_node_type,key_list,ptr_list,last_ptr=self.read_node(leaf_ptr)
+                if current_node_type!=LEAF_NODE_TYPE:
+                    print ('wrong, it is should be a leaf node')
+                    return
+                self.insert_key_value_into_leaf_list(insert_key,(block_id,offset),key_list,ptr_list)
+
+                if len(key_list)<=MAX_NUM_OF_KEYS:# insert the value into the leaf node
+                    self.write_node(leaf_ptr,LEAF_NODE_TYPE,key_list,ptr_list,last_ptr)
+                else: # the leaf node is full, it is split and the right half goes to a new leaf
+                    mid=len(key_list)//2
+                    right_ptr=self.new_block()
+                    self.write_node(right_ptr,LEAF_NODE_TYPE,key_list[mid:],ptr_list[mid:],last_ptr)
+                    self.write_node(leaf_ptr,LEAF_NODE_TYPE,key_list[:mid],ptr_list[:mid],right_ptr)
+                    self.insert_into_parent(path,leaf_ptr,key_list[mid],right_ptr)
+
+            self.write_meta()
+            if commit:
+                self.buffer_pool.commit()
 
 
+    #-------------------------------
+    # to delete the index entry of a record from the index file
+    # input
+    #       field_value     # field value of the record
+    #       block_id        # block id
+    #       offset          # offset in offset table, it is an integer
+    #       commit          # whether the change is committed, it is False when the caller commits it
+    # output
+    #       True, or False if there is no such entry
+    # note: the leaf is not merged with its neighbours when it becomes small or empty, an empty leaf
+    #       stays in the chain of leaves and it is skipped by search and range_search
+    #--------------------------------------
+    def delete_index_entry(self,field_value,block_id,offset,commit=True):
+        if not self.has_root:
+            return False
+        delete_key=encode_key(field_value,self.field_type)
+        path=self.find_leaf_path(delete_key,True)
+        if not path:
+            return False
+        next_node_ptr=path[-1]
+        while next_node_ptr!=SPECIAL_INDEX_BLOCK_PTR: # the equal keys may go on in the next leaves
+            current_node_type,key_list,ptr_list,last_ptr=self.read_node(next_node_ptr)
+            pos=bisect.bisect_left(key_list,delete_key)
+            while pos<len(key_list) and key_list[pos]==delete_key:
+                if ptr_list[pos]==(block_id,offset):
+                    del key_list[pos]
+                    del ptr_list[pos]
+                    self.write_node(next_node_ptr,LEAF_NODE_TYPE,key_list,ptr_list,last_ptr)
+                    if commit:
+                        self.buffer_pool.commit()
+                    return True
+                pos+=1
+            if pos<len(key_list):
+                break
+            next_node_ptr=last_ptr
+        return False
+
+
+    #-------------------------------
+    # to insert the separator of a split node into its parent, the parent may be split in turn
+    # input
+    #       path        : the block ids from the root to the parent
+    #       left_ptr    : the node which is split
+    #       key         : the first key of the right node
+    #       right_ptr   : the new node
+    #--------------------------------------
+    def insert_into_parent(self,path,left_ptr,key,right_ptr):
+        if not path: # the root is split, so the tree grows by one level
+            new_root=self.new_block()
+            self.write_node(new_root,INTERNAL_NODE_TYPE,[key],[left_ptr],right_ptr)
+            self.root_node_ptr=new_root
+            self.num_of_levels+=1
+            return
+
+        parent_ptr=path.pop()
+        current_node_type,key_list,ptr_list,last_ptr=self.read_node(parent_ptr)
+        children=ptr_list+[last_ptr]
+        pos=children.index(left_ptr)
+        key_list.insert(pos,key)
+        children.insert(pos+1,right_ptr)
+
+        if len(key_list)<=MAX_NUM_OF_KEYS:
+            self.write_node(parent_ptr,INTERNAL_NODE_TYPE,key_list,children[:-1],children[-1])
+        else: # the key in the middle goes up, the keys on its right go to a new internal node
+            mid=len(key_list)//2
+            new_ptr=self.new_block()
+            self.write_node(new_ptr,INTERNAL_NODE_TYPE,key_list[mid+1:],children[mid+1:-1],children[-1])
+            self.write_node(parent_ptr,INTERNAL_NODE_TYPE,key_list[:mid],children[:mid],children[mid])
+            self.insert_into_parent(path,parent_ptr,key_list[mid],new_ptr)
+
+
+    #-------------------------------
+    # to find the records whose field value is equal to field_value
+    # input
+    #       field_value
+    # output
+    #       a generator of (block_id,offset), the leaves are read one at a time when the positions
+    #       are taken, so a caller which stops early does not read the rest of them
+    #--------------------------------------
+    def search(self,field_value):
+        if not self.has_root:
+            return
+        search_key=encode_key(field_value,self.field_type)
+        path=self.find_leaf_path(search_key,True)
+        if not path:
+            return
+        next_node_ptr=path[-1]
+        while next_node_ptr!=SPECIAL_INDEX_BLOCK_PTR: # the equal keys may go on in the next leaves
+            current_node_type,key_list,ptr_list,last_ptr=self.read_node(next_node_ptr)
+            pos=bisect.bisect_left(key_list,search_key)
+            while pos<len(key_list) and key_list[pos]==search_key:
+                yield ptr_list[pos]
+                pos+=1
+            if pos<len(key_list):
+                break
+            next_node_ptr=last_ptr
+
+
+    #-------------------------------
+    # to find the records whose field value is between low_value and high_value, both of them included
+    # the tree is descended once for low_value, then the leaves are walked through last_ptr
+    # input
+    #       low_value   : None means there is no lower bound
+    #       high_value  : None means there is no upper bound
+    #       descending  : whether the positions are returned from high_value down to low_value
+    # output
+    #       a generator of (block_id,offset) in the order of the field value, the leaves are read
+    #       one at a time when the positions are taken
+    # note: the keys of strings are cut to 10 bytes, so the records must be checked again by the caller
+    #--------------------------------------
+    def range_search(self,low_value=None,high_value=None,descending=False):
+        if not self.has_root:
+            return
+        low_key=bytes(10) if low_value is None else encode_key(low_value,self.field_type)
+        high_key=None if high_value is None else encode_key(high_value,self.field_type)
+        if descending:
+            for position in self.range_search_down(self.root_node_ptr,self.num_of_levels,low_key,high_key):
+                yield position
+            return
+        path=self.find_leaf_path(low_key,True)
+        if not path:
+            return
+        next_node_ptr=path[-1]
+        while next_node_ptr!=SPECIAL_INDEX_BLOCK_PTR:
+            current_node_type,key_list,ptr_list,last_ptr=self.read_node(next_node_ptr)
+            begin=bisect.bisect_left(key_list,low_key)
+            end=len(key_list) if high_key is None else bisect.bisect_right(key_list,high_key)
+            for position in ptr_list[begin:end]:
+                yield position
+            if end<len(key_list): # the next key is beyond high_value
+                break
+            next_node_ptr=last_ptr
+
+
+    #-------------------------------
+    # to walk a subtree from its last leaf to its first one, since the leaves are only linked forwards
+    # input
+    #       node_ptr        : the root of the subtree
+    #       num_of_levels   : the levels of the subtree
+    #       low_key
+    #       high_key        : None means there is no upper bound
+    # output
+    #       a generator of (block_id,offset) from high_key down to low_key
+    # note: the equal keys of a split node may be on both sides of its separator, so a child is
+    #       followed if its range, separators included, meets [low_key,high_key]
+    #--------------------------------------
+    def range_search_down(self,node_ptr,num_of_levels,low_key,high_key):
+        current_node_type,key_list,ptr_list,last_ptr=self.read_node(node_ptr)
+        if num_of_levels==1:
+            begin=bisect.bisect_left(key_list,low_key)
+            end=len(key_list) if high_key is None else bisect.bisect_right(key_list,high_key)
+            for pos in range(end-1,begin-1,-1):
+                yield ptr_list[pos]
+            return
+        children=ptr_list+[last_ptr]
+        first=bisect.bisect_left(key_list,low_key) # the children before it have keys below low_key
+        last=len(key_list) if high_key is None else bisect.bisect_right(key_list,high_key)
+        for i in range(last,first-1,-1):
+            for position in self.range_search_down(children[i],num_of_levels-1,low_key,high_key):
+                yield position
 
 
 
 # the following is to test
-index_obj=Index('all');
-index_obj.insert_index_entry('a',4,1)
+'''
+index_obj=Index('t1','f1')
+index_obj.create_index()
+print (list(index_obj.search('x')))
+'''
 #test()
-
-        
@@ -10,38 +10,101 @@
 import ply.lex as lex
 import common_db
 
-tokens=('SELECT','FROM','WHERE','AND','TCNAME','EQX','COMMA','CONSTANT','SPACE')
+tokens=('SELECT','FROM','WHERE','AND','EXPLAIN','ANALYZE','BETWEEN','GROUP','ORDER','BY','ASC','DESC','LIMIT',
+        'OFFSET','AGGFUNC','TCNAME','EQX','COMP','COMMA','LPAREN','RPAREN','STAR','CONSTANT','SPACE')
 
 # the following is to defining rules for each token
 def t_SELECT(t):
-    r'select'
+    r'select\b'
     return t
 
 def t_FROM(t):
-    r'from'
+    r'from\b'
     return t
 
 def t_WHERE(t):
-    r'where'
+    r'where\b'
     return t
 
 def t_AND(t):
-    r'and'
+    r'and\b'
+    return t
+
+def t_EXPLAIN(t):
+    r'explain\b'
+    return t
+
+def t_ANALYZE(t):
+    r'analyze\b'
+    return t
+
+def t_BETWEEN(t):
+    r'between\b'
+    return t
+
+def t_GROUP(t):
+    r'group\b'
+    return t
+
+def t_ORDER(t):
+    r'order\b'
+    return t
+
+def t_BY(t):
+    r'by\b'
+    return t
+
+def t_ASC(t):
+    r'asc\b'
+    return t
+
+def t_DESC(t):
+    r'desc\b'
+    return t
+
+def t_LIMIT(t):
+    r'limit\b'
+    return t
+
+def t_OFFSET(t):
+    r'offset\b'
+    return t
+
+def t_AGGFUNC(t):
+    r'(?:count|sum|min|max|avg)(?=\s*\()'  # only a name followed by ( is a function, so a field may be called min
     return t
 
 def t_TCNAME(t):
-    r'[A-Z_a-z]\w*'
+    r'[A-Z_a-z]\w*(?:\.[A-Z_a-z]\w*)?'  # a field name may be qualified by its table name, e.g. t1.f1
     return t
 def t_COMMA(t):
     r','
     return t
 
+def t_LPAREN(t):
+    r'\('
+    return t
+
+def t_RPAREN(t):
+    r'\)'
+    return t
+
+def t_STAR(t):
+    r'\*'
+    return t
+
 def t_EQX(t):
     r'[=]'
     return t
 
+def t_COMP(t):
+    r'<=|>=|<|>'
+    return t
+
 def t_CONSTANT(t):
-    r'\d+|\'\w+\''
+    r'\d+|\'\w+\'|\?'
+    if t.value == '?':  # a parameter of a prepared statement, it is named by its position in the statement
+        t.value = '?%d' % t.lexpos
     return t
 
 def t_SPACE(t):
@@ -65,9 +128,11 @@ def t_error(t):
 
         
 #------------------------------------------
-# to set the global_lexer in common_db.py
+# to set the global_lexer in common_db.py, the lexer is built once per process
 #-------------------------------------------
 def set_lex_handle():
+    if common_db.global_lexer is not None:
+        return
     common_db.global_lexer=lex.lex()
     if common_db.global_lexer is None:
         print ('wrong when the global_lex is created')
@@ -20,10 +20,15 @@ import lex_db  # for lex, where data is stored in binary format
 import parser_db  # for yacc, where ddata is tored in binary format
 import common_db  # the global variables, functions, constants in the program
 import query_plan_db  # construct the query plan and execute it
+import buffer_db  # the buffer pool shared by tables, indexes and the schema
+import wal_db  # the write-ahead log of the buffer pool
+import index_db  # the B+ tree index on a field of a table
+import plan_cache_db  # the cache of query plans and prepared statements
 
 PROMPT_STR = 'Input your choice  \n1:add a new table structure and data \n2:delete a table structure and data\
 \n3:view a table structure and data \n4:delete all tables and data \n5:select from where clause\
-\n6:delete a row according to field keyword \n7:update a row according to field keyword \n. to quit):\n'
+\n6:delete a row according to field keyword \n7:update a row according to field keyword \
+\n8:create an index on a field \n. to quit):\n'
 
 
 # --------------------------
@@ -36,6 +41,8 @@ def main():
 
     # The instance data of table is stored in binary format, which corresponds to chapter 2-8 of textbook
 
+    wal_db.recover()  # the committed changes which are not in the files yet are written to them
+
     schemaObj = schema_db.Schema()  # to create a schema object, which contains the schema of all tables
     dataObj = None
     choice = input(PROMPT_STR)
@@ -61,23 +68,35 @@ def main():
                 # to the students: The following needs to be further implemented (many lines can be added)
 
 
-            while True:
-                record = []
-                Field_List = dataObj.getFieldList()
-                for i, x in enumerate(Field_List):
-                    field_name = x[0].strip().decode('utf-8') if isinstance(x[0], bytes) else x[0].strip()
-                    prompt = f'Input value for {field_name} (type: {x[1]}, max len: {x[2]}): '
-                    value = input(prompt)
-                    record.append(value)
-
-                if dataObj.insert_record(record):
-                    print('Record inserted successfully!')
+            csv_file_name = input('please input the csv file to load (press enter to input records one by one):')
+            if csv_file_name.strip():
+                if os.path.exists(csv_file_name.strip()):
+                    inserted, wrong = dataObj.load_csv(csv_file_name.strip())
+                    print(f'{inserted} records inserted, {wrong} wrong records skipped')
                 else:
-                    print('Failed to insert record!')
-
-                another = input('Add another record? (y/n): ')
-                if another.lower() != 'y':
-                    break
+                    print('there is no file ' + csv_file_name.strip())
+            else:
+                record_list = []  # the records are inserted together by insert_many
+                while True:
+                    record = []
+                    Field_List = dataObj.getFieldList()
+                    for i, x in enumerate(Field_List):
+                        field_name = x[0].strip().decode('utf-8') if isinstance(x[0], bytes) else x[0].strip()
+                        prompt = f'Input value for {field_name} (type: {x[1]}, max len: {x[2]}): '
+                        value = input(prompt)
+                        record.append(value)
+
+                    if dataObj.encode_record(record) is not None:
+                        record_list.append(record)
+                    else:
+                        print('Wrong record, it will not be inserted!')
+
+                    another = input('Add another record? (y/n): ')
+                    if another.lower() != 'y':
+                        break
+
+                inserted, wrong = dataObj.insert_many(record_list)
+                print(f'{inserted} records inserted successfully!')
 
             del dataObj
             choice = input(PROMPT_STR)
@@ -143,8 +162,9 @@ def main():
                 if schemaObj.find_table(table_name.strip()):
                     schemaObj.viewTableStructure(table_name)  # to be implemented
 
+                    num_of_rows = input('please input the number of rows to be displayed (all if empty):')
                     dataObj = storage_db.Storage(table_name)  # create an object for the data of table
-                    dataObj.show_table_data()  # view all the data of the table
+                    dataObj.show_table_data(int(num_of_rows) if num_of_rows.strip().isdigit() else None)
                     del dataObj
                 else:
                     print('table name is None')
@@ -173,15 +193,10 @@ def main():
         elif choice == '5':  # process SELECT FROM WHERE clause
             print('#        Your Query is to SQL QUERY                  #')
             sql_str = input('please enter the select from where clause:')
-            lex_db.set_lex_handle()  # to set the global_lexer in common_db.py
-            parser_db.set_handle()  # to set the global_parser in common_db.py
 
             try:
-                common_db.global_syn_tree = common_db.global_parser.parse(sql_str.strip(),
-                                                                          lexer=common_db.global_lexer)  # construct the global_syn_tree
-                #reload(query_plan_db)
-                query_plan_db.construct_logical_tree()
-                query_plan_db.execute_logical_tree()
+                # the statement is lexed and parsed only if the plan cache has no plan for its normalized text
+                plan_cache_db.execute_sql(sql_str.strip())
             except:
                 print('WRONG SQL INPUT!')
             print('#----------------------------------------------------#')
@@ -192,7 +207,21 @@ def main():
 
             table_name = input('please input the name of the table to be deleted from:')
             field_name = input('please input the field name and the corresponding keyword (fieldname:keyword):')
-            # to the students: to be inserted here, delete the line from data files
+            if isinstance(table_name, str):
+                table_name = table_name.encode('utf-8')
+            if not schemaObj.find_table(table_name.strip()):
+                print('there is no table '.encode('utf-8') + table_name + ' in the schema file'.encode('utf-8'))
+            elif ':' not in field_name:
+                print('the input should be fieldname:keyword')
+            else:
+                field_name, keyword = field_name.split(':', 1)
+                dataObj = storage_db.Storage(table_name.strip())
+                field_index = dataObj.get_field_index(field_name)
+                if field_index is None:
+                    print('there is no field', field_name.strip(), 'in the table')
+                else:  # the slots of the deleted records are reused by later insertions
+                    print(dataObj.delete_records(field_index, keyword), 'records are deleted')
+                del dataObj
 
             choice = input(PROMPT_STR)
 
@@ -201,15 +230,49 @@ def main():
             table_name = input('please input the name of the table:')
             field_name = input('please input the field name:')
             field_name_value = input('please input the old value of the field:')
-            # to the students: to be inserted here, update the line according to the user input
+            new_field_value = input('please input the new value of the field:')
+            if isinstance(table_name, str):
+                table_name = table_name.encode('utf-8')
+            if schemaObj.find_table(table_name.strip()):
+                dataObj = storage_db.Storage(table_name.strip())
+                field_index = dataObj.get_field_index(field_name)
+                if field_index is None:
+                    print('there is no field', field_name.strip(), 'in the table')
+                else:  # the records are updated in place
+                    num_of_records = dataObj.update_records(field_index, field_name_value, new_field_value)
+                    if num_of_records is None:
+                        print('the new value does not fit the field')
+                    else:
+                        print(num_of_records, 'records are updated')
+                del dataObj
+            else:
+                print('there is no table '.encode('utf-8') + table_name + ' in the schema file'.encode('utf-8'))
 
             choice = input(PROMPT_STR)
 
 
 
+        elif choice == '8':  # build a B+ tree index on a field of a table in one run
+
+            table_name = input('please input the name of the table:')
+            field_name = input('please input the field name to be indexed:')
+            if isinstance(table_name, str):
+                table_name = table_name.encode('utf-8')
+            if schemaObj.find_table(table_name.strip()):
+                indexObj = index_db.Index(table_name.strip(), field_name.strip())
+                if not indexObj.create_index():
+                    print('the index is not created')
+                del indexObj
+            else:
+                print('there is no table '.encode('utf-8') + table_name + ' in the schema file'.encode('utf-8'))
+
+            choice = input(PROMPT_STR)
+
         elif choice == '.':
             print('main loop finishies')
             del schemaObj
+            wal_db.get_wal().checkpoint()  # all the dirty blocks are written back
+            buffer_db.get_buffer_pool().show_stats()  # the hit ratio is used to size the buffer pool
             break
 
     print('main loop finish!')
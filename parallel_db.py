@@ -0,0 +1,121 @@
+#-----------------------------------------------
+# parallel_db.py
+#-----------------------------------------------
+# the module scans and filters the data blocks of a table by a pool of processes
+#   (1) the blocks of the .dat file are split into chunks of PARALLEL_CHUNK_BLOCKS blocks
+#   (2) every chunk is decoded and filtered by scan_chunk in a worker process, which reads
+#       the file by itself, so only the records which pass the predicates are sent back
+#   (3) the chunks are returned in the order of the blocks, and at most two chunks per worker
+#       are submitted ahead of the scan, so the records of a large table are not all kept
+# the processes are created at the first parallel scan and they are kept in
+# global_process_pool in common_db.py, shutdown_process_pool must be called after
+# PARALLEL_SCAN_WORKERS is changed
+# usage:
+#       if parallel_db.is_enabled(table_obj.data_block_num):
+#           for record in parallel_db.scan(table_obj, [(1, operator.gt, 40, None)]):
+#               ...
+#-----------------------------------------------
+
+import os
+import collections
+import concurrent.futures
+
+import common_db
+import block_db
+import codec_db
+import storage_db
+
+
+PARALLEL_SCAN_WORKERS=os.cpu_count() or 1  # the number of worker processes, a scan is serial if it is 1
+PARALLEL_SCAN_MIN_BLOCKS=256  # the tables with fewer data blocks are scanned serially
+PARALLEL_CHUNK_BLOCKS=64      # the number of blocks decoded by a worker at a time
+
+
+#------------------------------------------
+# whether the full scan of a table with num_of_blocks data blocks is parallel
+#-------------------------------------------
+def is_enabled(num_of_blocks):
+    return PARALLEL_SCAN_WORKERS > 1 and num_of_blocks >= PARALLEL_SCAN_MIN_BLOCKS
+
+
+#------------------------------------------
+# to get the global_process_pool in common_db.py, it is created at the first call
+#-------------------------------------------
+def get_process_pool():
+    if common_db.global_process_pool is None:
+        common_db.global_process_pool = concurrent.futures.ProcessPoolExecutor(PARALLEL_SCAN_WORKERS)
+    return common_db.global_process_pool
+
+
+def shutdown_process_pool():
+    if common_db.global_process_pool is not None:
+        common_db.global_process_pool.shutdown()
+        common_db.global_process_pool = None
+
+
+#------------------------------------------
+# to decode and filter a chunk of data blocks, it runs in a worker process
+# input:
+#       file_name   : the .dat file of the table
+#       field_list  : the field list of the table, see codec_db.get_codec
+#       first_block : the first block of the chunk
+#       end_block   : the block after the last one
+#       check_list  : a list of (field_index, compare, value, other_index), see query_plan_db.Filter
+# output:
+#       (the records which pass all the checks, the number of records decoded)
+#-------------------------------------------
+def scan_chunk(file_name, field_list, first_block, end_block, check_list):
+    codec = codec_db.get_codec(field_list)
+    decoder = codec.get_decoder()
+    record_list = []
+    num_of_records = 0
+    block_file = block_db.BlockFile(file_name)
+    try:
+        for page in block_file.read_blocks(first_block, end_block - first_block):
+            offset_list = [offset for offset in storage_db.get_offset_list(page) if offset != storage_db.TOMBSTONE]
+            for offset in offset_list:
+                record = codec.decode(page, offset, decoder)
+                for (field_index, compare, value, other_index) in check_list:
+                    if not compare(record[field_index], value if other_index is None else record[other_index]):
+                        break
+                else:
+                    record_list.append(record)
+            num_of_records += len(offset_list)
+    finally:
+        block_file.close()
+    return record_list, num_of_records
+
+
+#------------------------------------------
+# to scan a table by the worker processes
+# input:
+#       table_obj  : the storage_db.Storage of the table
+#       check_list : a list of (field_index, compare, value, other_index)
+# output:
+#       a generator of the records which pass all the checks, in the order of Storage.cursor
+# note: the dirty blocks of the table in the buffer pool are written back first, so the workers read them too
+#-------------------------------------------
+def scan(table_obj, check_list):
+    table_obj.buffer_pool.flush_file(table_obj.file_name)
+    process_pool = get_process_pool()
+    chunk_list = [(first_block, min(first_block + PARALLEL_CHUNK_BLOCKS, table_obj.data_block_num + 1))
+                  for first_block in range(1, table_obj.data_block_num + 1, PARALLEL_CHUNK_BLOCKS)]
+    chunk_iter = iter(chunk_list)
+    future_queue = collections.deque()
+    try:
+        while True:
+            while len(future_queue) < 2 * PARALLEL_SCAN_WORKERS:
+                chunk = next(chunk_iter, None)
+                if chunk is None:
+                    break
+                future_queue.append(process_pool.submit(scan_chunk, table_obj.file_name, table_obj.field_name_list,
+                                                        chunk[0], chunk[1], check_list))
+            if not future_queue:
+                return
+            record_list, num_of_records = future_queue.popleft().result()
+            table_obj.bytes_decoded += num_of_records * table_obj.record_content_len
+            for record in record_list:
+                yield record
+    finally:
+        for future in future_queue:  # the scan is closed early, e.g. by a limit
+            future.cancel()
@@ -6,6 +6,8 @@
 # the module is to construct a syntax tree for a "select from where" SQL clause
 # the output is a syntax tree
 #----------------------------------------------------
+import os
+
 import common_db
 
 # the following two packages need to be installed by yourself
@@ -17,16 +19,50 @@ import ply.lex as lex
 from lex_db import tokens
 
 
+# the LALR tables are cached in this file next to the module, PLY compares the grammar signature
+# stored in it with the grammar below and builds the tables again if they differ
+PARSE_TABLE_FILE=os.path.join(os.path.dirname(os.path.abspath(__file__)),'parsetab_db.pickle')
+
+
 
 #---------------------------------
 # Query  : SFW
-#   SWF  : SELECT SelList FROM FromList WHERE Condition
+# Query  : EXPLAIN SFW
+# Query  : EXPLAIN ANALYZE SFW
+#   SWF  : SELECT SelList FROM FromList WhereClause GroupClause OrderClause LimitClause
+# WhereClause: WHERE CondList
+# WhereClause: empty
+# GroupClause: GROUP BY GroupList
+# GroupClause: empty
+# OrderClause: ORDER BY OrderList
+# OrderClause: empty
+# LimitClause: LIMIT CONSTANT
+# LimitClause: LIMIT CONSTANT OFFSET CONSTANT
+# LimitClause: empty
 # SelList: TCNAME COMMA SelList
 # SelList: TCNAME
+# SelList: Agg COMMA SelList
+# SelList: Agg
+# Agg    : AGGFUNC LPAREN TCNAME RPAREN
+# Agg    : AGGFUNC LPAREN STAR RPAREN
+# GroupList: TCNAME COMMA GroupList
+# GroupList: TCNAME
+# OrderList: OrderItem COMMA OrderList
+# OrderList: OrderItem
+# OrderItem: TCNAME Direction
+# OrderItem: Agg Direction
+# Direction: ASC
+# Direction: DESC
+# Direction: empty
 #
 # FromList:TCNAME COMMA FromList
 # FromList:TCNAME
+# CondList: Condition AND CondList
+# CondList: Condition
 # Condition: TCNAME EQX CONSTANT
+# Condition: TCNAME EQX TCNAME
+# Condition: TCNAME COMP CONSTANT
+# Condition: TCNAME BETWEEN CONSTANT AND CONSTANT
 #---------------------------------
 
 
@@ -63,6 +99,43 @@ def p_expr_query(t):
     
     return t
 
+#------------------------------
+# construct the node for a query which shows its plan instead of its result
+# input:
+#       
+# output:
+#       the root node of syntax tree
+#--------------------------------------      
+def p_expr_query_explain(t):
+    'Query : EXPLAIN SFW'
+
+    t[1]=common_db.Node('EXPLAIN',None)
+    t[0]=common_db.Node('Query',[t[1],t[2]])
+    common_db.global_syn_tree=t[0]
+    check_syn_tree(common_db.global_syn_tree)
+    common_db.show(common_db.global_syn_tree)
+
+    return t
+
+#------------------------------
+# construct the node for a query which is executed to show its plan with the statistics of operators
+# input:
+#       
+# output:
+#       the root node of syntax tree
+#--------------------------------------      
+def p_expr_query_explain_analyze(t):
+    'Query : EXPLAIN ANALYZE SFW'
+
+    t[1]=common_db.Node('EXPLAIN',None)
+    t[2]=common_db.Node('ANALYZE',None)
+    t[0]=common_db.Node('Query',[t[1],t[2],t[3]])
+    common_db.global_syn_tree=t[0]
+    check_syn_tree(common_db.global_syn_tree)
+    common_db.show(common_db.global_syn_tree)
+
+    return t
+
 #------------------------------
 #(1) construct the node for WFW expression
 # input:
@@ -71,14 +144,168 @@ def p_expr_query(t):
 #       the nodes
 #--------------------------------------   
 def p_expr_swf(t):
-    'SFW : SELECT SelList FROM FromList WHERE Cond'
+    'SFW : SELECT SelList FROM FromList WhereClause GroupClause OrderClause LimitClause'
     t[1]=common_db.Node('SELECT',None)
     t[3]=common_db.Node('FROM',None)
-    t[5]=common_db.Node('WHERE',None)
     
-    t[0]=common_db.Node('SFW',[t[1],t[2],t[3],t[4],t[5],t[6]])
+    # the clauses which are not given are None, so they are not in the tree
+    t[0]=common_db.Node('SFW',[x for x in t[1:9] if x is not None])
     
     
+    return t
+
+#------------------------------
+#construct the node for WHERE clause
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_whereclause(t):
+    'WhereClause : WHERE CondList'
+    t[1]=common_db.Node('WHERE',None)
+    t[0]=common_db.Node('WhereClause',[t[1],t[2]])
+
+    return t
+
+#------------------------------
+#there is no WHERE clause, all the records of the tables are selected
+#--------------------------------------   
+def p_expr_whereclause_empty(t):
+    'WhereClause : '
+    t[0]=None
+
+    return t
+
+#------------------------------
+#construct the node for GROUP BY clause
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_groupclause(t):
+    'GroupClause : GROUP BY GroupList'
+    t[1]=common_db.Node('GROUP BY',None)
+    t[0]=common_db.Node('GroupClause',[t[1],t[3]])
+
+    return t
+
+#------------------------------
+#there is no GROUP BY clause
+#--------------------------------------   
+def p_expr_groupclause_empty(t):
+    'GroupClause : '
+    t[0]=None
+
+    return t
+
+#------------------------------
+#construct the node for ORDER BY clause
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_orderclause(t):
+    'OrderClause : ORDER BY OrderList'
+    t[1]=common_db.Node('ORDER BY',None)
+    t[0]=common_db.Node('OrderClause',[t[1],t[3]])
+
+    return t
+
+#------------------------------
+#there is no ORDER BY clause
+#--------------------------------------   
+def p_expr_orderclause_empty(t):
+    'OrderClause : '
+    t[0]=None
+
+    return t
+
+#------------------------------
+#construct the node for LIMIT clause, the records are not skipped if there is no OFFSET
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_limitclause(t):
+    '''LimitClause : LIMIT CONSTANT
+                   | LIMIT CONSTANT OFFSET CONSTANT'''
+    t[1]=common_db.Node('LIMIT',None)
+    t[2]=common_db.Node('CONSTANT',[t[2]])
+    if len(t)>3:
+        t[3]=common_db.Node('OFFSET',None)
+        t[4]=common_db.Node('CONSTANT',[t[4]])
+        t[0]=common_db.Node('LimitClause',[t[1],t[2],t[3],t[4]])
+    else:
+        t[0]=common_db.Node('LimitClause',[t[1],t[2]])
+
+    return t
+
+#------------------------------
+#there is no LIMIT clause
+#--------------------------------------   
+def p_expr_limitclause_empty(t):
+    'LimitClause : '
+    t[0]=None
+
+    return t
+
+#------------------------------
+#construct the node for order by list
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_orderlist_first(t):
+    'OrderList : OrderItem COMMA OrderList'
+    t[2]=common_db.Node(',',None)
+    t[0]=common_db.Node('OrderList',[t[1],t[2],t[3]])
+
+    return t
+
+#------------------------------
+#construct the node for the last key of order by list
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_orderlist_second(t):
+    'OrderList : OrderItem'
+    t[0]=common_db.Node('OrderList',[t[1]])
+
+    return t
+
+#------------------------------
+#construct the node for a sort key, which is a field or an aggregate and its direction
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_orderitem(t):
+    '''OrderItem : TCNAME Direction
+                 | Agg Direction'''
+    if isinstance(t[1],str):
+        t[1]=common_db.Node('TCNAME',[t[1]])
+    t[2]=common_db.Node(t[2],None)
+    t[0]=common_db.Node('OrderItem',[t[1],t[2]])
+
+    return t
+
+#------------------------------
+#the direction of a sort key, it is ascending if it is not given
+#--------------------------------------   
+def p_expr_direction(t):
+    '''Direction : ASC
+                 | DESC
+                 | '''
+    t[0]=t[1] if len(t)>1 else 'asc'
+
     return t
 
 #------------------------------
@@ -116,6 +343,93 @@ def p_expr_sellist_second(t):
     return t
 
 
+#------------------------------
+#construct the node for select list whose first item is an aggregate
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_sellist_agg_first(t):
+    'SelList : Agg COMMA SelList'
+    t[2]=common_db.Node(',',None)
+    t[0]=common_db.Node('SelList',[t[1],t[2],t[3]])
+
+    return t
+
+#------------------------------
+#construct the node for select list whose last item is an aggregate
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_sellist_agg_second(t):
+    'SelList : Agg'
+    t[0]=common_db.Node('SelList',[t[1]])
+
+    return t
+
+#------------------------------
+#construct the node for an aggregate of a field, e.g. sum(t1.f1)
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_agg(t):
+    'Agg : AGGFUNC LPAREN TCNAME RPAREN'
+    t[1]=common_db.Node(t[1],None)
+    t[3]=common_db.Node('TCNAME',[t[3]])
+    t[0]=common_db.Node('Agg',[t[1],t[3]])
+
+    return t
+
+#------------------------------
+#construct the node for an aggregate of the records, i.e. count(*)
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_agg_star(t):
+    'Agg : AGGFUNC LPAREN STAR RPAREN'
+    t[1]=common_db.Node(t[1],None)
+    t[3]=common_db.Node('*',None)
+    t[0]=common_db.Node('Agg',[t[1],t[3]])
+
+    return t
+
+#------------------------------
+#construct the node for group by list
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_grouplist_first(t):
+    'GroupList : TCNAME COMMA GroupList'
+    t[1]=common_db.Node('TCNAME',[t[1]])
+    t[2]=common_db.Node(',',None)
+    t[0]=common_db.Node('GroupList',[t[1],t[2],t[3]])
+
+    return t
+
+#------------------------------
+#construct the node for the last field of group by list
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_grouplist_second(t):
+    'GroupList : TCNAME'
+    t[1]=common_db.Node('TCNAME',[t[1]])
+    t[0]=common_db.Node('GroupList',[t[1]])
+
+    return t
+
+
 #---------------------------
 #construct the node for from expression
 # input:
@@ -145,6 +459,35 @@ def p_expr_fromlist_second(t):
     t[0]=common_db.Node('FromList',[t[1]])    
     return t
         
+#------------------------------
+#construct the node for the conjunction of conditions
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_condlist_first(t):
+    'CondList : Cond AND CondList'
+    t[2]=common_db.Node('AND',None)
+    t[0]=common_db.Node('CondList',[t[1],t[2],t[3]])
+
+    return t
+
+
+#------------------------------
+#construct the node for the last condition of the conjunction
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_condlist_second(t):
+    'CondList : Cond'
+    t[0]=common_db.Node('CondList',[t[1]])
+
+    return t
+
+
 #------------------------------
 #construct the node for condition expression
 # input:
@@ -163,6 +506,59 @@ def p_expr_condition(t):
     return t 
 
 
+#------------------------------
+#construct the node for the condition which compares two fields, e.g. t1.a=t2.b
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_condition_field(t):
+    'Cond : TCNAME EQX TCNAME'
+    t[1]=common_db.Node('TCNAME',[t[1]])
+    t[2]=common_db.Node('=',None)
+    t[3]=common_db.Node('TCNAME',[t[3]])
+
+    t[0]=common_db.Node('Cond',[t[1],t[2],t[3]])
+
+    return t
+
+
+#------------------------------
+#construct the node for the condition which compares a field with a constant by <, <=, > or >=
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_condition_compare(t):
+    'Cond : TCNAME COMP CONSTANT'
+    t[1]=common_db.Node('TCNAME',[t[1]])
+    t[2]=common_db.Node(t[2],None)
+    t[3]=common_db.Node('CONSTANT',[t[3]])
+
+    t[0]=common_db.Node('Cond',[t[1],t[2],t[3]])
+
+    return t
+
+
+#------------------------------
+#construct the node for f BETWEEN c1 AND c2, which is the same as f>=c1 AND f<=c2
+# input:
+#       
+# output:
+#       the nodes
+#--------------------------------------   
+def p_expr_condition_between(t):
+    'Cond : TCNAME BETWEEN CONSTANT AND CONSTANT'
+    low=common_db.Node('Cond',[common_db.Node('TCNAME',[t[1]]),common_db.Node('>=',None),common_db.Node('CONSTANT',[t[3]])])
+    high=common_db.Node('Cond',[common_db.Node('TCNAME',[t[1]]),common_db.Node('<=',None),common_db.Node('CONSTANT',[t[5]])])
+
+    t[0]=common_db.Node('Between',[low,high])
+
+    return t
+
+
     
 #------------------------------
 # for error
@@ -172,14 +568,21 @@ def p_expr_condition(t):
 #       the error messages
 #--------------------------------------   
 def p_error(t):
-    print ('wrong at %s'% t.value)
+    if t is None: # the clause ends too early, e.g. select f1 from
+        print ('wrong at the end of the clause')
+    else:
+        print ('wrong at %s'% t.value)
 
 
 #------------------------------------------
-# to set the global_parser handle in common_db.py
+# to set the global_parser handle in common_db.py, the parser is built once per process
+# input:
+#       table_file: the file of cached LALR tables
 #---------------------------------------------    
-def set_handle():    
-    common_db.global_parser=yacc.yacc(write_tables=0)
+def set_handle(table_file=PARSE_TABLE_FILE):
+    if common_db.global_parser is not None:
+        return
+    common_db.global_parser=yacc.yacc(picklefile=table_file)
     if common_db.global_parser is None:
         print ('wrong when yacc object is created')
 
@@ -0,0 +1,201 @@
+#-----------------------------------------------
+# plan_cache_db.py
+#-----------------------------------------------
+# the module caches the logical query plans of select statements
+#   (1) the constants of a statement are replaced by parameters ?, so the statements which
+#       differ only in their constants have the same normalized text and share one plan
+#   (2) the plans are kept in a LRU of PLAN_CACHE_CAPACITY entries keyed by the normalized text
+#   (3) the cache is emptied when the catalog changes, i.e. in Schema.appendTable,
+#       Schema.delete_table_schema, Schema.deleteAll and Index.create_index
+# usage:
+#       statement = prepare("select name from people where age = ?")
+#       statement.execute(7)
+#       execute_sql("select name from people where age = 7")   # it shares the plan above
+#-----------------------------------------------
+
+import collections
+
+import common_db
+import lex_db
+import parser_db
+import query_plan_db
+
+
+#-----------------------------
+# a statement whose plan is ready, the parameters are bound at every execution
+#-------------------------------
+class PreparedStatement(object):
+
+    #------------------------------
+    # constructor of the class
+    # input:
+    #       normalized_sql : the text of the statement, in which every constant is ?
+    #       plan           : the logical query plan tree of normalized_sql
+    #       param_list     : the names of the parameters in the plan, in the order of the statement
+    #       constant_list  : the constants which have been replaced, None for a ? of the statement
+    #-------------------------------------
+    def __init__(self, normalized_sql, plan, param_list, constant_list):
+        self.normalized_sql = normalized_sql
+        self.plan = plan
+        self.param_list = param_list
+        self.constant_list = constant_list
+
+    #------------------------------
+    # execute the statement and print the result
+    # input:
+    #       values : the values of the ? in the statement, e.g. 7 or 'n7'
+    #-------------------------------------
+    def execute(self, *values):
+        num_of_params = self.constant_list.count(None)
+        if len(values) != num_of_params:
+            print('the statement needs', num_of_params, 'parameters, but', len(values), 'are given')
+            return
+        value_iter = iter(values)
+        bind_dict = {}
+        for (param, constant) in zip(self.param_list, self.constant_list):
+            bind_dict[param] = constant if constant is not None else to_constant(next(value_iter))
+        common_db.global_logical_tree = bind_plan(self.plan, bind_dict)
+        query_plan_db.execute_logical_tree()
+
+
+class PlanCache(object):
+
+    def __init__(self, capacity=common_db.PLAN_CACHE_CAPACITY):
+        self.capacity = capacity
+        self.plan_dict = collections.OrderedDict()  # normalized text->(plan, param_list), the last one is the most recently used
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, normalized_sql):
+        entry = self.plan_dict.get(normalized_sql)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.plan_dict.move_to_end(normalized_sql)
+        return entry
+
+    def put(self, normalized_sql, entry):
+        self.plan_dict[normalized_sql] = entry
+        self.plan_dict.move_to_end(normalized_sql)
+        while len(self.plan_dict) > self.capacity:
+            self.plan_dict.popitem(last=False)
+
+    def clear(self):
+        self.plan_dict.clear()
+
+    def get_stats(self):
+        return {'capacity': self.capacity, 'plans': len(self.plan_dict), 'hits': self.hits, 'misses': self.misses}
+
+
+#------------------------------------------
+# to get the global_plan_cache in common_db.py, it is created at the first call
+#-------------------------------------------
+def get_plan_cache():
+    if common_db.global_plan_cache is None:
+        common_db.global_plan_cache = PlanCache()
+    return common_db.global_plan_cache
+
+
+#------------------------------------------
+# to turn a value of python into a constant of the sql text, a string of digits is not quoted
+# as the lexer reads 9 and '9' differently, so '9' can be given for an int field or a str field
+#-------------------------------------------
+def to_constant(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        value = value.strip().strip("'")
+        if value.isdigit():
+            return value
+        return "'" + value + "'"
+    return str(int(value))
+
+
+#------------------------------------------
+# to replace the constants of a statement by ?
+# input:
+#       sql_str
+# output:
+#       normalized_sql : the tokens of sql_str separated by one space, every constant is ?
+#       param_list     : the names of the parameters, which are ? and its position in normalized_sql
+#       constant_list  : the replaced constants, None for a ? which is in sql_str already
+#-------------------------------------------
+def normalize_sql(sql_str):
+    common_db.global_lexer.input(sql_str)
+    token_list = []
+    param_list = []
+    constant_list = []
+    length = 0
+    while True:
+        token = common_db.global_lexer.token()
+        if token is None:
+            break
+        if token.type == 'CONSTANT':
+            param_list.append('?%d' % length)  # the name given by the lexer when normalized_sql is parsed
+            constant_list.append(None if token.value.startswith('?') else token.value)
+            token_list.append('?')
+        else:
+            token_list.append(token.value)
+        length += len(token_list[-1]) + 1
+    return ' '.join(token_list), param_list, constant_list
+
+
+#------------------------------------------
+# to copy the plan tree with the parameters replaced by their constants
+# input:
+#       node      : a node of the plan tree
+#       bind_dict : parameter name->constant
+#-------------------------------------------
+def bind_plan(node, bind_dict):
+    if not isinstance(node, common_db.Node):
+        return node
+    return common_db.Node(node.value, [bind_plan(child, bind_dict) for child in node.children],
+                          bind_var(node.var, bind_dict))
+
+
+# the var of a node may be a string, or a tuple or list which may hold tuples
+def bind_var(var, bind_dict):
+    if isinstance(var, (tuple, list)):
+        return type(var)(bind_var(x, bind_dict) for x in var)
+    if isinstance(var, str):
+        return bind_dict.get(var, var)
+    return var
+
+
+#------------------------------------------
+# to prepare a select statement, its plan is taken from the plan cache or it is made and cached
+# input:
+#       sql_str: the statement, whose constants may be given as ?
+# output:
+#       a PreparedStatement, or None if the statement is wrong
+#-------------------------------------------
+def prepare(sql_str):
+    lex_db.set_lex_handle()
+    parser_db.set_handle()
+    normalized_sql, param_list, constant_list = normalize_sql(sql_str)
+
+    plan_cache = get_plan_cache()
+    entry = plan_cache.get(normalized_sql)
+    if entry is None:
+        common_db.global_syn_tree = common_db.global_parser.parse(normalized_sql, lexer=common_db.global_lexer)
+        if common_db.global_syn_tree is None:
+            return None
+        common_db.global_logical_tree = None
+        query_plan_db.construct_logical_tree()
+        if common_db.global_logical_tree is None:
+            return None
+        entry = (common_db.global_logical_tree, param_list)
+        plan_cache.put(normalized_sql, entry)
+    return PreparedStatement(normalized_sql, entry[0], entry[1], constant_list)
+
+
+#------------------------------------------
+# to execute a select statement through the plan cache
+#-------------------------------------------
+def execute_sql(sql_str):
+    statement = prepare(sql_str)
+    if statement is None:
+        print('WRONG SQL INPUT!')
+    else:
+        statement.execute()
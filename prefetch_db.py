@@ -0,0 +1,139 @@
+#-----------------------------------------------
+# prefetch_db.py
+#-----------------------------------------------
+# the module reads the data blocks of a full scan ahead of the scan, it is optional
+#   (1) a background thread reads the next blocks of the .dat file by block_db.BlockFile.read_blocks,
+#       which reads a run of blocks by one call and releases the GIL, while the scan decodes the
+#       current block
+#   (2) at most depth blocks are read ahead and kept, the thread reads again when half of them
+#       are taken, so the blocks are read by runs instead of one at a time
+#   (3) the depth is doubled when the scan has to wait for a block and it is decreased by one
+#       after depth blocks are taken without a wait, so it follows the speed of the scan
+#       between READ_AHEAD_MIN_DEPTH and READ_AHEAD_MAX_DEPTH
+#   (4) the blocks in the buffer pool, which may be dirty, are still taken from the pool, and the
+#       blocks read ahead are not used any more once the pool writes a block back during the scan
+# usage:
+#       for (block_id, page) in read_ahead(buffer_pool, 'people.dat', 1, data_block_num + 1):
+#           ... buffer_pool.view('people.dat', block_id, page) ...
+#-----------------------------------------------
+
+import threading
+
+
+READ_AHEAD=False        # whether the full scans of Storage.cursor read blocks ahead
+READ_AHEAD_MIN_BLOCKS=8  # the tables with fewer data blocks are scanned without the thread
+READ_AHEAD_MIN_DEPTH=2
+READ_AHEAD_MAX_DEPTH=64
+
+
+#------------------------------------------
+# whether the full scan of a table with num_of_blocks data blocks reads blocks ahead
+#-------------------------------------------
+def is_enabled(num_of_blocks):
+    return READ_AHEAD and num_of_blocks >= READ_AHEAD_MIN_BLOCKS
+
+
+class Prefetcher(object):
+
+    #------------------------------
+    # constructor of the class, the thread is started by start
+    # input:
+    #       block_file  : the block_db.BlockFile of the file
+    #       first_block : the first block to be read
+    #       end_block   : the block after the last one
+    #-------------------------------------
+    def __init__(self, block_file, first_block, end_block):
+        self.block_file = block_file
+        self.next_block = first_block  # the next block read by the thread
+        self.end_block = end_block
+        self.depth = READ_AHEAD_MIN_DEPTH
+        self.page_dict = {}  # block_id->page read ahead and not taken yet
+        self.condition = threading.Condition()
+        self.stopped = False  # the scan is over, or a read has failed
+        self.waits = 0  # the times the scan waited for a block
+        self.taken = 0  # the blocks taken since the last wait or the last change of the depth
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and self.next_block < self.end_block and len(self.page_dict) > self.depth // 2:
+                    self.condition.wait()
+                if self.stopped or self.next_block >= self.end_block:
+                    return
+                block_id = self.next_block
+                num_of_blocks = min(self.depth - len(self.page_dict), self.end_block - block_id)
+                self.next_block += num_of_blocks
+
+            try:
+                page_list = self.block_file.read_blocks(block_id, num_of_blocks)
+            except (OSError, ValueError):  # the file is closed by the pool, the scan reads the pool
+                page_list = []
+
+            with self.condition:
+                if len(page_list) < num_of_blocks:  # the rest of the blocks are read by the pool
+                    self.stopped = True
+                for (i, page) in enumerate(page_list):
+                    self.page_dict[block_id + i] = page
+                self.condition.notify_all()
+
+    #------------------------------
+    # take a block read ahead, the blocks must be taken in order
+    # output:
+    #       the page of the block, or None if it cannot be read ahead
+    #-------------------------------------
+    def get(self, block_id):
+        with self.condition:
+            if block_id not in self.page_dict:
+                if not self.stopped:
+                    self.waits += 1
+                    self.taken = 0
+                    self.depth = min(self.depth * 2, READ_AHEAD_MAX_DEPTH)  # the reads are behind the scan
+                    self.condition.notify_all()
+                while block_id not in self.page_dict and not self.stopped:
+                    self.condition.wait()
+            else:
+                self.taken += 1
+                if self.taken >= self.depth:  # the reads are ahead of the scan
+                    self.taken = 0
+                    self.depth = max(self.depth - 1, READ_AHEAD_MIN_DEPTH)
+            page = self.page_dict.pop(block_id, None)
+            if len(self.page_dict) <= self.depth // 2:
+                self.condition.notify_all()
+            return page
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.page_dict.clear()
+            self.condition.notify_all()
+        if self.thread.is_alive():
+            self.thread.join()
+
+
+#------------------------------------------
+# to read the blocks of a file ahead of a scan
+# input:
+#       buffer_pool : the buffer_db.BufferPool which reads the file
+#       file_name
+#       first_block : the first block of the scan
+#       end_block   : the block after the last one
+# output:
+#       a generator of (block_id, page), page is None if the block must be read by the pool,
+#       the thread is stopped when the generator is exhausted or closed
+#-------------------------------------------
+def read_ahead(buffer_pool, file_name, first_block, end_block):
+    prefetcher = Prefetcher(buffer_pool.get_handle(buffer_pool.normalize(file_name)), first_block, end_block)
+    writes = buffer_pool.writes
+    prefetcher.start()
+    try:
+        for block_id in range(first_block, end_block):
+            page = prefetcher.get(block_id)
+            if buffer_pool.writes != writes:  # the file may have changed after the block was read
+                page = None
+            yield block_id, page
+    finally:
+        prefetcher.stop()
@@ -10,21 +10,47 @@
 # this module can turn a syntax tree into a query plan tree
 #----------------------------------------------------------
 
+import os
+import time
+import pickle
+import tempfile
+import collections
+import functools
+import heapq
+import operator
+
 import common_db
+import buffer_db
 import storage_db
+import index_db
+import vector_db
+import parallel_db
 import itertools
+
+
+HASH_JOIN_MEMORY=100000    # the maximum number of build records kept in memory by a hash join
+HASH_JOIN_PARTITIONS=16    # the number of partitions spilled to disk when the build input is too large
+HASH_JOIN_MAX_DEPTH=3      # a partition is not split again beyond this depth, e.g. when all its keys are the same
+HASH_AGGREGATE_MEMORY=100000  # the maximum number of groups kept in memory by a hash aggregate, the spilled
+                              # groups use HASH_JOIN_PARTITIONS and HASH_JOIN_MAX_DEPTH as well
+SORT_MEMORY=100000         # the maximum number of records sorted in memory, a larger input is sorted in runs
+SORT_RUN_BLOCK=1000        # the number of records written to a run file at a time
+INDEX_FETCH_BATCH=256      # the positions of the first batch sorted by block and fetched by an index scan
     
 
 #--------------------------------
-# to import the syntax tree, which is defined in parser_db.py
+# the syntax tree is defined in parser_db.py and it is read from common_db.global_syn_tree
+# every time, because a name imported from common_db would never see a new tree
 #-------------------------------------------
-from common_db import global_syn_tree as syn_tree
 
 class parseNode:
     def __init__(self):
         self.sel_list=[]
         self.from_list=[]
         self.where_list=[]
+        self.group_list=[]
+        self.order_list=[]
+        self.limit=None
 
     def get_sel_list(self):
         return self.sel_list
@@ -35,6 +61,15 @@ class parseNode:
     def get_where_list(self):
         return self.where_list
 
+    def get_group_list(self):
+        return self.group_list
+
+    def get_order_list(self):
+        return self.order_list
+
+    def get_limit(self):
+        return self.limit
+
     def update_sel_list(self,self_list):
         self.sel_list = self_list
 
@@ -44,6 +79,18 @@ class parseNode:
     def update_where_list(self,where_list):
         self.where_list = where_list
 
+    def append_where_list(self,condition):
+        self.where_list.append(condition)
+
+    def update_group_list(self,group_list):
+        self.group_list = group_list
+
+    def update_order_list(self,order_list):
+        self.order_list = order_list
+
+    def update_limit(self,limit):
+        self.limit = limit
+
 
 #--------------------------------
 # Author: Shuting Guo shutingnjupt@gmail.com
@@ -52,27 +99,60 @@ class parseNode:
 #       sel_list
 #       from_list
 #       where_list
+#       group_list
+#       order_list
+#       limit
 #--------------------------------
 def extract_sfw_data():
     print('extract_sfw_data begins to execute')
-    if syn_tree is None:
+    if common_db.global_syn_tree is None:
         print ('wrong')
     else:
-        #common_db.show(syn_tree)
+        #common_db.show(common_db.global_syn_tree)
         PN = parseNode()
-        destruct(syn_tree,PN)
-        return PN.get_sel_list(),PN.get_from_list(),PN.get_where_list()
+        destruct(common_db.global_syn_tree,PN)
+        return PN.get_sel_list(),PN.get_from_list(),PN.get_where_list(),PN.get_group_list(),PN.get_order_list(),PN.get_limit()
 
 #---------------------------------
 # Author: Shuting Guo shutingnjupt@gmail.com
 # Query  : SFW
-#   SFW  : SELECT SelList FROM FromList WHERE Condition
+# Query  : EXPLAIN SFW
+# Query  : EXPLAIN ANALYZE SFW
+#   SFW  : SELECT SelList FROM FromList WhereClause GroupClause OrderClause LimitClause
+# WhereClause: WHERE CondList
+# WhereClause: empty
+# GroupClause: GROUP BY GroupList
+# GroupClause: empty
+# OrderClause: ORDER BY OrderList
+# OrderClause: empty
+# LimitClause: LIMIT CONSTANT
+# LimitClause: LIMIT CONSTANT OFFSET CONSTANT
+# LimitClause: empty
 # SelList: TCNAME COMMA SelList
 # SelList: TCNAME
+# SelList: Agg COMMA SelList
+# SelList: Agg
+# Agg    : AGGFUNC LPAREN TCNAME RPAREN
+# Agg    : AGGFUNC LPAREN STAR RPAREN
+# GroupList: TCNAME COMMA GroupList
+# GroupList: TCNAME
+# OrderList: OrderItem COMMA OrderList
+# OrderList: OrderItem
+# OrderItem: TCNAME Direction
+# OrderItem: Agg Direction
 #
 # FromList:TCNAME COMMA FromList
 # FromList:TCNAME
+# CondList: Condition AND CondList
+# CondList: Condition
 # Condition: TCNAME EQX CONSTANT
+# Condition: TCNAME EQX TCNAME
+# Condition: TCNAME COMP CONSTANT
+# Condition: TCNAME BETWEEN CONSTANT AND CONSTANT
+# note: where_list is the list of conditions, each of which is a tuple,
+#       an aggregate in sel_list is a tuple (function, field), the field of count(*) is *
+#       order_list is a list of (field or aggregate, 'asc' or 'desc')
+#       limit is None or (the constant of limit, the constant of offset)
 #---------------------------------
 
 def destruct(nodeobj,PN):
@@ -80,8 +160,20 @@ def destruct(nodeobj,PN):
         if nodeobj.children:
             if nodeobj.value == 'SelList':
                 tmpList=[]
-                show(nodeobj,tmpList)
+                show_sel_list(nodeobj,tmpList)
                 PN.update_sel_list(tmpList)
+            elif nodeobj.value == 'GroupList':
+                tmpList = []
+                show(nodeobj, tmpList)
+                PN.update_group_list([i for i in tmpList if i != ','])
+            elif nodeobj.value == 'OrderList':
+                tmpList = []
+                show_sel_list(nodeobj, tmpList)
+                PN.update_order_list([(tmpList[i], tmpList[i + 1]) for i in range(0, len(tmpList), 3)])
+            elif nodeobj.value == 'LimitClause':
+                tmpList = []
+                show(nodeobj, tmpList)
+                PN.update_limit((tmpList[1], tmpList[3] if len(tmpList) > 3 else '0'))
             elif nodeobj.value == 'FromList':
                 tmpList = []
                 show(nodeobj, tmpList)
@@ -89,7 +181,7 @@ def destruct(nodeobj,PN):
             elif nodeobj.value == 'Cond':
                 tmpList = []
                 show(nodeobj, tmpList)
-                PN.update_where_list(tmpList)
+                PN.append_where_list(tuple(tmpList))
             else:
                 for i in range(len(nodeobj.children)):
                     destruct(nodeobj.children[i],PN)
@@ -104,6 +196,18 @@ def show(nodeobj,tmpList):
     if isinstance(nodeobj,str):
         tmpList.append(nodeobj)
 
+# the same as show, but an aggregate is kept as one tuple, it is used by the select list and order by list
+def show_sel_list(nodeobj,tmpList):
+    for child in nodeobj.children:
+        if isinstance(child,common_db.Node) and child.value == 'Agg':
+            aggList=[]
+            show(child,aggList)
+            tmpList.append(tuple(aggList))
+        elif isinstance(child,common_db.Node) and child.value in ('SelList','OrderList','OrderItem'):
+            show_sel_list(child,tmpList)
+        else:
+            show(child,tmpList)
+
 
 #---------------------------
 #input:
@@ -130,15 +234,102 @@ def construct_from_node(from_list):
             return common_db.Node('X',[construct_from_node(from_list[0:len(from_list)-1]),right_node])
 
 #---------------------------
+# whether a term of the condition is a constant or a field name, a parameter ?n of a prepared
+# statement is a constant, see plan_cache_db.py
+#-----------------------------------
+def is_constant(term):
+    term = term.strip()
+    return term.startswith("'") or term.startswith('?') or term.isdigit()
+
+
+#---------------------------
+# the tables under a node of the from tree
+#-----------------------------------
+def get_table_list(node):
+    if not node.children:
+        return [node.value]
+    table_list = []
+    for child in node.children:
+        table_list.extend(get_table_list(child))
+    return table_list
+
+
+#---------------------------
+# the estimated number of records produced by a node of the from tree
+#-----------------------------------
+def estimate_num_of_records(node):
+    if not node.children:
+        if not os.path.exists(node.value + '.dat'):
+            return 0
+        return storage_db.Storage(node.value).get_num_of_records()
+    num_list = [estimate_num_of_records(child) for child in node.children]
+    if node.value == 'HashJoin':
+        return max(num_list)
+    num_of_records = 1
+    for num in num_list:
+        num_of_records *= num
+    return num_of_records
+
+
+#---------------------------
+# to turn the cross product which brings the two fields of an equality condition together into a hash join,
+# the var of the join node is (left field, right field, the input to build the hash table on)
 #input:
-#       where_list
+#       from_node
+#       condition: (field, '=', field), both fields are qualified by their table names
+#output:
+#       True if the condition is answered by the join, so no filter is needed
+#-----------------------------------
+def choose_join(from_node, condition):
+    if len(condition) != 3 or condition[1] != '=' or is_constant(condition[2]):
+        return False
+    if '.' not in condition[0] or '.' not in condition[2]:
+        return False
+    tableName_1 = condition[0].split('.')[0]
+    tableName_2 = condition[2].split('.')[0]
+    if tableName_1 == tableName_2:
+        return False
+
+    def find_node(node):  # the lowest X node with one table in its left input and the other in its right input
+        if node.value not in ('X', 'HashJoin') or len(node.children) < 2:
+            return None
+        for child in node.children:  # the X node may be under a join made for another condition
+            found = find_node(child)
+            if found:
+                return found
+        if node.value != 'X':
+            return None
+        left_table_list = get_table_list(node.children[0])
+        right_table_list = get_table_list(node.children[1])
+        if tableName_1 in left_table_list and tableName_2 in right_table_list:
+            return node, condition[0], condition[2]
+        if tableName_2 in left_table_list and tableName_1 in right_table_list:
+            return node, condition[2], condition[0]
+        return None
+
+    found = find_node(from_node)
+    if found is None:
+        return False
+    join_node, left_field, right_field = found
+    if estimate_num_of_records(join_node.children[1]) <= estimate_num_of_records(join_node.children[0]):
+        build_side = 'right'
+    else:
+        build_side = 'left'
+    join_node.value = 'HashJoin'
+    join_node.var = (left_field, right_field, build_side)
+    return True
+
+
+#---------------------------
+#input:
+#       where_list: the list of conditions, one filter is made for each of them
 #       from_node
 #output:
 #       a tree
 #-----------------------------------
 def construct_where_node(from_node,where_list):
     if from_node and len(where_list)>0:
-       return common_db.Node('Filter',[from_node],where_list)
+        return common_db.Node('Filter',[construct_where_node(from_node,where_list[1:])],where_list[0])
     elif from_node and len(where_list)==0:# there is no where clause
         return from_node
 
@@ -154,151 +345,1357 @@ def construct_select_node(wf_node,sel_list):
     if wf_node and len(sel_list)>0:
         return common_db.Node('Proj',[wf_node],sel_list)
 
+
+#---------------------------
+# the node which aggregates the records of wf_node by group_list, its var is (group_list, agg_list)
+# and it is made only if there is an aggregate or a group by clause
+#input:
+#       wf_node
+#       sel_list  : the fields and the aggregates (function, field) selected
+#       group_list: the fields of group by
+#output:
+#       a tree
+#-----------------------------------
+def construct_aggregate_node(wf_node,sel_list,group_list):
+    agg_list=[item for item in sel_list if isinstance(item,tuple)]
+    if wf_node and (agg_list or group_list):
+        return common_db.Node('Aggregate',[wf_node],(tuple(group_list),tuple(agg_list)))
+    return wf_node
+
+
+#---------------------------
+# the node which sorts the records of wf_node, its var is a tuple of (field or aggregate, 'asc' or 'desc'),
+# no node is made if the records are read from one table in the order of an index, see choose_index_order
+#input:
+#       wf_node
+#       order_list
+#       from_list
+#output:
+#       a tree
+#-----------------------------------
+def construct_sort_node(wf_node,order_list,from_list):
+    if not wf_node or not order_list or choose_index_order(wf_node,order_list,from_list):
+        return wf_node
+    return common_db.Node('Sort',[wf_node],tuple(order_list))
+
+
+#---------------------------
+# the node which returns limit records after skipping offset records, its var is (limit, offset)
+#input:
+#       wf_node
+#       limit: None or (the constant of limit, the constant of offset)
+#output:
+#       a tree
+#-----------------------------------
+def construct_limit_node(wf_node,limit):
+    if wf_node and limit:
+        return common_db.Node('Limit',[wf_node],limit)
+    return wf_node
+
+
+#---------------------------
+# to read the only table of the query in the order of the index on the sort key, so the sort is skipped
+# it is chosen only if
+#   (1) there is one sort key, which is a field of the table, and the records are not aggregated
+#   (2) the keys of the index are in the order of the values, i.e. the field is not a string longer
+#       than the keys of 10 bytes
+#   (3) there is no index scan on another field, which is expected to read fewer records
+# the var of the table node becomes ('IndexScan', ((field, low, high),), 'asc' or 'desc'), where low
+# and high are those of the index scan on the field or None if there is no condition on it
+#input:
+#       wf_node
+#       order_list
+#       from_list
+#output:
+#       True if the index order is used
+#-----------------------------------
+def choose_index_order(wf_node,order_list,from_list):
+    if len(order_list) != 1 or len(from_list) != 1 or wf_node.value == 'Aggregate':
+        return False
+    name, direction = order_list[0]
+    if not isinstance(name, str):
+        return False
+    tableName = from_list[0]
+    if '.' in name:
+        if name.split('.')[0] != tableName:
+            return False
+        name = name.split('.')[1]
+    if name not in index_db.get_index_field_list(tableName):
+        return False
+    for field in storage_db.Storage(tableName).getFieldList():
+        if field[0].decode('utf-8').strip() == name and field[1] in (0, 1) and field[2] > 10:
+            return False
+
+    node = wf_node
+    while node.children:
+        node = node.children[0]
+    candidate_list = node.var[1] if node.var else ()
+    if any(candidate[0] != name for candidate in candidate_list):
+        return False
+    node.var = ('IndexScan', tuple(candidate_list) or ((name, None, None),), direction)
+    return True
+
+#---------------------------
+# the tables referred to by a condition
+#input:
+#       condition : (field, '=', constant or field)
+#       table_list: the tables under the filter, an unqualified field belongs to the only one of them
+#output:
+#       a list of table names
+#-----------------------------------
+def get_condition_table_list(condition, table_list):
+    term_list = [condition[0]]
+    if not is_constant(condition[2]):
+        term_list.append(condition[2])
+    condition_table_list = []
+    for term in term_list:
+        if '.' in term:
+            condition_table_list.append(term.split('.')[0])
+        elif len(set(table_list)) == 1:
+            condition_table_list.append(table_list[0])
+        else:  # the table of the field is unknown, so the filter stays above all the tables
+            return table_list
+    return condition_table_list
+
+
+#---------------------------
+# to put a filter of condition right above the lowest node under node which has all of its tables
+#input:
+#       condition
+#       node      : the node which the filter is above now
+#       table_list: the tables referred to by condition
+#output:
+#       the new node in the place of node
+#-----------------------------------
+def push_filter(condition, node, table_list):
+    if node.value == 'Filter' or (node.value == 'X' and len(node.children) == 1):
+        node.children[0] = push_filter(condition, node.children[0], table_list)
+        return node
+    if node.value in ('X', 'HashJoin'):
+        for i in range(len(node.children)):
+            if set(table_list) <= set(get_table_list(node.children[i])):
+                node.children[i] = push_filter(condition, node.children[i], table_list)
+                return node
+    return common_db.Node('Filter', [node], condition)
+
+
+#---------------------------
+# the rewrite pass which pushes every filter of the logical tree down to the lowest node having
+# all the tables of its condition, so the inputs of cross products and joins are filtered first
+#input:
+#       node: the root of the logical tree
+#output:
+#       the new root
+#-----------------------------------
+def push_down_predicates(node):
+    if not isinstance(node, common_db.Node) or not node.children:
+        return node
+    node.children = [push_down_predicates(child) for child in node.children]
+    if node.value != 'Filter':
+        return node
+    child = node.children[0]
+    return push_filter(node.var, child, get_condition_table_list(node.var, get_table_list(child)))
+
+
+#----------------------------------
+# to join two inputs by a hash table, the hash table is built on build_records and every record
+# of probe_records looks it up, so the joined records are produced as a stream
+# input
+#       build_records, probe_records : iterables of records
+#       build_key, probe_key         : the functions which return the join key of a record
+#       combine                      : the function which makes a joined record of (build record, probe record)
+#       memory                       : the maximum number of build records kept in memory,
+#                                      None means HASH_JOIN_MEMORY
+# output:
+#       a generator of joined records
+# note: when the build input has more than memory records, both inputs are partitioned by the hash of
+#       their keys into temporary files and the partitions are joined pair by pair
+#---------------------------------------------
+def hash_join(build_records, probe_records, build_key, probe_key, combine, memory=None, depth=0):
+    if memory is None:
+        memory = HASH_JOIN_MEMORY
+    build_iter = iter(build_records)
+    hash_table = {}
+    num_of_records = 0
+    for record in build_iter:
+        hash_table.setdefault(build_key(record), []).append(record)
+        num_of_records += 1
+        if num_of_records > memory and depth < HASH_JOIN_MAX_DEPTH:
+            build_records = itertools.chain(
+                [build_record for record_list in hash_table.values() for build_record in record_list], build_iter)
+            hash_table = None
+            build_file_list = spill_partitions(build_records, build_key, depth)
+            probe_file_list = spill_partitions(probe_records, probe_key, depth)
+            try:
+                for build_file, probe_file in zip(build_file_list, probe_file_list):
+                    for joined_record in hash_join(read_partition(build_file), read_partition(probe_file),
+                                                   build_key, probe_key, combine, memory, depth + 1):
+                        yield joined_record
+            finally:
+                for temp_file in build_file_list + probe_file_list:
+                    temp_file.close()
+            return
+
+    for record in probe_records:
+        for build_record in hash_table.get(probe_key(record), ()):
+            yield combine(build_record, record)
+
+
+#----------------------------------
+# to write records into HASH_JOIN_PARTITIONS temporary files by the hash of their keys
+# output:
+#       the list of files, which are ready to be read
+#---------------------------------------------
+def spill_partitions(records, key, depth):
+    file_list = [tempfile.TemporaryFile() for i in range(HASH_JOIN_PARTITIONS)]
+    for record in records:
+        pickle.dump(record, file_list[hash((depth, key(record))) % HASH_JOIN_PARTITIONS],
+                    pickle.HIGHEST_PROTOCOL)
+    for temp_file in file_list:
+        temp_file.seek(0)
+    return file_list
+
+
+def read_partition(temp_file):
+    while True:
+        try:
+            yield pickle.load(temp_file)
+        except EOFError:
+            return
+
+
+#----------------------------------
+# the aggregate functions, each of them is (initial state, function to add a value to the state,
+# function to turn the state into the result), the value of count(*) is None
+#---------------------------------------------
+AGGREGATE_DICT = {
+    'count': (0, lambda state, value: state + 1, lambda state: state),
+    'sum': (0, lambda state, value: state + value, lambda state: state),
+    'min': (None, lambda state, value: value if state is None or value < state else state, lambda state: state),
+    'max': (None, lambda state, value: value if state is None or value > state else state, lambda state: state),
+    'avg': ((0, 0), lambda state, value: (state[0] + value, state[1] + 1),
+            lambda state: float(state[0]) / state[1] if state[1] else None),
+}
+
+
+#----------------------------------
+# to aggregate records by groups in a hash table, the state of every group is updated as the records
+# stream past, so the memory is proportional to the number of groups instead of the records
+# input
+#       records        : an iterable of records
+#       key            : the function which returns the group of a record
+#       aggregate_list : a list of (function name, field_index), field_index is None for count(*)
+#       memory         : the maximum number of groups kept in memory, None means HASH_AGGREGATE_MEMORY
+# output:
+#       a generator of (group, state_list)
+# note: when there are more than memory groups, the groups in memory go on being updated and the records
+#       of the other groups are partitioned by the hash of their groups into temporary files, which are
+#       aggregated one by one after the groups in memory have been returned
+#---------------------------------------------
+def hash_aggregate(records, key, aggregate_list, memory=None, depth=0):
+    if memory is None:
+        memory = HASH_AGGREGATE_MEMORY
+    step_list = [(AGGREGATE_DICT[function][1], field_index) for (function, field_index) in aggregate_list]
+    initial_state = [AGGREGATE_DICT[function][0] for (function, field_index) in aggregate_list]
+
+    def update(state_list, record):
+        for i in range(len(step_list)):
+            step, field_index = step_list[i]
+            state_list[i] = step(state_list[i], None if field_index is None else record[field_index])
+
+    def rest(first_record, record_iter):  # the records of the groups which are not in memory
+        yield first_record
+        for record in record_iter:
+            state_list = group_dict.get(key(record))
+            if state_list is None:
+                yield record
+            else:
+                update(state_list, record)
+
+    group_dict = {}
+    file_list = []
+    record_iter = iter(records)
+    for record in record_iter:
+        group = key(record)
+        state_list = group_dict.get(group)
+        if state_list is None:
+            if len(group_dict) >= memory and depth < HASH_JOIN_MAX_DEPTH:
+                file_list = spill_partitions(rest(record, record_iter), key, depth)
+                break
+            state_list = group_dict[group] = list(initial_state)
+        update(state_list, record)
+
+    try:
+        for group, state_list in group_dict.items():
+            yield group, state_list
+        group_dict = None
+        for temp_file in file_list:
+            for group, state_list in hash_aggregate(read_partition(temp_file), key, aggregate_list,
+                                                    memory, depth + 1):
+                yield group, state_list
+    finally:
+        for temp_file in file_list:
+            temp_file.close()
+
+
+#----------------------------------
+# to sort records by an external merge sort, the records are sorted in memory by runs of memory records
+# and the runs are written to temporary files, then the runs are merged by a heap
+# input
+#       records : an iterable of records
+#       key     : the function which returns the sort key of a record
+#       reverse : whether the records are in descending order of the key
+#       memory  : the maximum number of records sorted in memory, None means SORT_MEMORY
+# output:
+#       a generator of sorted records
+# note: the records are written to a run file by blocks of SORT_RUN_BLOCK records, so a run is read
+#       back one block at a time, and the last run is merged from memory
+#---------------------------------------------
+def external_sort(records, key, reverse=False, memory=None):
+    if memory is None:
+        memory = SORT_MEMORY
+    run_file_list = []
+    try:
+        record_list = []
+        for record in records:
+            record_list.append(record)
+            if len(record_list) >= memory:
+                record_list.sort(key=key, reverse=reverse)
+                run_file_list.append(write_run(record_list))
+                record_list = []
+        record_list.sort(key=key, reverse=reverse)
+        if not run_file_list:
+            for record in record_list:
+                yield record
+            return
+        run_list = [read_run(run_file) for run_file in run_file_list] + [iter(record_list)]
+        for record in heapq.merge(*run_list, key=key, reverse=reverse):
+            yield record
+    finally:
+        for run_file in run_file_list:
+            run_file.close()
+
+
+def write_run(record_list):
+    run_file = tempfile.TemporaryFile()
+    for i in range(0, len(record_list), SORT_RUN_BLOCK):
+        pickle.dump(record_list[i:i + SORT_RUN_BLOCK], run_file, pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0)
+    return run_file
+
+
+def read_run(run_file):
+    for block in read_partition(run_file):
+        for record in block:
+            yield record
+
+
+#----------------------------------
+# to make the key function of external_sort for sort keys in different directions
+# input
+#       key_list : a list of (field_index, descending)
+# output:
+#       (key, reverse), the key compares the fields one by one if the directions are mixed
+#---------------------------------------------
+def make_sort_key(key_list):
+    index_list = [field_index for (field_index, descending) in key_list]
+    if len(set(descending for (field_index, descending) in key_list)) == 1:
+        return (lambda record: tuple(record[i] for i in index_list)), key_list[0][1]
+
+    def compare(record_1, record_2):
+        for (field_index, descending) in key_list:
+            if record_1[field_index] != record_2[field_index]:
+                less = record_1[field_index] < record_2[field_index]
+                return (1 if less else -1) if descending else (-1 if less else 1)
+        return 0
+
+    return functools.cmp_to_key(compare), False
+
+
+#----------------------------------
+# the physical operators of a query plan, every operator has
+#   open()     : to prepare the operator and its inputs
+#   next()     : to return the next record, which is a tuple, or None if there are no more records
+#   close()    : to release the operator and its inputs
+#   field_list : a list of (table name, field name, field type) for the fields of its records
+# the records flow through the operators one at a time, so no intermediate result is copied
+#---------------------------------------------
+class Operator(object):
+    def __init__(self, children, field_list):
+        self.children = children
+        self.field_list = field_list
+
+    def open(self):
+        for child in self.children:
+            child.open()
+
+    def next(self):
+        return None
+
+    def close(self):
+        for child in self.children:
+            child.close()
+
+    # the text of the operator shown by EXPLAIN
+    def describe(self):
+        return self.__class__.__name__
+
+    # the records as a generator, it is used by the operators which consume a whole input
+    def __iter__(self):
+        record = self.next()
+        while record is not None:
+            yield record
+            record = self.next()
+
+
+#----------------------------------
+# to read the records of a table, by its cursor or by an index scan
+# input
+#       tableName
+#       access_path : None, or ('IndexScan', ((field name, low, high), ...)) chosen by choose_access_path
+#---------------------------------------------
+class Scan(Operator):
+    def __init__(self, tableName, access_path=None):
+        self.tableName = tableName
+        self.access_path = access_path
+        self.index_condition = None  # the (field name, low, high) whose index is used
+        self.table_obj = storage_db.Storage(tableName)
+        self.records = None
+        Operator.__init__(self, [], [(tableName, field[0].decode('utf-8').strip(), field[1])
+                                     for field in self.table_obj.getFieldList()])
+
+    def open(self):
+        if self.access_path and self.access_path[0] == 'IndexScan':
+            # every candidate index is probed and only the records found by the most selective one are read,
+            # the ranges are probed only if there is no equality since they may cover most of the table
+            candidate_list = [c for c in self.access_path[1] if c[1] is not None and c[1] == c[2]] or \
+                self.access_path[1]
+            keep_order = len(self.access_path) > 2  # the records are returned in the order of the index
+            position_iter_list = []
+            for (fieldName, low, high) in candidate_list:
+                index_obj = index_db.Index(self.tableName, fieldName)
+                if low is not None and low == high:
+                    position_iter = index_obj.search(low.strip("'"))
+                else:
+                    position_iter = index_obj.range_search(low and low.strip("'"), high and high.strip("'"),
+                                                           keep_order and self.access_path[2] == 'desc')
+                position_iter_list.append(((fieldName, low, high), position_iter))
+            self.index_condition, position_iter = self.choose_index(position_iter_list)
+            if keep_order:
+                self.records = self.table_obj.fetch_records(position_iter, keep_order=True)
+            else:
+                self.records = self.fetch_by_batch(position_iter)
+        else:
+            self.records = self.table_obj.cursor()
+
+    #------------------------------
+    # to choose the candidate index which finds the fewest records, the indexes are walked side by side
+    # until one of them has no more positions, so no index is read much beyond the chosen one and a single
+    # candidate is not read before the records are taken
+    # input
+    #       position_iter_list : a list of ((field name, low, high), generator of positions)
+    # output
+    #       ((field name, low, high), the positions of the chosen candidate)
+    #--------------------------------------
+    def choose_index(self, position_iter_list):
+        if len(position_iter_list) == 1:
+            return position_iter_list[0]
+        found_list = [[] for x in position_iter_list]
+        while True:
+            for (i, (condition, position_iter)) in enumerate(position_iter_list):
+                position = next(position_iter, None)
+                if position is None:
+                    for (other_condition, other_iter) in position_iter_list:
+                        other_iter.close()
+                    return condition, iter(found_list[i])
+                found_list[i].append(position)
+
+    #------------------------------
+    # to fetch the records at the positions found by an index in batches, each batch is sorted so that
+    # its blocks are read once, and a scan closed early, e.g. by a limit, reads no more leaves
+    # note: the first batch has INDEX_FETCH_BATCH positions and the size is doubled for every next one,
+    #       so a long scan reads each block only a few times
+    #--------------------------------------
+    def fetch_by_batch(self, position_iter):
+        batch_size = INDEX_FETCH_BATCH
+        while True:
+            position_list = list(itertools.islice(position_iter, batch_size))
+            if not position_list:
+                return
+            for record in self.table_obj.fetch_records(position_list):
+                yield record
+            batch_size *= 2
+
+    def next(self):
+        return next(self.records, None)
+
+    def close(self):
+        if self.records is not None:
+            self.records.close()  # no more blocks are read
+        self.records = None
+
+    def describe(self):
+        if not self.access_path or self.access_path[0] != 'IndexScan':
+            return 'Scan %s' % self.tableName
+        if self.index_condition:
+            text = 'IndexScan ' + self.describe_range(self.index_condition)
+        else:  # it is not opened yet
+            text = 'IndexScan %s by one of %s' % (self.tableName, ', '.join(
+                self.describe_range(condition) for condition in self.access_path[1]))
+        if len(self.access_path) > 2:
+            text += ', in index order %s' % self.access_path[2]
+        return text
+
+    def describe_range(self, condition):
+        fieldName, low, high = condition
+        name = self.tableName + '.' + fieldName
+        if low is None and high is None:
+            return name
+        if low == high:
+            return '%s = %s' % (name, low)
+        if high is None:
+            return '%s >= %s' % (name, low)
+        if low is None:
+            return '%s <= %s' % (name, high)
+        return '%s <= %s <= %s' % (low, name, high)
+
+
+#----------------------------------
+# to return the records of its input which satisfy all the predicates, the predicates are evaluated
+# in the given order and the evaluation of a record stops at the first false one
+# input
+#       child
+#       predicate_list : a list of (field_index, op, value, other_index)
+#           field_index : the position of the field in the records
+#           op          : one of COMPARE_DICT
+#           value       : the constant, which has been converted to the type of the field
+#           other_index : the position of the other field, None if the field is compared with value
+#---------------------------------------------
+class Filter(Operator):
+    def __init__(self, child, predicate_list):
+        Operator.__init__(self, [child], child.field_list)
+        self.predicate_list = predicate_list
+        self.check_list = [(field_index, COMPARE_DICT[op], value, other_index)
+                           for (field_index, op, value, other_index) in predicate_list]
+
+    def next(self):
+        record = self.children[0].next()
+        while record is not None:
+            for (field_index, compare, value, other_index) in self.check_list:
+                if not compare(record[field_index], value if other_index is None else record[other_index]):
+                    break
+            else:
+                return record
+            record = self.children[0].next()
+        return None
+
+    def describe(self):
+        return 'Filter ' + describe_predicates(self.field_list, self.predicate_list)
+
+
+#----------------------------------
+# the text of the predicates of a filter, which is shown by EXPLAIN
+#---------------------------------------------
+def describe_predicates(field_list, predicate_list):
+    text_list = []
+    for (field_index, op, value, other_index) in predicate_list:
+        if other_index is None:
+            text_list.append('%s %s %r' % (get_field_name(field_list[field_index]), op, value))
+        else:
+            text_list.append('%s %s %s' % (get_field_name(field_list[field_index]), op,
+                                           get_field_name(field_list[other_index])))
+    return ' and '.join(text_list)
+
+
+#----------------------------------
+# to read all the records of a table by vector_db.scan, the predicates pushed into it by
+# build_operator_tree are evaluated as masks over blocks of records
+# input
+#       tableName
+#---------------------------------------------
+class VectorScan(Scan):
+    def __init__(self, tableName):
+        Scan.__init__(self, tableName)
+        self.predicate_list = []  # the predicates of the filter above, see Filter
+
+    def open(self):
+        self.records = vector_db.scan(self.table_obj, [(field_index, COMPARE_DICT[op], value, other_index)
+                                                       for (field_index, op, value, other_index) in self.predicate_list])
+
+    def describe(self):
+        if self.predicate_list:
+            return 'VectorScan %s where %s' % (self.tableName, describe_predicates(self.field_list, self.predicate_list))
+        return 'VectorScan %s' % self.tableName
+
+
+#----------------------------------
+# to read all the records of a table by the worker processes of parallel_db.scan, all the
+# predicates of the filter above are pushed into it by build_operator_tree and evaluated
+# by the workers, so only the records which pass them are sent back
+# input
+#       tableName
+#---------------------------------------------
+class ParallelScan(Scan):
+    def __init__(self, tableName):
+        Scan.__init__(self, tableName)
+        self.predicate_list = []
+
+    def open(self):
+        self.records = parallel_db.scan(self.table_obj, [(field_index, COMPARE_DICT[op], value, other_index)
+                                                         for (field_index, op, value, other_index) in self.predicate_list])
+
+    def describe(self):
+        text = 'ParallelScan %s by %d workers' % (self.tableName, parallel_db.PARALLEL_SCAN_WORKERS)
+        if self.predicate_list:
+            text += ' where ' + describe_predicates(self.field_list, self.predicate_list)
+        return text
+
+
+#----------------------------------
+# to return the selected fields of the records of its input
+# input
+#       child
+#       field_index_list : the positions of the selected fields
+#---------------------------------------------
+class Project(Operator):
+    def __init__(self, child, field_index_list):
+        Operator.__init__(self, [child], [child.field_list[i] for i in field_index_list])
+        self.field_index_list = field_index_list
+
+    def next(self):
+        record = self.children[0].next()
+        if record is None:
+            return None
+        return tuple(record[i] for i in self.field_index_list)
+
+    def describe(self):
+        return 'Project %s' % ','.join(get_field_name(field) for field in self.field_list)
+
+
+#----------------------------------
+# the cross product of two inputs, the right input is kept in memory and the left one is streamed
+#---------------------------------------------
+class CrossProduct(Operator):
+    def __init__(self, left, right):
+        Operator.__init__(self, [left, right], left.field_list + right.field_list)
+        self.right_list = []
+        self.left_record = None
+        self.right_pos = 0
+
+    def open(self):
+        Operator.open(self)
+        self.right_list = list(self.children[1])
+        self.left_record = None
+        self.right_pos = 0
+
+    def next(self):
+        while self.left_record is None or self.right_pos >= len(self.right_list):
+            if not self.right_list:
+                return None
+            self.left_record = self.children[0].next()
+            self.right_pos = 0
+            if self.left_record is None:
+                return None
+        record = self.left_record + self.right_list[self.right_pos]
+        self.right_pos += 1
+        return record
+
+    def close(self):
+        Operator.close(self)
+        self.right_list = []
+
+
+#----------------------------------
+# the equi-join of two inputs by hash_join
+# input
+#       left, right
+#       left_index, right_index : the positions of the join fields in the records of left and right
+#       build_side              : 'left' or 'right', the input which the hash table is built on
+#---------------------------------------------
+class HashJoin(Operator):
+    def __init__(self, left, right, left_index, right_index, build_side):
+        Operator.__init__(self, [left, right], left.field_list + right.field_list)
+        self.left_index = left_index
+        self.right_index = right_index
+        self.build_side = build_side
+        self.records = None
+
+    def open(self):
+        Operator.open(self)
+        left, right = self.children
+        left_key = lambda record: record[self.left_index]
+        right_key = lambda record: record[self.right_index]
+        if self.build_side == 'right':
+            self.records = hash_join(right, left, right_key, left_key,
+                                     lambda build_record, probe_record: probe_record + build_record)
+        else:
+            self.records = hash_join(left, right, left_key, right_key,
+                                     lambda build_record, probe_record: build_record + probe_record)
+
+    def next(self):
+        return next(self.records, None)
+
+    def close(self):
+        if self.records is not None:
+            self.records.close()  # the temporary files of a spilled join are removed
+        self.records = None
+        Operator.close(self)
+
+    def describe(self):
+        return 'HashJoin %s = %s, build on %s' % (get_field_name(self.children[0].field_list[self.left_index]),
+                                                  get_field_name(self.children[1].field_list[self.right_index]),
+                                                  self.build_side)
+
+
+#----------------------------------
+# to aggregate the records of its input by hash_aggregate, a record of the result is the fields of
+# its group followed by the aggregates
+# input
+#       child
+#       group_index_list : the positions of the group by fields in the records of child
+#       aggregate_list   : a list of (function name, field_index), field_index is None for count(*)
+# note: without group by there is one group, so one record is returned even if the input is empty
+#---------------------------------------------
+class HashAggregate(Operator):
+    def __init__(self, child, group_index_list, aggregate_list):
+        field_list = [child.field_list[i] for i in group_index_list]
+        for (function, field_index) in aggregate_list:
+            if function == 'count':
+                field_type = 2
+            else:
+                field_type = child.field_list[field_index][2]
+            field_list.append(('', get_aggregate_name(child.field_list, function, field_index), field_type))
+        Operator.__init__(self, [child], field_list)
+        self.group_index_list = group_index_list
+        self.aggregate_list = aggregate_list
+        self.records = None
+
+    def open(self):
+        Operator.open(self)
+        self.records = self.aggregate()
+
+    def aggregate(self):
+        final_list = [AGGREGATE_DICT[function][2] for (function, field_index) in self.aggregate_list]
+        group_index_list = self.group_index_list
+        key = lambda record: tuple(record[i] for i in group_index_list)
+        num_of_groups = 0
+        for group, state_list in hash_aggregate(self.children[0], key, self.aggregate_list):
+            num_of_groups += 1
+            yield group + tuple(final(state) for (final, state) in zip(final_list, state_list))
+        if num_of_groups == 0 and not group_index_list:
+            yield tuple(AGGREGATE_DICT[function][2](AGGREGATE_DICT[function][0])
+                        for (function, field_index) in self.aggregate_list)
+
+    def next(self):
+        return next(self.records, None)
+
+    def close(self):
+        if self.records is not None:
+            self.records.close()  # the temporary files of the spilled groups are removed
+        self.records = None
+        Operator.close(self)
+
+    def describe(self):
+        text = 'HashAggregate ' + ', '.join(field[1] for field in self.field_list[len(self.group_index_list):])
+        if self.group_index_list:
+            text += ' group by ' + ', '.join(get_field_name(field)
+                                             for field in self.field_list[:len(self.group_index_list)])
+        return text
+
+
+#----------------------------------
+# to sort the records of its input by external_sort
+# input
+#       child
+#       key_list : a list of (field_index, descending)
+#       top      : None, or the number of the first records needed, which are kept in a heap of that size
+#                  instead of sorting all the records
+#---------------------------------------------
+class Sort(Operator):
+    def __init__(self, child, key_list, top=None):
+        Operator.__init__(self, [child], child.field_list)
+        self.key_list = key_list
+        self.top = top
+        self.records = None
+
+    def open(self):
+        Operator.open(self)
+        key, reverse = make_sort_key(self.key_list)
+        if self.top is not None:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            self.records = iter(select(self.top, self.children[0], key=key))
+        else:
+            self.records = external_sort(self.children[0], key, reverse)
+
+    def next(self):
+        return next(self.records, None)
+
+    def close(self):
+        if self.records is not None and self.top is None:
+            self.records.close()  # the run files are removed
+        self.records = None
+        Operator.close(self)
+
+    def describe(self):
+        text = 'Sort ' + ', '.join('%s %s' % (get_field_name(self.field_list[field_index]),
+                                              'desc' if descending else 'asc')
+                                   for (field_index, descending) in self.key_list)
+        if self.top is not None:
+            text += ', top %d by heap' % self.top
+        return text
+
+
+#----------------------------------
+# to return limit records of its input after skipping offset records, the input is closed as soon as
+# the last record is returned, so the scans below stop reading blocks
+# input
+#       child
+#       limit
+#       offset
+#---------------------------------------------
+class Limit(Operator):
+    def __init__(self, child, limit, offset=0):
+        Operator.__init__(self, [child], child.field_list)
+        self.limit = limit
+        self.offset = offset
+        self.num_of_records = 0  # the records returned or skipped
+
+    def open(self):
+        Operator.open(self)
+        self.num_of_records = 0
+
+    def next(self):
+        if self.num_of_records >= self.offset + self.limit:
+            return None
+        record = self.children[0].next()
+        while record is not None and self.num_of_records < self.offset:
+            self.num_of_records += 1
+            record = self.children[0].next()
+        if record is None:
+            self.num_of_records = self.offset + self.limit
+        else:
+            self.num_of_records += 1
+        if self.num_of_records >= self.offset + self.limit:
+            Operator.close(self)
+        return record
+
+    def describe(self):
+        if self.offset:
+            return 'Limit %d offset %d' % (self.limit, self.offset)
+        return 'Limit %d' % self.limit
+
+
+#----------------------------------
+# the name of an aggregate, e.g. sum(t1.f1) or count(*)
+#---------------------------------------------
+def get_aggregate_name(field_list, function, field_index):
+    if field_index is None:
+        return function + '(*)'
+    return '%s(%s)' % (function, get_field_name(field_list[field_index]))
+
+
+#----------------------------------
+# to measure the operator below it for EXPLAIN ANALYZE, the wall time and the blocks of the buffer pool
+# include the work of the operators below, i.e. they are inclusive
+#---------------------------------------------
+class Analyze(Operator):
+    def __init__(self, child):
+        Operator.__init__(self, [child], child.field_list)
+        self.buffer_pool = buffer_db.get_buffer_pool()
+        self.rows = 0
+        self.time = 0.0
+        self.blocks_read = 0  # the blocks read from files, i.e. the misses of the buffer pool
+        self.blocks_hit = 0
+
+    def measure(self, func):
+        begin, hits, misses = time.perf_counter(), self.buffer_pool.hits, self.buffer_pool.misses
+        result = func()
+        self.time += time.perf_counter() - begin
+        self.blocks_hit += self.buffer_pool.hits - hits
+        self.blocks_read += self.buffer_pool.misses - misses
+        return result
+
+    def open(self):
+        self.measure(lambda: Operator.open(self))
+
+    def next(self):
+        record = self.measure(self.children[0].next)
+        if record is not None:
+            self.rows += 1
+        return record
+
+    def describe(self):
+        return self.children[0].describe()
+
+
+#----------------------------------
+# to put an Analyze operator above every operator of the tree
+#---------------------------------------------
+def instrument(operator):
+    operator.children = [instrument(child) for child in operator.children]
+    return Analyze(operator)
+
+
+#----------------------------------
+# the bytes of records decoded by the scans under an operator
+#---------------------------------------------
+def get_bytes_decoded(operator):
+    if isinstance(operator, Scan):
+        return operator.table_obj.bytes_decoded
+    return sum(get_bytes_decoded(child) for child in operator.children)
+
+
+#----------------------------------
+# to print the logical tree, one node per line, the children are indented
+#---------------------------------------------
+def show_logical_tree(node, depth=0):
+    if node.var:
+        print ('  ' * depth + '%s %s' % (node.value, node.var))
+    else:
+        print ('  ' * depth + node.value)
+    for child in node.children:
+        show_logical_tree(child, depth + 1)
+
+
+#----------------------------------
+# to print the tree of physical operators, the statistics are printed if it is instrumented
+#---------------------------------------------
+def show_operator_tree(operator, depth=0):
+    if isinstance(operator, Analyze):
+        child_list = operator.children[0].children
+        rows_in = sum(child.rows for child in child_list) if child_list else operator.rows
+        self_time = operator.time - sum(child.time for child in child_list)
+        print ('  ' * depth + '%s  (rows in=%d out=%d, time=%.3fms self=%.3fms, blocks read=%d hit=%d, '
+               'bytes decoded=%d)' % (operator.describe(), rows_in, operator.rows, operator.time * 1000,
+                                      self_time * 1000, operator.blocks_read, operator.blocks_hit,
+                                      get_bytes_decoded(operator)))
+    else:
+        child_list = operator.children
+        print ('  ' * depth + operator.describe())
+    for child in child_list:
+        show_operator_tree(child, depth + 1)
+
+
+#----------------------------------
+# to show the plan of a query, the query is executed if it is EXPLAIN ANALYZE
+# input
+#       explain_node: the root of the logical tree, whose var is 'plan' or 'analyze'
+#---------------------------------------------
+def explain(explain_node):
+    print ('logical plan:')
+    show_logical_tree(explain_node.children[0], 1)
+
+    root = build_operator_tree(explain_node.children[0])
+    if root is None:
+        print ('WRONG SQL INPUT!')
+        return
+    if explain_node.var == 'analyze':
+        root = instrument(root)
+        begin = time.perf_counter()
+        root.open()
+        while root.next() is not None:  # the records are counted, not printed
+            pass
+        root.close()
+        print ('physical plan: %d records in %.3fms' % (root.rows, (time.perf_counter() - begin) * 1000))
+    else:
+        print ('physical plan:')
+    show_operator_tree(root, 1)
+
+
+#----------------------------------
+# the name of a field in field_list, i.e. table name.field name, an aggregate has no table name
+#---------------------------------------------
+def get_field_name(field):
+    if not field[0]:
+        return field[1]
+    return field[0].strip() + '.' + field[1]
+
+
+#----------------------------------
+# the position of a field in field_list, a field name may be qualified by its table name
+# and an aggregate is given as (function, field)
+# output:
+#       the position, or None if there is no such field
+#---------------------------------------------
+def get_field_index(field_list, name):
+    if isinstance(name, tuple):  # it is found among the aggregates, whose names are made by get_aggregate_name
+        return get_aggregate_index(field_list, name)
+    if '.' in name:
+        tableName, fieldName = name.split('.', 1)
+    else:
+        tableName, fieldName = None, name
+    for i in range(len(field_list)):
+        if field_list[i][1] == fieldName and tableName in (None, field_list[i][0]):
+            return i
+    print('field %s does not exist' % name)
+    return None
+
+
+def get_aggregate_index(field_list, aggregate):
+    function, name = aggregate
+    for i in range(len(field_list)):
+        if field_list[i][0] or not field_list[i][1].startswith(function + '('):
+            continue
+        field_name = field_list[i][1][len(function) + 1:-1]
+        if field_name == name or (name != '*' and '.' not in name and field_name.split('.')[-1] == name):
+            return i
+    print('aggregate %s(%s) does not exist' % aggregate)
+    return None
+
+
+#----------------------------------
+# to turn a constant of the condition into the type of the field
+#---------------------------------------------
+def convert_constant(term, field_type):
+    term = term.strip()
+    if field_type == 2:
+        return int(term)
+    if field_type == 3:
+        return bool(term)
+    return term.strip("'").encode('utf-8')
+
+
+#----------------------------------
+# to turn a condition into a predicate of Filter
+# input
+#       field_list : the fields of the records to be filtered
+#       condition  : (field, op, constant or field), op is one of COMPARE_DICT
+# output:
+#       (field_index, op, value, other_index), or None if the condition is wrong
+#---------------------------------------------
+COMPARE_DICT = {'=': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+def make_predicate(field_list, condition):
+    if condition[1] not in COMPARE_DICT:
+        print('unknown operator %s' % condition[1])
+        return None
+    field_index = get_field_index(field_list, condition[0])
+    if field_index is None:
+        return None
+    if not is_constant(condition[2]):  # two fields of the same record are compared
+        other_index = get_field_index(field_list, condition[2])
+        if other_index is None:
+            return None
+        return (field_index, condition[1], None, other_index)
+    try:
+        return (field_index, condition[1], convert_constant(condition[2], field_list[field_index][2]), None)
+    except ValueError:
+        print('%s is not a value of field %s' % (condition[2], condition[0]))
+        return None
+
+
+#----------------------------------
+# to order the predicates of a filter by rank = (selectivity - 1) / cost, so the predicates which reject
+# most records at the least cost are evaluated first
+# note: there are no statistics of values, so an equality on a bool field is estimated to keep half of
+#       the records, any other equality EQUAL_SELECTIVITY and a comparison RANGE_SELECTIVITY,
+#       comparing strings costs twice as much
+#---------------------------------------------
+EQUAL_SELECTIVITY=0.1
+RANGE_SELECTIVITY=1.0/3
+
+def order_predicates(field_list, predicate_list):
+    def rank(predicate):
+        field_type = field_list[predicate[0]][2]
+        if predicate[1] != '=':
+            selectivity = RANGE_SELECTIVITY
+        else:
+            selectivity = 0.5 if field_type == 3 else EQUAL_SELECTIVITY
+        cost = 2.0 if field_type in (0, 1) else 1.0
+        return (selectivity - 1) / cost
+
+    return sorted(predicate_list, key=rank)
+
+
+#----------------------------------
+# to turn the logical query plan tree into a tree of physical operators
+# input
+#       node: a node of the logical tree
+# output:
+#       the root operator, or None if the query is wrong
+#---------------------------------------------
+def build_operator_tree(node):
+    if not node.children:  # a table, its var is the access path
+        if not node.var and vector_db.is_enabled():
+            return VectorScan(node.value)
+        if not node.var and parallel_db.is_enabled(storage_db.Storage(node.value).data_block_num):
+            return ParallelScan(node.value)  # the small tables are scanned serially
+        return Scan(node.value, node.var)
+
+    if node.value == 'Filter':  # the conditions of a chain of filters are evaluated by one operator
+        condition_list = []
+        while node.value == 'Filter':
+            condition_list.append(node.var)
+            node = node.children[0]
+        child = build_operator_tree(node)
+        if child is None:
+            return None
+        predicate_list = [make_predicate(child.field_list, condition) for condition in condition_list]
+        if None in predicate_list:
+            return None
+        predicate_list = order_predicates(child.field_list, predicate_list)
+        if isinstance(child, VectorScan):  # the predicates which can be masks are evaluated by the scan
+            child.predicate_list = [p for p in predicate_list if vector_db.can_vectorize(child.table_obj.codec, p)]
+            predicate_list = [p for p in predicate_list if p not in child.predicate_list]
+            if not predicate_list:
+                return child
+        if isinstance(child, ParallelScan):  # all the predicates are evaluated by the workers
+            child.predicate_list = predicate_list
+            return child
+        return Filter(child, predicate_list)
+
+    if node.value == 'Limit':
+        try:
+            limit, offset = [int(term) for term in node.var]
+        except ValueError:
+            print('limit and offset must be integers')
+            return None
+        if node.children[0].value == 'Sort':  # only the first offset+limit records are sorted
+            sort_node = node.children[0]
+            child = build_operator_tree(sort_node.children[0])
+            children = [child and build_sort(sort_node, child, limit + offset)]
+        else:
+            children = [build_operator_tree(node.children[0])]
+        if children[0] is None:
+            return None
+        return Limit(children[0], limit, offset)
+
+    children = [build_operator_tree(child) for child in node.children]
+    if any(child is None for child in children):
+        return None
+
+    if node.value == 'X':
+        if len(children) == 1:
+            return children[0]
+        return CrossProduct(children[0], children[1])
+
+    if node.value == 'HashJoin':
+        left_field, right_field, build_side = node.var
+        left_index = get_field_index(children[0].field_list, left_field)
+        right_index = get_field_index(children[1].field_list, right_field)
+        if left_index is None or right_index is None:
+            return None
+        return HashJoin(children[0], children[1], left_index, right_index, build_side)
+
+    if node.value == 'Aggregate':
+        group_list, agg_list = node.var
+        group_index_list = [get_field_index(children[0].field_list, name) for name in group_list]
+        aggregate_list = []
+        for (function, name) in agg_list:
+            field_index = None if name == '*' else get_field_index(children[0].field_list, name)
+            if name != '*' and field_index is None:
+                return None
+            if function in ('sum', 'avg') and (name == '*' or children[0].field_list[field_index][2] != 2):
+                print('%s(%s) needs a field of integers' % (function, name))
+                return None
+            if function in ('min', 'max') and name == '*':
+                print('%s(*) is wrong' % function)
+                return None
+            aggregate_list.append((function, field_index))
+        if None in group_index_list:
+            return None
+        return HashAggregate(children[0], group_index_list, aggregate_list)
+
+    if node.value == 'Sort':
+        return build_sort(node, children[0])
+
+    if node.value == 'Proj':
+        field_index_list = [get_field_index(children[0].field_list, name) for name in node.var]
+        if None in field_index_list:
+            return None
+        return Project(children[0], field_index_list)
+
+    print('unknown node %s in the query plan tree' % node.value)
+    return None
+
+
+#----------------------------------
+# to make the Sort operator of a sort node above child
+# input
+#       node  : the sort node, whose var is a tuple of (field or aggregate, 'asc' or 'desc')
+#       child : the operator of the input
+#       top   : see Sort
+#---------------------------------------------
+def build_sort(node, child, top=None):
+    key_list = []
+    for (name, direction) in node.var:
+        field_index = get_field_index(child.field_list, name)
+        if field_index is None:
+            return None
+        key_list.append((field_index, direction == 'desc'))
+    return Sort(child, key_list, top)
+
+
+#----------------------------------
+# the cache of query results, an entry is keyed by the plan tree whose constants are bound and it keeps
+# the versions of the tables in the plan, see storage_db.get_table_version, so an entry is dropped
+# instead of being returned once one of its tables has been changed
+# the cache is off by default, it is turned on by setting common_db.RESULT_CACHE_SIZE to the number
+# of records to keep before the first query
+#---------------------------------------------
+class ResultCache(object):
+
+    #------------------------------
+    # constructor of the class
+    # input:
+    #       size: the maximum number of records in all the entries, an entry counts one more
+    #-------------------------------------
+    def __init__(self, size=common_db.RESULT_CACHE_SIZE):
+        self.size = size
+        self.used = 0
+        self.result_dict = collections.OrderedDict()  # plan key->(version list, field names, records), the last one is the most recently used
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version_list):
+        entry = self.result_dict.get(key)
+        if entry is not None and entry[0] != version_list:  # a table has been changed since the result was cached
+            self.remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.result_dict.move_to_end(key)
+        return entry[1], entry[2]
+
+    def put(self, key, version_list, field_names, record_list):
+        if len(record_list) + 1 > self.size:
+            return
+        if key in self.result_dict:
+            self.remove(key)
+        self.result_dict[key] = (version_list, field_names, record_list)
+        self.used += len(record_list) + 1
+        while self.used > self.size:  # the least recently used entries are evicted
+            self.remove(next(iter(self.result_dict)))
+
+    def remove(self, key):
+        self.used -= len(self.result_dict.pop(key)[2]) + 1
+
+    def clear(self):
+        self.result_dict.clear()
+        self.used = 0
+
+    def get_stats(self):
+        return {'size': self.size, 'used': self.used, 'results': len(self.result_dict), 'hits': self.hits,
+                'misses': self.misses}
+
+
+#------------------------------------------
+# to get the global_result_cache in common_db.py, it is created at the first call
+#-------------------------------------------
+def get_result_cache():
+    if common_db.global_result_cache is None:
+        common_db.global_result_cache = ResultCache(common_db.RESULT_CACHE_SIZE)
+    return common_db.global_result_cache
+
+
+#----------------------------------
+# the key of a plan tree in the result cache, the tree with all its constants as nested tuples
+#---------------------------------------------
+def get_plan_key(node):
+    if not isinstance(node, common_db.Node):
+        return node
+    var = tuple(node.var) if isinstance(node.var, list) else node.var
+    return (node.value, var, tuple(get_plan_key(child) for child in node.children))
+
+
 #----------------------------------
 # Author: Shuting Guo shutingnjupt@gmail.com
-# to execute the query plan and return the result
+# to execute the query plan and print the result, the result is taken from the result cache
+# if the same plan has been executed and its tables have not been changed since then
 # input
 #       global logical tree
 #---------------------------------------------
 
 def execute_logical_tree():
     if common_db.global_logical_tree:
-        def excute_tree():
-
-            idx = 0
-            dict_ = {}
-
-            def show(node_obj, idx, dict_):
-                if isinstance(node_obj, common_db.Node):  # it is a Node object
-                    dict_.setdefault(idx, [])
-                    dict_[idx].append(node_obj.value)
-                    if node_obj.var:
-                        dict_[idx][-1] = tuple((dict_[idx][-1], node_obj.var))
-                    if node_obj.children:
-                        for i in range(len(node_obj.children)):
-                            show(node_obj.children[i], idx + 1, dict_)
-
-            show(common_db.global_logical_tree, idx, dict_)
-            idx = sorted(dict_.keys(), reverse=True)[0]
-
-            def GetFilterParam(tableName_Order, current_field, param):
-                # print tableName_Order,current_field
-                if '.' in param:
-                    tableName = param.split('.')[0]
-                    FieldName = param.split('.')[1]
-                    if tableName in tableName_Order:
-                        TableIndex = tableName_Order.index(tableName)
-                elif len(tableName_Order) == 1:
-                    TableIndex = 0
-                    FieldName = param
-                else:
-                    return 0, 0, 0, False
-                tmp = list(map(lambda x: x[0].strip(), current_field[TableIndex]))
-                if FieldName in tmp:
-                    FieldIndex = tmp.index(FieldName)
-                    FieldType = current_field[TableIndex][FieldIndex][1]
-                    return TableIndex, FieldIndex, FieldType, True
-                else:
-                    return 0, 0, 0, False
-
-            current_field = []
-            current_list =[]
-            #print dict_
-            while (idx >= 0):
-                if idx == sorted(dict_.keys(), reverse=True)[0]:
-                    if len(dict_[idx]) > 1:
-                        a_1 = storage_db.Storage(dict_[idx][0])
-                        a_2 = storage_db.Storage(dict_[idx][1])
-                        current_list = []
-                        tableName_Order = [dict_[idx][0], dict_[idx][1]]
-                        current_field = [a_1.getfilenamelist(), a_2.getfilenamelist()]
-                        for x in itertools.product(a_1.getRecord(), a_2.getRecord()):
-                            current_list.append(list(x))
-                    else:
-                        a_1 = storage_db.Storage(dict_[idx][0])
-                        current_list = a_1.getRecord()
-
-                        tableName_Order = [dict_[idx][0]]
-                        current_field = [a_1.getfilenamelist()]
-                        #print current_list
-
-                elif 'X' in dict_[idx] and len(dict_[idx]) > 1:
-                    a_2 = storage_db.Storage(dict_[idx][1])
-                    tableName_Order.append(dict_[idx][1])
-                    current_field.append(a_2.getfilenamelist())
-                    tmp_List = current_list[:]
-                    current_list = []
-                    for x in itertools.product(tmp_List, a_2.getRecord()):
-                        current_list.append(list((x[0][0], x[0][1], x[1])))
-
-                elif 'X' not in dict_[idx]:
-                    if 'Filter' in dict_[idx][0]:
-                        FilterChoice = dict_[idx][0][1]
-                        TableIndex, FieldIndex, FieldType, isTrue = GetFilterParam(tableName_Order, current_field,
-                                                                                   FilterChoice[0])
-                        if not isTrue:
-                            return [], [], False
-                        else:
-                            if FieldType == 2:
-                                FilterParam = int(FilterChoice[2].strip())
-                            elif FieldType == 3:
-                                FilterParam = bool(FilterChoice[2].strip())
-                            else:
-                                FilterParam = FilterChoice[2].strip()
-                            #print FilterParam
-                        tmp_List = current_list[:]
-                        current_list = []
-                        for tmpRecord in tmp_List:
-                            if len(current_field) == 1:
-                                ans = tmpRecord[FieldIndex]
-                            else:
-                                ans = tmpRecord[TableIndex][FieldIndex]
-                            if FieldType == 0 or FieldType == 1:
-                                ans = ans.strip()
-                            if FilterParam == ans:
-                                current_list.append(tmpRecord)
-
-                    if 'Proj' in dict_[idx][0]:
-                        SelIndexList = []
-                        for i in range(len(dict_[idx][0][1])):
-                            TableIndex, FieldIndex, FieldType, isTrue = GetFilterParam(tableName_Order, current_field,
-                                                                                       dict_[idx][0][1][i])
-                            if not isTrue:
-                                return [], [], False
-                            SelIndexList.append((TableIndex, FieldIndex))
-                        tmp_List = current_list[:]
-                        current_list = []
-                        # print SelIndexList,current_field
-                        for tmpRecord in tmp_List:
-                            # print tmpRecord
-                            if len(current_field) == 1:
-                                tmp = []
-                                for x in list(map(lambda x: x[1], SelIndexList)):
-                                    tmp.append(tmpRecord[x])
-                                current_list.append(tmp)
-                            else:
-                                tmp = []
-                                for x in SelIndexList:
-                                    tmp.append(tmpRecord[x[0]][x[1]])
-                                current_list.append(tmp)
-                        outPutField = []
-                        for xi in SelIndexList:
-                            outPutField.append(
-                                tableName_Order[xi[0]].strip() + '.' + current_field[xi[0]][xi[1]][0].strip())
-                        return outPutField, current_list, True
-                idx -= 1
-
-        outPutField, current_list, isRight = excute_tree()
-
-        if isRight:
-            print (outPutField)
-            for record in current_list:
-                print (record)
-        else:
+        if common_db.global_logical_tree.value == 'Explain':  # the plan is shown, the result is not cached
+            explain(common_db.global_logical_tree)
+            return
+
+        result_cache = get_result_cache()
+        key = get_plan_key(common_db.global_logical_tree)
+        version_list = [(tableName, storage_db.get_table_version(tableName))
+                        for tableName in sorted(set(get_table_list(common_db.global_logical_tree)))]
+        if result_cache.size > 0:
+            cached_result = result_cache.get(key, version_list)
+            if cached_result is not None:
+                print (cached_result[0])
+                for record in cached_result[1]:
+                    print (list(record))
+                return
+
+        root = build_operator_tree(common_db.global_logical_tree)
+        if root is None:
             print ('WRONG SQL INPUT!')
+            return
+
+        field_names = [get_field_name(field) for field in root.field_list]
+        print (field_names)
+        record_list = [] if result_cache.size > 0 else None  # None when the result is not cached
+        root.open()
+        record = root.next()
+        while record is not None:  # the records are printed as soon as they are produced
+            print (list(record))
+            if record_list is not None:
+                record_list.append(record)
+                if len(record_list) >= result_cache.size:  # it is too large for the cache
+                    record_list = None
+            record = root.next()
+        root.close()
+        if record_list is not None:
+            result_cache.put(key, version_list, field_names, record_list)
     else:
         print ('there is no query plan tree for the execution')
 
+#---------------------------
+# to choose the access path of each table, a table with equality or range conditions on indexed fields
+# is read by an index scan, the var of the table node is ('IndexScan', ((field, low, high), ...)) where
+# low and high are constants or None for no bound, and low is high for an equality, the scan uses the
+# most selective of these indexes when it is opened, i.e. when the constants are known
+# note: the bounds are inclusive, the filters above the scan check < and > and the other bounds again
+#input:
+#       from_node
+#       from_list
+#       where_list: a list of conditions (field, op, constant)
+#-----------------------------------
+def choose_access_path(from_node, from_list, where_list):
+    candidate_dict = {}  # table name->{field name: [low, high]}
+    for condition in where_list:
+        if len(condition) != 3 or condition[1] not in COMPARE_DICT or not is_constant(condition[2]):
+            continue
+        if '.' in condition[0]:
+            tableName, fieldName = condition[0].split('.')
+        elif len(from_list) == 1:
+            tableName, fieldName = from_list[0], condition[0]
+        else:
+            continue
+        if fieldName not in index_db.get_index_field_list(tableName):
+            continue
+        bound_dict = candidate_dict.setdefault(tableName, {})
+        constant = condition[2].strip()
+        if condition[1] == '=':
+            bound_dict[fieldName] = [constant, constant]
+            continue
+        bound = bound_dict.setdefault(fieldName, [None, None])
+        if bound[0] is not None and bound[0] == bound[1]:  # an equality is better than any range
+            continue
+        side = 0 if condition[1] in ('>', '>=') else 1
+        if bound[side] is None:
+            bound[side] = constant
+
+    def mark(node):
+        if isinstance(node, common_db.Node):
+            if not node.children and node.value in candidate_dict:
+                node.var = ('IndexScan', tuple((fieldName, low, high) for (fieldName, (low, high))
+                                               in candidate_dict[node.value].items()))
+            for child in node.children:
+                mark(child)
+
+    mark(from_node)
+
+
 # --------------------------------
 # Author: Shuting Guo shutingnjupt@gmail.com
 # to construct a logical query plan tree
@@ -306,16 +1703,26 @@ def execute_logical_tree():
 #       global_logical_tree
 # ---------------------------------
 def construct_logical_tree():
-    if syn_tree:
-        sel_list,from_list,where_list=extract_sfw_data()
+    if common_db.global_syn_tree:
+        sel_list,from_list,where_list,group_list,order_list,limit=extract_sfw_data()
         sel_list=[i for i in sel_list if i!=',']
         from_list=[i for i in from_list if i!=',']
-        where_list=tuple(where_list)
         #print sel_list,from_list,where_list
 
         from_node = construct_from_node(from_list)
+        choose_access_path(from_node, from_list, where_list)
+        where_list = [condition for condition in where_list if not choose_join(from_node, condition)]
         where_node = construct_where_node(from_node, where_list)
-        common_db.global_logical_tree = construct_select_node(where_node, sel_list)
+        aggregate_node = construct_aggregate_node(where_node, sel_list, group_list)
+        sort_node = construct_sort_node(aggregate_node, order_list, from_list)
+        limit_node = construct_limit_node(sort_node, limit)
+        common_db.global_logical_tree = push_down_predicates(construct_select_node(limit_node, sel_list))
+
+        # EXPLAIN is kept in the root of the logical tree, so a cached plan knows it too
+        query_node_list = [x.value for x in common_db.global_syn_tree.children if isinstance(x, common_db.Node)]
+        if 'EXPLAIN' in query_node_list:
+            explain_mode = 'analyze' if 'ANALYZE' in query_node_list else 'plan'
+            common_db.global_logical_tree = common_db.Node('Explain', [common_db.global_logical_tree], explain_mode)
 
         #if common_db.global_logical_tree:
         #    common_db.show(common_db.global_logical_tree)
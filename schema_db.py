@@ -11,7 +11,9 @@
 
 import ctypes
 import struct
+import common_db
 import head_db # it is main memory structure for the table schema
+import buffer_db # the schema file is read and written through the buffer pool
 
 
 
@@ -111,12 +113,13 @@ class Schema(object):
         print ('__init__ of Schema')
 
         print ('schema fileName is ' + Schema.fileName)
-        self.fileObj = open(Schema.fileName, 'rb+')  # in binary format
+        self.buffer_pool = buffer_db.get_buffer_pool()  # in binary format
 
         # read all data from schema file
         bufLen = META_HEAD_SIZE + TABLE_NAME_HEAD_SIZE + MAX_FIELD_SECTION_SIZE  # the length of metahead, table name entries and feildName sections
-        buf = ctypes.create_string_buffer(bufLen)
-        buf = self.fileObj.read(bufLen)
+        buf = b''
+        if self.buffer_pool.get_num_of_blocks(Schema.fileName) > 0:
+            buf = self.buffer_pool.read_bytes(Schema.fileName, 0, bufLen)
 
         #the following is to print the content of the buffer
         buf.strip()
@@ -124,9 +127,8 @@ class Schema(object):
             self.body_begin_index = BODY_BEGIN_INDEX
             buf = struct.pack('!?ii', False, 0, self.body_begin_index)  # is_stored, tablenum,offset
 
-            self.fileObj.seek(0)
-            self.fileObj.write(buf)
-            self.fileObj.flush()
+            self.buffer_pool.write_bytes(Schema.fileName, 0, buf)
+            self.buffer_pool.commit()
 
             # the following is to create a main memory structure for the schema
 
@@ -216,10 +218,8 @@ class Schema(object):
         buf = ctypes.create_string_buffer(12)
 
         struct.pack_into('!?ii', buf, 0, self.headObj.isStored, self.headObj.lenOfTableNum, self.headObj.offsetOfBody)
-        self.fileObj.seek(0)
-        self.fileObj.write(buf)
-        self.fileObj.flush()
-        self.fileObj.close()
+        self.buffer_pool.write_bytes(Schema.fileName, 0, buf)
+        self.buffer_pool.commit()
 
     # --------------------------
     # delete all the contents in the schema file
@@ -227,13 +227,14 @@ class Schema(object):
     def deleteAll(self):
         self.headObj.tableFields=[]
         self.headObj.tableNames=[]
-        self.fileObj.seek(0)
-        self.fileObj.truncate(0)
+        self.buffer_pool.drop_file(Schema.fileName)  # the cached blocks of all.sch are out of date
+        open(Schema.fileName, 'wb').close()
         self.headObj.isStored = False
         self.headObj.lenOfTableNum = 0
         self.headObj.offsetOfBody = self.body_begin_index
-        self.fileObj.flush()
         print ("all.sch file has been truncated")
+        if common_db.global_plan_cache is not None:  # the cached plans may refer to the old catalog
+            common_db.global_plan_cache.clear()
 
     # -----------------------------
     # insert a table schema to the schema file
@@ -268,9 +269,7 @@ class Schema(object):
 
             writePos = self.headObj.offsetOfBody
 
-            self.fileObj.seek(writePos)
-            self.fileObj.write(fieldBuff)
-            self.fileObj.flush()
+            self.buffer_pool.write_bytes(Schema.fileName, writePos, fieldBuff.raw)
 
             # self.headObj.offsetOfBody=self.headObj.offsetBody+fieldNum*MAX_FIELD_LEN
 
@@ -280,11 +279,11 @@ class Schema(object):
                 filledTableName = filledTableName.encode('utf-8')
             nameBuf = struct.pack('!10sii', filledTableName, fieldNum, self.headObj.offsetOfBody)
 
-            self.fileObj.seek(META_HEAD_SIZE + self.headObj.lenOfTableNum * TABLE_NAME_ENTRY_LEN)
             nameContent = (tableName.strip(), fieldNum, self.headObj.offsetOfBody)
 
-            self.fileObj.write(nameBuf)
-            self.fileObj.flush()
+            self.buffer_pool.write_bytes(Schema.fileName, META_HEAD_SIZE + self.headObj.lenOfTableNum * TABLE_NAME_ENTRY_LEN,
+                                         nameBuf)
+            self.buffer_pool.commit()
 
             print ("to modify the header structure in main memory")
             self.headObj.isStored = True
@@ -293,6 +292,8 @@ class Schema(object):
             self.headObj.tableNames.append(nameContent)
             # fieldTuple = tuple(fieldList)
             self.headObj.tableFields[tableName.strip()]=fieldList
+            if common_db.global_plan_cache is not None:  # the cached plans may refer to the old catalog
+                common_db.global_plan_cache.clear()
 
     # -------------------------------
     # to determine whether the table named table_name exist, depending on the main memory structures
@@ -339,9 +340,8 @@ class Schema(object):
                 (tempFieldName,tempFieldType,tempFieldLength)=self.headObj.tableFields[idx][idj]                
                 struct.pack_into('!10sii',buf,self.headObj.tableNames[idx][2]+idj*MAX_FIELD_LEN,
                                 tempFieldName,tempFieldType,tempFieldLength)
-        self.fileObj.seek(0)
-        self.fileObj.write(buf)
-        self.fileObj.flush()
+        self.buffer_pool.write_bytes(Schema.fileName, 0, buf)
+        self.buffer_pool.commit()
 
     # ----------------------------------------------
     # to delete the schema of a table from the schema file
@@ -382,6 +382,8 @@ class Schema(object):
                 print (False)
                 self.headObj.offsetOfBody = BODY_BEGIN_INDEX
                 self.headObj.isStored = False
+            if common_db.global_plan_cache is not None:  # the cached plans may refer to the old catalog
+                common_db.global_plan_cache.clear()
             return True
         else:
             print ('Cannot find the table!')
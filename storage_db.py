@@ -59,6 +59,47 @@ from common_db import BLOCK_SIZE
 import struct
 import os
 import ctypes
+import csv
+import itertools
+
+import common_db
+import buffer_db
+import index_db
+import codec_db
+import prefetch_db
+
+
+# ---------------------------------------------
+# the version of a table is changed by every insertion, update and deletion of the table,
+# so a cached query result is valid while the versions of its tables are not changed
+# input:
+#       tablename
+# ---------------------------------------------
+def get_table_version(tablename):
+    return common_db.global_table_versions.get(os.fsdecode(tablename).strip(), 0)
+
+
+def bump_table_version(tablename):
+    tablename = os.fsdecode(tablename).strip()
+    common_db.global_table_versions[tablename] = common_db.global_table_versions.get(tablename, 0) + 1
+
+
+BLOCK_HEAD_STRUCT = struct.Struct('!ii')  # block_id and number of records of a data block
+OFFSET_STRUCT = struct.Struct('!i')  # one entry of the offset table of a data block
+TOMBSTONE = 0  # the entry of the offset table of a deleted record, whose slot is free for a new record
+FREE_SPACE_STRUCT = struct.Struct('!H')  # one entry of the free-space map, the number of free slots of a data block
+
+
+# ------------------------------
+# the offsets of the records in a data block, the offset table is unpacked by one call
+# input:
+#       page : the page of the data block
+# output:
+#       a tuple of offsets, one per slot, the offset of a deleted record is TOMBSTONE
+# -------------------------------------
+def get_offset_list(page):
+    number_of_records = BLOCK_HEAD_STRUCT.unpack_from(page, 0)[1]
+    return struct.unpack_from('!%di' % number_of_records, page, BLOCK_HEAD_STRUCT.size)
 
 
 # --------------------------------------------
@@ -72,36 +113,44 @@ class Storage(object):
     # constructor of the class
     # input:
     #       tablename
+    #       field_list : the fields (field name, field type, field length) of a new table,
+    #                    they are input by users if it is None
     # -------------------------------------
-    def __init__(self, tablename):
+    def __init__(self, tablename, field_list=None):
         # print "__init__ of ",Storage.__name__,"begins to execute"
+        if isinstance(tablename, str):
+            tablename = tablename.encode('utf-8')
         tablename.strip()
 
-        self.record_list = []
-        self.record_Position = []
+        self.last_position = None  # (block_id, slot) of the last record, the records themselves are read lazily
+        self.data_block_num = 0
+        self.stored_data_block_num = 0  # the number of data blocks in the block 0, see write_data_block_num
 
-        if not os.path.exists(tablename + '.dat'.encode('utf-8')):  # the file corresponding to the table does not exist
+        self.file_name = tablename + '.dat'.encode('utf-8')
+        self.buffer_pool = buffer_db.get_buffer_pool()  # all the blocks are read and written through the pool
+        self.index_list = None  # the B+ tree indexes of the table, they are opened at the first insertion
+        self.index_version = None  # common_db.global_index_version when index_list was opened
+        self.fsm_file_name = tablename + '.fsm'.encode('utf-8')  # the free-space map, see get_free_space
+        self.free_space = None  # block_id->number of free slots, it is read at the first use
+        self.bytes_decoded = 0  # the bytes of the records decoded by this object, shown by EXPLAIN ANALYZE
+
+        if not os.path.exists(self.file_name):  # the file corresponding to the table does not exist
             print('table file '.encode('utf-8') + tablename + '.dat does not exists'.encode('utf-8'))
-            self.f_handle = open(tablename + '.dat'.encode('utf-8'), 'wb+')
-            self.f_handle.close()
+            self.buffer_pool.get_num_of_blocks(self.file_name)  # the pool creates the file
             self.open = False
             print(tablename + '.dat has been created'.encode('utf-8'))
 
-        self.f_handle = open(tablename + '.dat'.encode('utf-8'), 'rb+')
         print('table file '.encode('utf-8') + tablename + '.dat has been opened'.encode('utf-8'))
         self.open = True
 
-        self.dir_buf = ctypes.create_string_buffer(BLOCK_SIZE)
-        self.f_handle.seek(0)
-        self.dir_buf = self.f_handle.read(BLOCK_SIZE)
-
-        self.dir_buf.strip()
-        my_len = len(self.dir_buf)
+        my_len = self.buffer_pool.get_num_of_blocks(self.file_name)
         self.field_name_list = []
         beginIndex = 0
 
         if my_len == 0:  # there is no data in the block 0, we should write meta data into the block 0
-            if isinstance(tablename, bytes):
+            if field_list is not None:  # the fields are given by the caller, e.g. a loader
+                self.num_of_fields = len(field_list)
+            elif isinstance(tablename, bytes):
                 self.num_of_fields = input(
                     "please input the number of feilds in table " + tablename.decode('utf-8') + ":")
             else:
@@ -119,12 +168,18 @@ class Storage(object):
 
                 # the following is to write the field name,field type and field length into the buffer in turn
                 for i in range(int(self.num_of_fields)):
-                    field_name = input("please input the name of field " + str(i) + " :")
+                    if field_list is not None:
+                        field_name, field_type, field_length = field_list[i]
+                        if isinstance(field_name, bytes):
+                            field_name = field_name.decode('utf-8')
+                        field_name = field_name.strip()
+                    else:
+                        field_name = input("please input the name of field " + str(i) + " :")
 
                     if len(field_name) < 10:
                         field_name = ' ' * (10 - len(field_name.strip())) + field_name
 
-                    while True:
+                    while field_list is None:
                         field_type = input(
                             "please input the type of field(0-> str; 1-> varstr; 2-> int; 3-> boolean) " + str(
                                 i) + " :")
@@ -132,22 +187,23 @@ class Storage(object):
                             break
 
                     # to need further modification here
-                    field_length = input("please input the length of field " + str(i) + " :")
-                    temp_tuple = (field_name, int(field_type), int(field_length))
-                    self.field_name_list.append(temp_tuple)
+                    if field_list is None:
+                        field_length = input("please input the length of field " + str(i) + " :")
                     if isinstance(field_name, str):
                         field_name = field_name.encode('utf-8')
+                    temp_tuple = (field_name, int(field_type), int(field_length))
+                    self.field_name_list.append(temp_tuple)
 
                     struct.pack_into('!10sii', self.dir_buf, beginIndex, field_name, int(field_type),
                                      int(field_length))
                     beginIndex = beginIndex + struct.calcsize('!10sii')
 
-                self.f_handle.seek(0)
-                self.f_handle.write(self.dir_buf)
-                self.f_handle.flush()
+                self.buffer_pool.write_bytes(self.file_name, 0, self.dir_buf.raw)
+                self.buffer_pool.commit()
 
         else:  # there is something in the file
 
+            self.dir_buf = self.buffer_pool.pin(self.file_name, 0)
             self.block_id, self.data_block_num, self.num_of_fields = struct.unpack_from('!iii', self.dir_buf, 0)
 
             print('number of fields is ', self.num_of_fields)
@@ -163,47 +219,179 @@ class Storage(object):
                 temp_tuple = (field_name, field_type, field_length)
                 self.field_name_list.append(temp_tuple)
                 print("the " + str(i) + "th field information (field name,field type,field length) is ", temp_tuple)
+            self.buffer_pool.unpin(self.file_name, 0)
         # print self.field_name_list
-        record_head_len = struct.calcsize('!ii10s')
-        record_content_len = sum(map(lambda x: x[2], self.field_name_list))
+        self.codec = codec_db.get_codec(self.field_name_list)  # the records are encoded and decoded by it
+        self.record_head_len = self.codec.head_len
+        self.record_content_len = self.codec.content_len
         # print record_content_len
 
-        Flag = 1
-        while Flag <= self.data_block_num:
-            self.f_handle.seek(BLOCK_SIZE * Flag)
-            self.active_data_buf = self.f_handle.read(BLOCK_SIZE)
-            self.block_id, self.Number_of_Records = struct.unpack_from('!ii', self.active_data_buf, 0)
-            print('Block_ID=%s,   Contains %s data' % (self.block_id, self.Number_of_Records))
-            # There exists record
-            if self.Number_of_Records > 0:
-                for i in range(self.Number_of_Records):
-                    self.record_Position.append((Flag, i))
-                    offset = \
-                        struct.unpack_from('!i', self.active_data_buf,
-                                           struct.calcsize('!ii') + i * struct.calcsize('!i'))[
-                            0]
-                    record = struct.unpack_from('!' + str(record_content_len) + 's', self.active_data_buf,
-                                                offset + record_head_len)[0]
-                    tmp = 0
-                    tmpList = []
-                    for field in self.field_name_list:
-                        t = record[tmp:tmp + field[2]].strip()
-                        tmp = tmp + field[2]
-                        if field[1] == 2:
-                            t = int(t)
-                        if field[1] == 3:
-                            t = bool(t)
-                        tmpList.append(t)
-                    self.record_list.append(tuple(tmpList))
-            Flag += 1
+        # the records are not loaded here, only the header of the last data block is read
+        # so that insert_record knows where the next record goes
+        if self.data_block_num > 0:
+            last_block_id, last_num_of_records = struct.unpack(
+                '!ii', self.buffer_pool.read_bytes(self.file_name, BLOCK_SIZE * self.data_block_num,
+                                                   struct.calcsize('!ii')))
+            self.last_position = (self.data_block_num, last_num_of_records - 1)
+        self.stored_data_block_num = self.data_block_num
+
+    # ------------------------------
+    # the decoder of some fields, see codec_db.RecordCodec.get_decoder
+    # input:
+    #       field_index_list : the positions of the fields to be decoded, None means all the fields
+    # -------------------------------------
+    def get_decoder(self, field_index_list=None):
+        return self.codec.get_decoder(field_index_list)
+
+    # ------------------------------
+    # read the records stored in one data block
+    # input:
+    #       block_id         : the id of the data block, which begins with 1
+    #       field_index_list : the positions of the fields to be decoded, None means all the fields
+    #       with_position    : whether each record is returned with its position
+    #       page             : the block read ahead by the cursor, see BufferPool.view
+    # output:
+    #       the list of records in the block, each record is a tuple,
+    #       or ((block_id, slot), record) if with_position is True, the deleted records are skipped
+    # -------------------------------------
+    def read_block_records(self, block_id, field_index_list=None, with_position=False, page=None):
+        active_data_buf = self.buffer_pool.view(self.file_name, block_id, page)  # the records are decoded from the view
+        offset_list = get_offset_list(active_data_buf)
+        decoder = self.get_decoder(field_index_list)
+        decode = self.codec.decode
+
+        if with_position:
+            block_record_list = [((block_id, i), decode(active_data_buf, offset, decoder))
+                                 for (i, offset) in enumerate(offset_list) if offset != TOMBSTONE]
+        else:
+            block_record_list = [decode(active_data_buf, offset, decoder) for offset in offset_list
+                                 if offset != TOMBSTONE]
+        self.bytes_decoded += len(block_record_list) * self.record_content_len
+        return block_record_list
+
+    # ------------------------------
+    # read the records at the given positions, e.g. the positions found by an index
+    # input:
+    #       position_list    : a list of (block_id, slot)
+    #       field_index_list : the positions of the fields to be decoded, None means all the fields
+    #       keep_order       : whether the records are returned in the order of position_list, e.g. the
+    #                          order of an index, instead of the order of the blocks
+    # output:
+    #       a generator of records, the positions in the same block are decoded from one view of the block,
+    #       so each block is read once if the order is not kept, or once per run of positions in it otherwise
+    # -------------------------------------
+    def fetch_records(self, position_list, field_index_list=None, keep_order=False):
+        decoder = self.get_decoder(field_index_list)
+        decode = self.codec.decode
+        if not keep_order:
+            position_list = sorted(position_list)
+        for (block_id, block_position_list) in itertools.groupby(position_list, key=lambda position: position[0]):
+            active_data_buf = self.buffer_pool.view(self.file_name, block_id)
+            offset_list = get_offset_list(active_data_buf)
+            for (block_id, slot) in block_position_list:
+                self.bytes_decoded += self.record_content_len
+                yield decode(active_data_buf, offset_list[slot], decoder)
 
     # ------------------------------
-    # return the record list of the table
+    # a cursor over the table, the data blocks are read one at a time
+    # input:
+    #       field_index_list : the positions of the fields to be decoded, None means all the fields
+    #       with_position    : whether each record is returned as ((block_id, slot), record)
+    # output:
+    #       a generator of records, each record is a tuple
+    # note: the blocks are read ahead by a thread of prefetch_db if it is enabled
+    # -------------------------------------
+    def cursor(self, field_index_list=None, with_position=False):
+        if prefetch_db.is_enabled(self.data_block_num):
+            block_iter = prefetch_db.read_ahead(self.buffer_pool, self.file_name, 1, self.data_block_num + 1)
+        else:
+            block_iter = ((block_id, None) for block_id in range(1, self.data_block_num + 1))
+        for (block_id, page) in block_iter:
+            for record in self.read_block_records(block_id, field_index_list, with_position, page):
+                yield record
+
+    # ------------------------------
+    # return the records of the table
     # input:
     #       
+    # output:
+    #       a generator of records, which are read block by block
     # -------------------------------------
     def getRecord(self):
-        return self.record_list
+        return self.cursor()
+
+    # --------------------------------
+    # to check a record and turn it into the content stored in a data block
+    # param insert_record: list of field values
+    # return: the bytes of the record content, or None if the record is wrong
+    # -------------------------------
+    def encode_record(self, insert_record):
+        return self.codec.encode(insert_record)
+
+    # --------------------------------
+    # the maximum number of records in one data block
+    # -------------------------------
+    def get_max_record_num(self):
+        record_len = self.record_head_len + self.record_content_len
+        return (BLOCK_SIZE - struct.calcsize('!i') - struct.calcsize('!ii')) // (record_len + struct.calcsize('!i'))
+
+    # --------------------------------
+    # the number of records in the table, it is used by the query planner to estimate the size of inputs
+    # -------------------------------
+    def get_num_of_records(self):
+        if self.last_position is None:
+            return 0
+        return (self.last_position[0] - 1) * self.get_max_record_num() + self.last_position[1] + 1 - \
+            sum(self.get_free_space().values())
+
+    # --------------------------------
+    # to calculate the position of the next record, a new data block is used when the last one is full
+    # return: (block_id, slot)
+    # -------------------------------
+    def next_position(self):
+        MAX_RECORD_NUM = self.get_max_record_num()
+
+        if self.last_position is None:
+            self.data_block_num += 1
+            self.last_position = (1, 0)
+        else:
+            if self.last_position[1] == MAX_RECORD_NUM - 1:
+                self.last_position = (self.last_position[0] + 1, 0)
+                self.data_block_num += 1
+            else:
+                self.last_position = (self.last_position[0], self.last_position[1] + 1)
+        return self.last_position
+
+    # --------------------------------
+    # to write the record content into the page of its data block
+    # input
+    #       data_page   : the page of the data block
+    #       position    : (block_id, slot)
+    #       inputstr    : the record content returned by encode_record
+    # -------------------------------
+    def write_record(self, data_page, position, inputstr):
+        record_len = self.record_head_len + self.record_content_len
+
+        # update data block head, the number of records is not changed when a free slot is reused
+        number_of_records = BLOCK_HEAD_STRUCT.unpack_from(data_page, 0)[1]
+        BLOCK_HEAD_STRUCT.pack_into(data_page, 0, position[0], max(number_of_records, position[1] + 1))
+
+        # update data offset
+        offset = BLOCK_HEAD_STRUCT.size + position[1] * OFFSET_STRUCT.size
+        beginIndex = BLOCK_SIZE - (position[1] + 1) * record_len
+        OFFSET_STRUCT.pack_into(data_page, offset, beginIndex)
+
+        # update data, the record head and the record content are written by one call
+        self.codec.write(data_page, beginIndex, inputstr)
+
+    # --------------------------------
+    # to write the number of data blocks into the block 0, the change is committed by the caller
+    # -------------------------------
+    def write_data_block_num(self):
+        dir_page = self.buffer_pool.pin(self.file_name, 0)
+        struct.pack_into('!ii', dir_page, 0, 0, self.data_block_num)
+        self.buffer_pool.unpin(self.file_name, 0, True)
+        self.stored_data_block_num = self.data_block_num
 
     # --------------------------------
     # to insert a record into table
@@ -215,99 +403,295 @@ class Storage(object):
         # example: ['xuyidan','23','123456']
 
         # step 1 : to check the insert_record is True or False
+        inputstr = self.encode_record(insert_record)
+        if inputstr is None:
+            return False
+
+        # Step2: To calculate new record Position, a free slot of a deleted record is used first
+        last_data_block_num = self.data_block_num
+        last_Position = self.take_free_slot() or self.next_position()
+
+        # Step3: Write new record into the pages of xxx.dat in the buffer pool
+        # update data_block_num, the block 0 is not changed unless a new data block is used
+        if self.data_block_num != last_data_block_num:
+            self.write_data_block_num()
+
+        data_page = self.buffer_pool.pin(self.file_name, last_Position[0])
+        self.write_record(data_page, last_Position, inputstr)
+        self.buffer_pool.unpin(self.file_name, last_Position[0], True)
+        self.insert_index_entries(insert_record, last_Position)
+        self.buffer_pool.commit()  # the pages are logged, the log is synced by group commit
+        bump_table_version(self.file_name[:-len('.dat')])
 
-        tmpRecord = []
-        for idx in range(len(self.field_name_list)):
-            insert_record[idx] = insert_record[idx].strip()
-            if self.field_name_list[idx][1] == 0 or self.field_name_list[idx][1] == 1:
-                if len(insert_record[idx]) > self.field_name_list[idx][2]:
-                    return False
-                tmpRecord.append(insert_record[idx])
-            if self.field_name_list[idx][1] == 2:
-                try:
-                    tmpRecord.append(int(insert_record[idx]))
-                except:
-                    return False
-            if self.field_name_list[idx][1] == 3:
-                try:
-                    tmpRecord.append(bool(insert_record[idx]))
-                except:
-                    return False
-            insert_record[idx] = ' ' * (self.field_name_list[idx][2] - len(insert_record[idx])) + insert_record[idx]
-
-        # step2: Add tmpRecord to record_list ; change insert_record into inputstr
-        inputstr = ''.join(insert_record)
-
-        self.record_list.append(tuple(tmpRecord))
-
-        # Step3: To calculate MaxNum in each Data Blocks
-        record_content_len = len(inputstr)
-        record_head_len = struct.calcsize('!ii10s')
-        record_len = record_head_len + record_content_len
-        MAX_RECORD_NUM = (BLOCK_SIZE - struct.calcsize('!i') - struct.calcsize('!ii')) / (
-                record_len + struct.calcsize('!i'))
-
-        # Step4: To calculate new record Position
-        if not len(self.record_Position):
-            self.data_block_num += 1
-            self.record_Position.append((1, 0))
+        return True
+
+    # --------------------------------
+    # to get the B+ tree indexes of the table, they are opened again after an index is created or removed
+    # return: a list of (field position, Index object)
+    # -------------------------------
+    def get_index_list(self):
+        if self.index_list is None or self.index_version != common_db.global_index_version:
+            self.index_version = common_db.global_index_version
+            self.index_list = []
+            field_names = [x[0].decode('utf-8').strip() for x in self.field_name_list]
+            for field_name in index_db.get_index_field_list(self.file_name[:-len('.dat')]):
+                if field_name in field_names:
+                    self.index_list.append((field_names.index(field_name),
+                                            index_db.Index(self.file_name[:-len('.dat')], field_name)))
+        return self.index_list
+
+    # --------------------------------
+    # to insert the index entries of a new record into all the indexes of the table
+    # input
+    #       insert_record: list of field values
+    #       position     : (block_id, slot) of the record
+    # -------------------------------
+    def insert_index_entries(self, insert_record, position):
+        for (field_index, index_obj) in self.get_index_list():
+            index_obj.insert_index_entry(insert_record[field_index], position[0], position[1], False)
+
+    # --------------------------------
+    # the free-space map of the table, which is kept in the file xxx.fsm through the buffer pool,
+    # the entry of data block i is the number of its free slots at the offset i*FREE_SPACE_STRUCT.size
+    # note: the file is created at the first deletion, a table without it has no free slot
+    # return: a dictionary block_id->number of free slots, only the blocks with free slots are in it
+    # -------------------------------
+    def get_free_space(self):
+        if self.free_space is None:
+            self.free_space = {}
+            if os.path.exists(self.fsm_file_name):
+                data = self.buffer_pool.read_bytes(self.fsm_file_name, 0,
+                                                   (self.data_block_num + 1) * FREE_SPACE_STRUCT.size)
+                for (block_id, (num_of_slots,)) in enumerate(FREE_SPACE_STRUCT.iter_unpack(data)):
+                    if num_of_slots > 0:
+                        self.free_space[block_id] = num_of_slots
+        return self.free_space
+
+    # --------------------------------
+    # to set the number of free slots of a data block, it is counted from the offset table of the block
+    # so that the map is right even if another Storage object of the table has changed it
+    # input
+    #       block_id
+    #       offset_list : the offset table of the block after the change, see get_offset_list
+    # -------------------------------
+    def set_free_slots(self, block_id, offset_list):
+        num_of_slots = offset_list.count(TOMBSTONE)
+        free_space = self.get_free_space()
+        if num_of_slots > 0:
+            free_space[block_id] = num_of_slots
         else:
-            last_Position = self.record_Position[-1]
-            if last_Position[1] == MAX_RECORD_NUM - 1:
-                self.record_Position.append((last_Position[0] + 1, 0))
-                self.data_block_num += 1
-            else:
-                self.record_Position.append((last_Position[0], last_Position[1] + 1))
+            free_space.pop(block_id, None)
+        self.buffer_pool.write_bytes(self.fsm_file_name, block_id * FREE_SPACE_STRUCT.size,
+                                     FREE_SPACE_STRUCT.pack(num_of_slots))
 
-        last_Position = self.record_Position[-1]
+    # --------------------------------
+    # to take the first free slot of the table for a new record, the data blocks are not searched
+    # since the free-space map tells which ones have free slots
+    # return: (block_id, slot), or None if there is no free slot
+    # -------------------------------
+    def take_free_slot(self):
+        free_space = self.get_free_space()
+        while free_space:
+            block_id = min(free_space)
+            data_page = self.buffer_pool.pin(self.file_name, block_id)
+            offset_list = list(get_offset_list(data_page))
+            self.buffer_pool.unpin(self.file_name, block_id)
+            if TOMBSTONE in offset_list:
+                slot = offset_list.index(TOMBSTONE)
+                offset_list[slot] = None  # the slot is taken by the record written next
+                self.set_free_slots(block_id, offset_list)
+                return block_id, slot
+            self.set_free_slots(block_id, offset_list)  # the map was out of date
+        return None
 
-        # Step5: Write new record into file xxx.dat
-        # update data_block_num
-        self.f_handle.seek(0)
-        self.buf = ctypes.create_string_buffer(struct.calcsize('!ii'))
-        struct.pack_into('!ii', self.buf, 0, 0, self.data_block_num)
-        self.f_handle.write(self.buf)
-        self.f_handle.flush()
+    # --------------------------------
+    # the position of a field by its name
+    # return: the position, or None if there is no such field
+    # -------------------------------
+    def get_field_index(self, field_name):
+        if isinstance(field_name, bytes):
+            field_name = field_name.decode('utf-8')
+        field_names = [x[0].decode('utf-8').strip() for x in self.field_name_list]
+        if field_name.strip() not in field_names:
+            return None
+        return field_names.index(field_name.strip())
 
-        # update data block head
-        self.f_handle.seek(BLOCK_SIZE * last_Position[0])
-        self.buf = ctypes.create_string_buffer(struct.calcsize('!ii'))
-        struct.pack_into('!ii', self.buf, 0, last_Position[0], last_Position[1] + 1)
-        self.f_handle.write(self.buf)
-        self.f_handle.flush()
+    # --------------------------------
+    # to find the positions of the records whose field is equal to a value, the index of the field
+    # is used if there is one
+    # input
+    #       field_index
+    #       value       : the value given by the user, e.g. '23'
+    # return: a list of (block_id, slot)
+    # -------------------------------
+    def find_positions(self, field_index, value):
+        value = self.codec.convert_field(field_index, value)
+        if value is None:  # no record can have it
+            return []
+        for (index_field, index_obj) in self.get_index_list():
+            if index_field == field_index:
+                position_list = sorted(index_obj.search(value))
+                # the keys of strings are cut to 10 bytes, so the records are checked again
+                return [position for (position, record) in
+                        zip(position_list, self.fetch_records(position_list, [field_index], keep_order=True))
+                        if record[0] == value]
+        return [position for (position, record) in self.cursor([field_index], True) if record[0] == value]
 
-        # update data offset
-        offset = struct.calcsize('!ii') + last_Position[1] * struct.calcsize('!i')
-        beginIndex = BLOCK_SIZE - (last_Position[1] + 1) * record_len
-        self.f_handle.seek(BLOCK_SIZE * last_Position[0] + offset)
-        self.buf = ctypes.create_string_buffer(struct.calcsize('!i'))
-        struct.pack_into('!i', self.buf, 0, beginIndex)
-        self.f_handle.write(self.buf)
-        self.f_handle.flush()
-
-        # update data
-        record_schema_address = struct.calcsize('!iii')
-        update_time = '2016-11-16'  # update time
-        self.f_handle.seek(BLOCK_SIZE * last_Position[0] + beginIndex)
-        self.buf = ctypes.create_string_buffer(record_len)
-        struct.pack_into('!ii10s', self.buf, 0, record_schema_address, record_content_len, update_time.encode('utf-8'))
-        struct.pack_into('!' + str(record_content_len) + 's', self.buf, record_head_len, inputstr.encode('utf-8'))
-        self.f_handle.write(self.buf.raw)
-        self.f_handle.flush()
+    # --------------------------------
+    # to delete the record at a position, the entry of its slot in the offset table becomes TOMBSTONE,
+    # its index entries are deleted and the slot is put into the free-space map for insert_record
+    # input
+    #       position : (block_id, slot)
+    # return: True, or False if there is no record at the position
+    # note: the change is committed by the caller
+    # -------------------------------
+    def delete_record(self, position):
+        block_id, slot = position
+        data_page = self.buffer_pool.pin(self.file_name, block_id)
+        offset_list = list(get_offset_list(data_page))
+        if slot >= len(offset_list) or offset_list[slot] == TOMBSTONE:
+            self.buffer_pool.unpin(self.file_name, block_id)
+            return False
+        record = self.codec.decode(data_page, offset_list[slot], self.get_decoder())
+        OFFSET_STRUCT.pack_into(data_page, BLOCK_HEAD_STRUCT.size + slot * OFFSET_STRUCT.size, TOMBSTONE)
+        self.buffer_pool.unpin(self.file_name, block_id, True)
+
+        offset_list[slot] = TOMBSTONE
+        self.set_free_slots(block_id, offset_list)
+        for (field_index, index_obj) in self.get_index_list():
+            index_obj.delete_index_entry(record[field_index], block_id, slot, False)
+        return True
 
+    # --------------------------------
+    # to change one field of the record at a position, the record is updated in place since every
+    # field has its fixed length, and the index entries of the field are changed too
+    # input
+    #       position    : (block_id, slot)
+    #       field_index
+    #       value       : the new value given by the user
+    # return: True, or False if there is no record at the position or the value does not fit the field
+    # note: the change is committed by the caller
+    # -------------------------------
+    def update_record(self, position, field_index, value):
+        content = self.codec.encode_field(field_index, value)
+        if content is None:
+            return False
+        block_id, slot = position
+        data_page = self.buffer_pool.pin(self.file_name, block_id)
+        offset_list = get_offset_list(data_page)
+        if slot >= len(offset_list) or offset_list[slot] == TOMBSTONE:
+            self.buffer_pool.unpin(self.file_name, block_id)
+            return False
+        decoder = self.get_decoder([field_index])
+        old_value = self.codec.decode(data_page, offset_list[slot], decoder)[0]
+        begin = offset_list[slot] + self.record_head_len + self.codec.begin_list[field_index]
+        data_page[begin:begin + len(content)] = content
+        new_value = self.codec.decode(data_page, offset_list[slot], decoder)[0]
+        self.buffer_pool.unpin(self.file_name, block_id, True)
+
+        for (index_field, index_obj) in self.get_index_list():
+            if index_field == field_index and new_value != old_value:
+                index_obj.delete_index_entry(old_value, block_id, slot, False)
+                index_obj.insert_index_entry(new_value, block_id, slot, False)
         return True
 
+    # --------------------------------
+    # to delete the records whose field is equal to a value
+    # input
+    #       field_index
+    #       value       : the value given by the user, e.g. '23'
+    # return: the number of deleted records
+    # -------------------------------
+    def delete_records(self, field_index, value):
+        num_of_records = 0
+        for position in self.find_positions(field_index, value):
+            if self.delete_record(position):
+                num_of_records += 1
+        self.buffer_pool.commit()
+        if num_of_records > 0:
+            bump_table_version(self.file_name[:-len('.dat')])
+        return num_of_records
+
+    # --------------------------------
+    # to change a field of the records whose field is equal to old_value into new_value
+    # input
+    #       field_index
+    #       old_value
+    #       new_value
+    # return: the number of updated records, or None if new_value does not fit the field
+    # -------------------------------
+    def update_records(self, field_index, old_value, new_value):
+        if self.codec.encode_field(field_index, new_value) is None:
+            return None
+        num_of_records = 0
+        for position in self.find_positions(field_index, old_value):
+            if self.update_record(position, field_index, new_value):
+                num_of_records += 1
+        self.buffer_pool.commit()
+        if num_of_records > 0:
+            bump_table_version(self.file_name[:-len('.dat')])
+        return num_of_records
+
+    # --------------------------------
+    # to insert many records into table, each data block is filled in main memory and written once,
+    # and the block 0 is updated once at the end
+    # param records: an iterable of lists, it is consumed lazily
+    # return: (number of inserted records, number of wrong records)
+    # -------------------------------
+    def insert_many(self, records):
+        inserted = 0
+        wrong = 0
+        current_block_id = None
+        data_page = None
+
+        for insert_record in records:
+            inputstr = self.encode_record(insert_record)
+            if inputstr is None:
+                wrong += 1
+                continue
+
+            position = self.take_free_slot() or self.next_position()
+            if position[0] != current_block_id:  # the last block is finished
+                if data_page is not None:
+                    self.buffer_pool.unpin(self.file_name, current_block_id, True)
+                current_block_id = position[0]
+                data_page = self.buffer_pool.pin(self.file_name, current_block_id)
+            self.write_record(data_page, position, inputstr)
+            self.insert_index_entries(insert_record, position)
+            inserted += 1
+
+        if data_page is not None:
+            self.buffer_pool.unpin(self.file_name, current_block_id, True)
+
+        # update data_block_num once
+        self.write_data_block_num()
+        self.buffer_pool.commit()  # one commit for all the records
+        if inserted > 0:
+            bump_table_version(self.file_name[:-len('.dat')])
+
+        return inserted, wrong
+
+    # --------------------------------
+    # to load the records of a csv file into table, each line is one record
+    # param csv_file_name: the name of the csv file
+    # return: (number of inserted records, number of wrong records)
+    # -------------------------------
+    def load_csv(self, csv_file_name):
+        with open(csv_file_name, newline='') as csv_file:
+            return self.insert_many(csv.reader(csv_file))
+
     # ------------------------------
     # show the data structure and its data
     # input:
     #       t
     # -------------------------------------
 
-    def show_table_data(self):
+    def show_table_data(self, limit=None):
         print('|    '.join(map(lambda x: x[0].decode('utf-8').strip(), self.field_name_list)))  # show the structure
 
-        # the following is to show the data of the table
-        for record in self.record_list:
+        # the following is to show the data of the table, which is read block by block,
+        # only the blocks of the first limit records are read
+        for record in itertools.islice(self.cursor(), limit):
             print(record)
 
     # --------------------------------
@@ -319,16 +703,31 @@ class Storage(object):
     # -----------------------------------
     def delete_table_data(self, tableName):
 
-        # step 1: identify whether the file is still open
+        # step 1: identify whether the file is still open, its blocks in the buffer pool are discarded
+        if isinstance(tableName, str):
+            tableName = tableName.encode('utf-8')
         if self.open == True:
-            self.f_handle.close()
             self.open = False
+        self.buffer_pool.drop_file(tableName.strip() + '.dat'.encode('utf-8'))
 
         # step 2: remove the file from os   
         tableName.strip()
         if os.path.exists(tableName + '.dat'.encode('utf-8')):
             os.remove(tableName + '.dat'.encode('utf-8'))
 
+        # step 3: remove the free-space map and the index files of the table
+        self.free_space = None
+        self.buffer_pool.drop_file(tableName.strip() + '.fsm'.encode('utf-8'))
+        if os.path.exists(tableName.strip() + '.fsm'.encode('utf-8')):
+            os.remove(tableName.strip() + '.fsm'.encode('utf-8'))
+        self.index_list = None
+        for field_name in index_db.get_index_field_list(tableName.strip()):
+            index_file_name = index_db.index_file_name(tableName.strip(), field_name)
+            self.buffer_pool.drop_file(index_file_name)
+            os.remove(index_file_name)
+        common_db.global_index_version += 1
+
+        bump_table_version(tableName)
         return True
 
     # ------------------------------
@@ -346,9 +745,7 @@ class Storage(object):
     def __del__(self):  # write the metahead information in head object to file
 
         if self.open == True:
-            self.f_handle.seek(0)
-            self.buf = ctypes.create_string_buffer(struct.calcsize('!ii'))
-            struct.pack_into('!ii', self.buf, 0, 0, self.data_block_num)
-            self.f_handle.write(self.buf)
-            self.f_handle.flush()
-            self.f_handle.close()
+            if self.data_block_num != self.stored_data_block_num:  # a read-only object writes nothing
+                self.write_data_block_num()
+                self.buffer_pool.commit()
+            self.open = False
@@ -22,5 +22,627 @@ def test_dict():
 
 
 
-test_dict()
+#-----------------------------------------------
+# the following checks the storage of tables, every check_xxx function works in a
+# temporary directory, so the data files in the working directory are not touched
+# usage:
+#       python test_db.py               # run all the checks
+#       python -m pytest test_db.py     # the same checks by pytest
+#-----------------------------------------------
 
+import os
+import sys
+import gc
+import io
+import ast
+import random
+import tempfile
+import contextlib
+import subprocess
+
+import common_db
+import buffer_db
+import wal_db
+import storage_db
+import index_db
+import codec_db
+import schema_db
+import plan_cache_db
+import query_plan_db
+import lex_db
+
+
+TEST_FIELD_LIST = [('name', 0, 10), ('age', 2, 4)]  # (field name, field type, field length)
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+#-----------------------------
+# to run func in a temporary directory with a new buffer pool and a new log
+#-------------------------------
+def run_in_temp_dir(func, *args):
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.chdir(temp_dir)
+        common_db.global_buffer_pool = None
+        common_db.global_wal = None
+        common_db.global_plan_cache = None
+        common_db.global_result_cache = None
+        common_db.global_table_versions = {}
+        try:
+            return func(*args)
+        finally:
+            gc.collect()  # the Storage objects of the check are destroyed in the directory
+            if common_db.global_wal is not None:
+                common_db.global_wal.checkpoint()
+                common_db.global_wal.close()
+            common_db.global_wal = None
+            common_db.global_buffer_pool = None
+            os.chdir(old_dir)
+
+
+def quiet(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+#-----------------------------
+# to run func which prints the result of a query
+# output:
+#       the printed lists, the first one is the field names and the others are the records
+#-------------------------------
+def query_result(func, *args):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        func(*args)
+    return [ast.literal_eval(line) for line in output.getvalue().split('\n') if line.startswith('[')]
+
+
+def run_query(sql_str):
+    return query_result(plan_cache_db.execute_sql, sql_str)
+
+
+# the physical plan printed by explain
+def get_plan_text(sql_str):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        plan_cache_db.execute_sql('explain ' + sql_str)
+    return output.getvalue().split('physical plan:')[-1]
+
+
+#-----------------------------
+# to check that the index of a field finds the same records as a full scan, value by value
+#-------------------------------
+def assert_index_consistent(table, field_name):
+    field_index = table.get_field_index(field_name)
+    index_obj = quiet(index_db.Index, table.file_name[:-len('.dat')], field_name)
+    scan_dict = {}  # value->sorted positions
+    for (position, record) in table.cursor([field_index], True):
+        scan_dict.setdefault(record[0], []).append(position)
+    num_of_entries = 0
+    for (value, position_list) in scan_dict.items():
+        assert sorted(quiet(list, index_obj.search(value))) == sorted(position_list), value
+        num_of_entries += len(position_list)
+    assert len(quiet(list, index_obj.range_search())) == num_of_entries
+
+
+#-----------------------------
+# to change some constants of a module in a with statement, e.g. to make the operators spill to disk
+#-------------------------------
+@contextlib.contextmanager
+def changed_constants(module, **constant_dict):
+    old_dict = {name: getattr(module, name) for name in constant_dict}
+    for (name, value) in constant_dict.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for (name, value) in old_dict.items():
+            setattr(module, name, value)
+
+
+#-----------------------------
+# to count the calls of a function of query_plan_db while func runs, e.g. the spills of the operators
+#-------------------------------
+def count_calls(function_name, func, *args):
+    call_list = []
+    function = getattr(query_plan_db, function_name)
+
+    def counted(*args):
+        call_list.append(args)
+        return function(*args)
+
+    with changed_constants(query_plan_db, **{function_name: counted}):
+        result = func(*args)
+    return result, len(call_list)
+
+
+#-----------------------------
+# the tables of the query checks, people has 2000 records and pets has 1500 records
+#-------------------------------
+def make_query_tables():
+    people = quiet(storage_db.Storage, 'people', [('name', 0, 10), ('age', 2, 4), ('city', 0, 6)])
+    quiet(people.insert_many, [['n%d' % i, str(i % 37), 'c%d' % (i % 13)] for i in range(2000)])
+    pets = quiet(storage_db.Storage, 'pets', [('owner', 0, 10), ('kind', 0, 6), ('age', 2, 4)])
+    quiet(pets.insert_many, [['n%d' % (i * 7 % 2500), 'k%d' % (i % 5), str(i % 3)] for i in range(1500)])
+    return list(people.cursor()), list(pets.cursor())
+
+
+#-----------------------------
+# to run a script in a new process in the working directory, it is used to simulate a crash by os._exit
+#-------------------------------
+def run_script(script):
+    subprocess.run([sys.executable, '-c', 'import sys; sys.path.insert(0, %r)\n' % PACKAGE_DIR + script],
+                   check=True, stdout=subprocess.DEVNULL)
+
+
+#-----------------------------
+# the slots of deleted records are reused by the next insertions, so the file does not grow
+#-------------------------------
+def check_slot_reuse_after_delete():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 10)] for i in range(1000)])
+    num_of_blocks = table.data_block_num
+    deleted_list = quiet(table.find_positions, 1, '3')
+
+    assert quiet(table.delete_records, 1, '3') == 100
+    assert table.get_num_of_records() == 900
+    assert sum(table.get_free_space().values()) == 100
+    assert not any(record[1] == 3 for record in table.cursor())
+
+    for i in range(100):
+        assert quiet(table.insert_record, ['r%d' % i, '42'])
+    assert table.data_block_num == num_of_blocks
+    assert table.get_free_space() == {}
+    assert sorted(quiet(table.find_positions, 1, '42')) == sorted(deleted_list)
+    assert table.get_num_of_records() == 1000
+
+    quiet(table.insert_record, ['last', '7'])  # there is no free slot, so a new slot is used
+    assert table.get_num_of_records() == 1001
+    assert len(list(table.cursor())) == 1001
+
+
+#-----------------------------
+# the index entries follow the deleted and the updated records
+#-------------------------------
+def check_index_after_update_and_delete():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 50)] for i in range(3000)])  # the leaves are split
+    quiet(index_db.Index('people', 'age').create_index)
+    quiet(index_db.Index('people', 'name').create_index)
+
+    assert quiet(table.delete_records, 1, '7') == 60
+    assert quiet(table.update_records, 1, '8', '99') == 60
+    assert quiet(table.update_records, 0, 'n9', 'm9') == 1
+    assert quiet(table.update_records, 0, 'm9', 'x' * 20) is None  # the value is longer than the field
+    for i in range(100):  # the free slots are reused and new leaves are split
+        quiet(table.insert_record, ['k%d' % i, str(i % 3)])
+
+    assert quiet(table.find_positions, 1, '7') == []
+    assert len(quiet(table.find_positions, 1, '99')) == 60
+    assert len(quiet(table.find_positions, 0, 'm9')) == 1
+    assert_index_consistent(table, 'age')
+    assert_index_consistent(table, 'name')
+
+
+#-----------------------------
+# the committed records are replayed from the log after a crash which lost the dirty blocks
+#-------------------------------
+def check_wal_replay_after_crash():
+    run_script('''
+import os, storage_db, wal_db
+table = storage_db.Storage('people', [('name', 0, 10), ('age', 2, 4)])
+table.insert_many([['n%d' % i, str(i % 50)] for i in range(3000)])
+table.delete_records(1, '5')
+wal_db.get_wal().sync()
+os._exit(0)  # the blocks in the buffer pool are not written back
+''')
+    quiet(wal_db.recover)
+    table = quiet(storage_db.Storage, 'people')
+    record_list = list(table.cursor())
+    assert len(record_list) == 2940
+    assert not any(record[1] == 5 for record in record_list)
+    assert sum(table.get_free_space().values()) == 60  # the free-space map is replayed too
+
+
+#-----------------------------
+# the blocks written back before their commit are undone after a crash
+#-------------------------------
+def check_wal_undo_after_crash():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 50)] for i in range(3000)])
+    quiet(index_db.Index('people', 'age').create_index)
+    quiet(wal_db.get_wal().checkpoint)
+    num_of_blocks = table.data_block_num
+    del table
+    gc.collect()
+
+    run_script('''
+import os, buffer_db, storage_db
+buffer_db.get_buffer_pool().resize(8)  # the dirty blocks are written back before the commit
+table = storage_db.Storage('people')
+def records():
+    for i in range(20000):
+        if i == 15000:
+            os._exit(0)
+        yield ['m%d' % i, str(i % 97)]
+table.insert_many(records())
+''')
+    common_db.global_buffer_pool = None  # the blocks are read from the files again
+    quiet(wal_db.recover)
+    table = quiet(storage_db.Storage, 'people')
+    assert table.data_block_num == num_of_blocks
+    assert len(list(table.cursor())) == 3000
+    assert_index_consistent(table, 'age')
+
+
+#-----------------------------
+# the parameters of a prepared statement are bound to int and str fields, the plan is shared by
+# the statements which differ in their constants, and it is dropped when the catalog changes
+#-------------------------------
+def check_prepared_statement():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 10)] for i in range(100)])
+    plan_cache = plan_cache_db.get_plan_cache()
+
+    statement = quiet(plan_cache_db.prepare, 'select name, age from people where age = ?')
+    assert plan_cache.misses == 1
+    expected_list = [[b'n%d' % i, 9] for i in range(9, 100, 10)]
+    assert query_result(statement.execute, 9)[1:] == expected_list
+    assert query_result(statement.execute, '9')[1:] == expected_list  # the digits are not quoted
+    assert query_result(statement.execute, b'9')[1:] == expected_list
+
+    statement = quiet(plan_cache_db.prepare, 'select name from people where name = ?')
+    assert query_result(statement.execute, 'n7') == [['people.name'], [b'n7']]
+    assert query_result(statement.execute, b'n8')[1:] == [[b'n8']]
+    assert run_query("select name from people where name = 'n9'")[1:] == [[b'n9']]  # the plan above
+    assert run_query('select name, age from people where age = 3')[1:] == [[b'n%d' % i, 3] for i in range(3, 100, 10)]
+    assert plan_cache.hits == 2 and plan_cache.misses == 2
+
+    schema_obj = quiet(schema_db.Schema)
+    quiet(schema_obj.appendTable, b'other', [(b'id', 2, 4)])
+    assert plan_cache.get_stats()['plans'] == 0
+    assert run_query('select name, age from people where age = 3')[1:] == [[b'n%d' % i, 3] for i in range(3, 100, 10)]
+    assert plan_cache.misses == 3
+
+    quiet(index_db.Index('people', 'age').create_index)
+    assert plan_cache.get_stats()['plans'] == 0
+    statement = quiet(plan_cache_db.prepare, 'select name, age from people where age = ?')
+    assert plan_cache.misses == 4
+    assert 'IndexScan' in repr(query_plan_db.get_plan_key(statement.plan))  # the new plan uses the index
+    assert sorted(query_result(statement.execute, '9')[1:]) == sorted(expected_list)
+    del schema_obj
+
+
+#-----------------------------
+# the result cache is off by default, when it is on, an entry is dropped once its table is changed
+#-------------------------------
+def check_result_cache():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 10)] for i in range(100)])
+    sql_str = 'select name, age from people where age = 3'
+    expected_list = [['people.name', 'people.age']] + [[b'n%d' % i, 3] for i in range(3, 100, 10)]
+
+    assert run_query(sql_str) == expected_list
+    assert run_query(sql_str) == expected_list
+    stats = query_plan_db.get_result_cache().get_stats()
+    assert stats['hits'] == 0 and stats['misses'] == 0 and stats['results'] == 0
+
+    result_cache = query_plan_db.ResultCache(1000)
+    common_db.global_result_cache = result_cache
+    assert run_query(sql_str) == expected_list
+    assert run_query(sql_str) == expected_list
+    assert result_cache.hits == 1 and result_cache.misses == 1
+
+    quiet(table.insert_record, ['new', '3'])
+    expected_list.append([b'new', 3])
+    assert run_query(sql_str) == expected_list
+    assert result_cache.hits == 1 and result_cache.misses == 2
+
+    assert quiet(table.delete_records, 0, 'n3') == 1
+    del expected_list[1]
+    assert run_query(sql_str) == expected_list
+    assert result_cache.hits == 1 and result_cache.misses == 3
+
+    assert quiet(table.update_records, 1, '3', '4') == 10
+    assert run_query(sql_str) == expected_list[:1]
+    assert run_query(sql_str) == expected_list[:1]
+    assert result_cache.hits == 2 and result_cache.misses == 4
+    assert result_cache.get_stats()['results'] == 1  # the dropped entries are not kept
+
+
+#-----------------------------
+# the keywords are whole words, so a name which begins with a keyword is one name
+#-------------------------------
+def get_tokens(sql_str):
+    lex_db.set_lex_handle()
+    common_db.global_lexer.input(sql_str)
+    return [(token.type, token.value) for token in iter(common_db.global_lexer.token, None)]
+
+
+def check_keywords_in_names():
+    assert get_tokens('select selection, fromage from people where andy = 1 and wherever = 2') == [
+        ('SELECT', 'select'), ('TCNAME', 'selection'), ('COMMA', ','), ('TCNAME', 'fromage'),
+        ('FROM', 'from'), ('TCNAME', 'people'), ('WHERE', 'where'), ('TCNAME', 'andy'), ('EQX', '='),
+        ('CONSTANT', '1'), ('AND', 'and'), ('TCNAME', 'wherever'), ('EQX', '='), ('CONSTANT', '2')]
+
+    table = quiet(storage_db.Storage, 'people', [('selection', 0, 10), ('fromage', 0, 10), ('andy', 2, 4)])
+    quiet(table.insert_many, [['s%d' % i, 'f%d' % i, str(i % 5)] for i in range(20)])
+    assert run_query('select selection, fromage from people where andy = 1 and andy = 1') == [
+        ['people.selection', 'people.fromage']] + [[b's%d' % i, b'f%d' % i] for i in range(1, 20, 5)]
+
+
+#-----------------------------
+# the range searches of an index find the records of a full scan, and a descending search
+# gives them in the reverse order of an ascending one, also for the runs of equal keys which
+# are split across leaves and for the negative values
+#-------------------------------
+def check_index_range_search():
+    table = quiet(storage_db.Storage, 'people', TEST_FIELD_LIST)
+    quiet(table.insert_many, [['n%d' % i, str(i % 301 - 150)] for i in range(3000)] +
+          [['e%d' % i, '7'] for i in range(500)])  # the run of 7 is longer than a leaf
+    quiet(index_db.Index('people', 'age').create_index)
+    quiet(table.insert_many, [['m%d' % i, str(-3 if i % 2 else i % 997 - 500)] for i in range(1500)])  # the leaves are split
+    index_obj = quiet(index_db.Index, 'people', 'age')
+    value_dict = {position: record[0] for (position, record) in table.cursor([1], True)}
+
+    random_obj = random.Random(15)
+    bound_list = [(None, None), (None, -3), (-3, None), (7, 7), (-3, -3), (-500, -500), (496, 496), (1000, 2000)]
+    for i in range(30):
+        bound_list.append(tuple(sorted(random_obj.randint(-510, 510) for j in range(2))))
+    for (low, high) in bound_list:
+        ascending_list = quiet(list, index_obj.range_search(low, high))
+        descending_list = quiet(list, index_obj.range_search(low, high, True))
+        expected_list = [position for (position, value) in value_dict.items()
+                         if (low is None or value >= low) and (high is None or value <= high)]
+        assert sorted(ascending_list) == sorted(expected_list), (low, high)
+        assert descending_list == ascending_list[::-1], (low, high)
+        value_list = [value_dict[position] for position in ascending_list]
+        assert value_list == sorted(value_list), (low, high)
+
+
+#-----------------------------
+# a hash join whose build input is larger than HASH_JOIN_MEMORY is partitioned into temporary files,
+# and a partition of equal keys is joined in memory at HASH_JOIN_MAX_DEPTH, the result is the one of
+# a nested loop join
+#-------------------------------
+def check_hash_join_spill():
+    people_list, pets_list = make_query_tables()
+    with changed_constants(query_plan_db, HASH_JOIN_MEMORY=50):
+        result_list, num_of_spills = count_calls('spill_partitions', run_query,
+            'select people.name, pets.kind, people.age from people, pets where people.name = pets.owner and people.age < 10')
+    assert num_of_spills >= 2
+    assert result_list[0] == ['people.name', 'pets.kind', 'people.age']
+    expected_list = [[person[0], pet[1], person[1]] for person in people_list for pet in pets_list
+                     if person[0] == pet[0] and person[1] < 10]
+    assert len(expected_list) > 100
+    assert sorted(result_list[1:]) == sorted(expected_list)
+
+    with changed_constants(query_plan_db, HASH_JOIN_MEMORY=50):
+        result_list, num_of_spills = count_calls('spill_partitions', run_query,
+            'select people.name, pets.owner from people, pets where people.age = pets.age and people.age < 2')
+    assert num_of_spills > 2  # the partitions of one key are split again up to HASH_JOIN_MAX_DEPTH
+    expected_list = [[person[0], pet[0]] for person in people_list for pet in pets_list
+                     if person[1] == pet[2] and person[1] < 2]
+    assert sorted(result_list[1:]) == sorted(expected_list)
+
+
+#-----------------------------
+# a hash aggregate with more groups than HASH_AGGREGATE_MEMORY spills the records of the other groups
+# to temporary files, the result is the one of grouping the records in a dictionary
+#-------------------------------
+def aggregate_records(record_list, group_index_list, value_index):
+    group_dict = {}
+    for record in record_list:
+        group_dict.setdefault(tuple(record[i] for i in group_index_list), []).append(record[value_index])
+    return [list(group) + [len(value_list), sum(value_list), float(sum(value_list)) / len(value_list),
+                           min(value_list), max(value_list)]
+            for (group, value_list) in group_dict.items()]
+
+
+def check_hash_aggregate_spill():
+    people_list, pets_list = make_query_tables()
+    with changed_constants(query_plan_db, HASH_AGGREGATE_MEMORY=4):
+        result_list, num_of_spills = count_calls('spill_partitions', run_query,
+            'select city, count(*), sum(age), avg(age), min(age), max(age) from people group by city')
+    assert num_of_spills >= 1
+    assert result_list[0] == ['people.city', 'count(*)', 'sum(people.age)', 'avg(people.age)',
+                              'min(people.age)', 'max(people.age)']
+    assert sorted(result_list[1:]) == sorted(aggregate_records(people_list, [2], 1))
+
+    with changed_constants(query_plan_db, HASH_AGGREGATE_MEMORY=4):
+        result_list, num_of_spills = count_calls('spill_partitions', run_query,
+            'select city, age, count(*), sum(age), avg(age), min(age), max(age) from people '
+            'where age < 20 group by city, age')
+    assert num_of_spills > 16  # the partitions have more than 4 groups, so they are spilled again
+    expected_list = aggregate_records([record for record in people_list if record[1] < 20], [2, 1], 1)
+    assert len(expected_list) == 13 * 20
+    assert sorted(result_list[1:]) == sorted(expected_list)
+
+
+#-----------------------------
+# a sort of more records than SORT_MEMORY writes runs to temporary files and merges them, the result is
+# the one of sorting the records in memory by one key after another, the last key first
+#-------------------------------
+def sort_records(record_list, key_list):
+    record_list = list(record_list)
+    for (field_index, descending) in reversed(key_list):
+        record_list.sort(key=lambda record: record[field_index], reverse=descending)
+    return record_list
+
+
+def check_sort_spill():
+    people_list, pets_list = make_query_tables()
+    query_list = [  # (statement, sort keys, the age bound of the where clause)
+        ('select name, age, city from people order by city desc, age asc, name desc', [(2, True), (1, False), (0, True)], 100),
+        ('select name, age, city from people order by age desc, name desc', [(1, True), (0, True)], 100),
+        ('select name, age, city from people where age < 30 order by city, name', [(2, False), (0, False)], 30)]
+    for (sql_str, key_list, age_bound) in query_list:
+        with changed_constants(query_plan_db, SORT_MEMORY=50, SORT_RUN_BLOCK=7):
+            result_list, num_of_runs = count_calls('write_run', run_query, sql_str)
+        expected_list = sort_records([list(record) for record in people_list if record[1] < age_bound], key_list)
+        assert num_of_runs == len(expected_list) // 50, sql_str
+        assert result_list[0] == ['people.name', 'people.age', 'people.city']
+        assert result_list[1:] == expected_list, sql_str
+
+
+#-----------------------------
+# a limit over a sort keeps the first records in a heap, and a limit over an index scan stops the scan,
+# the results are the slices of the sorted records and of the records found without the limit
+#-------------------------------
+def check_limit():
+    people_list, pets_list = make_query_tables()
+    query_list = [  # (order by clause, sort keys, limit, offset)
+        ('city desc, age asc, name desc', [(2, True), (1, False), (0, True)], 5, 3),
+        ('age desc, name desc', [(1, True), (0, True)], 20, 0),
+        ('city, name', [(2, False), (0, False)], 1, 1999),
+        ('name', [(0, False)], 10, 1995)]
+    for (order_str, key_list, limit, offset) in query_list:
+        sql_str = 'select name, age, city from people order by %s limit %d offset %d' % (order_str, limit, offset)
+        expected_list = sort_records([list(record) for record in people_list], key_list)
+        assert run_query(sql_str)[1:] == expected_list[offset:offset + limit], sql_str
+
+        # the plans put a heap under a limit, so the limit over an external sort is built by hand
+        root = query_plan_db.Limit(query_plan_db.Sort(quiet(query_plan_db.Scan, 'people'), key_list), limit, offset)
+        with changed_constants(query_plan_db, SORT_MEMORY=50):
+            root.open()
+            result_list, num_of_runs = count_calls('write_run', list, iter(root.next, None))
+            root.close()
+        assert num_of_runs == 2000 // 50
+        assert [list(record) for record in result_list] == expected_list[offset:offset + limit], order_str
+
+    quiet(index_db.Index('people', 'age').create_index)
+    for (op, bound, limit, offset) in [('=', 5, 3, 2), ('>', 30, 10, 0), ('>=', 35, 200, 10), ('=', 99, 5, 0)]:
+        where_str = 'age %s %d' % (op, bound)
+        sql_str = 'select name, age from people where %s limit %d offset %d' % (where_str, limit, offset)
+        with changed_constants(query_plan_db, INDEX_FETCH_BATCH=4):
+            assert 'IndexScan' in get_plan_text(sql_str), sql_str
+            result_list = run_query(sql_str)
+            full_list = run_query('select name, age from people where %s' % where_str)
+        assert result_list[1:] == full_list[1 + offset:1 + offset + limit], sql_str
+        compare = query_plan_db.COMPARE_DICT[op]
+        assert sorted(full_list[1:]) == sorted([record[0], record[1]] for record in people_list if compare(record[1], bound))
+
+
+#-----------------------------
+# the records of strings are encoded by one % operation and the others field by field, both ways give
+# the same bytes, and a table written by insert_many is the same as one written by insert_record
+#-------------------------------
+CODEC_FIELD_LIST = [('name', 0, 10), ('age', 2, 4), ('city', 1, 6)]
+CODEC_RECORD_LIST = [  # (record, the decoded record or None if it is wrong)
+    (['abc', '23', 'x'], (b'abc', 23, b'x')),
+    ([' abc  ', ' 7 ', 'x '], (b'abc', 7, b'x')),
+    (['a' * 10, '-999', 'c' * 6], (b'a' * 10, -999, b'c' * 6)),
+    (['', '0', ''], (b'', 0, b'')),
+    (['a' * 11, '1', 'x'], None),  # the values are longer than their fields
+    (['abc', '12345', 'x'], None),
+    (['abc', '1', 'c' * 7], None),
+    (['\u00e9' * 5, '1', '\u4e2d\u6587'], (('\u00e9' * 5).encode('utf-8'), 1, '\u4e2d\u6587'.encode('utf-8'))),
+    (['\u00e9' * 6, '1', 'x'], None),  # 6 characters but 12 bytes
+    (['abc', '\u4e2d\u6587', 'x'], None),
+    (['abc', 'x1', 'x'], None),  # the int field is wrong
+    (['abc', '', 'x'], None),
+    (['abc', '1.5', 'x'], None),
+    ([b'abc', b'23', b'x'], (b'abc', 23, b'x')),  # bytes and ints are encoded field by field
+    ([b'  abc', 23, 'x'], (b'abc', 23, b'x')),
+    (['abc', -5, b'\xc3\xa9'], (b'abc', -5, '\u00e9'.encode('utf-8'))),
+    ([b'a' * 11, b'1', b'x'], None),
+    ([b'abc', b'x1', b'x'], None),
+    (['abc', '1'], None),  # the number of fields is wrong
+]
+
+
+def check_codec_round_trip():
+    codec = codec_db.RecordCodec(CODEC_FIELD_LIST)
+    decoder = codec.get_decoder()
+    page = bytearray(common_db.BLOCK_SIZE)
+    for (record, expected) in CODEC_RECORD_LIST:
+        content = codec.encode(record)
+        if expected is None:
+            assert content is None, record
+            continue
+        value_list = [codec.encode_field(i, value) for (i, value) in enumerate(record)]
+        assert content == codec.content_struct.pack(*value_list), record  # the same as field by field
+        if all(isinstance(value, str) and value.isascii() for value in record):
+            assert content == (codec.content_format % tuple(value.strip() for value in record)).encode('utf-8')
+        codec.write(page, 100, content)
+        assert codec.decode(page, 100, decoder) == expected, record
+        assert codec.decode(page, 100, codec.get_decoder([2, 0])) == (expected[2], expected[0])
+
+    record_list = [record for (record, expected) in CODEC_RECORD_LIST] * 30
+    table_1 = quiet(storage_db.Storage, 'table_1', CODEC_FIELD_LIST)
+    table_2 = quiet(storage_db.Storage, 'table_2', CODEC_FIELD_LIST)
+    num_of_wrong = sum(1 for (record, expected) in CODEC_RECORD_LIST if expected is None) * 30
+    assert quiet(table_1.insert_many, record_list) == (len(record_list) - num_of_wrong, num_of_wrong)
+    assert sum(1 for record in record_list if quiet(table_2.insert_record, record)) == len(record_list) - num_of_wrong
+    assert table_1.data_block_num > 2
+    assert list(table_1.cursor()) == [expected for (record, expected) in CODEC_RECORD_LIST if expected is not None] * 30
+    quiet(buffer_db.get_buffer_pool().flush_all)
+    with open('table_1.dat', 'rb') as file_1, open('table_2.dat', 'rb') as file_2:
+        assert file_1.read() == file_2.read()
+
+
+CHECK_LIST = [check_slot_reuse_after_delete, check_index_after_update_and_delete,
+              check_wal_replay_after_crash, check_wal_undo_after_crash, check_prepared_statement,
+              check_result_cache, check_keywords_in_names, check_index_range_search,
+              check_hash_join_spill, check_hash_aggregate_spill, check_sort_spill,
+              check_limit, check_codec_round_trip]
+
+
+# the checks are collected by pytest by these names
+def test_slot_reuse_after_delete():
+    run_in_temp_dir(check_slot_reuse_after_delete)
+
+
+def test_index_after_update_and_delete():
+    run_in_temp_dir(check_index_after_update_and_delete)
+
+
+def test_wal_replay_after_crash():
+    run_in_temp_dir(check_wal_replay_after_crash)
+
+
+def test_wal_undo_after_crash():
+    run_in_temp_dir(check_wal_undo_after_crash)
+
+
+def test_prepared_statement():
+    run_in_temp_dir(check_prepared_statement)
+
+
+def test_result_cache():
+    run_in_temp_dir(check_result_cache)
+
+
+def test_keywords_in_names():
+    run_in_temp_dir(check_keywords_in_names)
+
+
+def test_index_range_search():
+    run_in_temp_dir(check_index_range_search)
+
+
+def test_hash_join_spill():
+    run_in_temp_dir(check_hash_join_spill)
+
+
+def test_hash_aggregate_spill():
+    run_in_temp_dir(check_hash_aggregate_spill)
+
+
+def test_sort_spill():
+    run_in_temp_dir(check_sort_spill)
+
+
+def test_limit():
+    run_in_temp_dir(check_limit)
+
+
+def test_codec_round_trip():
+    run_in_temp_dir(check_codec_round_trip)
+
+
+if __name__ == '__main__':
+    test_dict()
+    for check in CHECK_LIST:
+        run_in_temp_dir(check)
+        print(check.__name__, 'passed')
@@ -0,0 +1,163 @@
+#-----------------------------------------------
+# vector_db.py
+#-----------------------------------------------
+# the module scans tables with numpy, which is optional
+#   (1) the data blocks of a table file are mapped by numpy.memmap, VECTOR_CHUNK_BLOCKS blocks
+#       at a time, and the records of the blocks are viewed as a structured array whose dtype
+#       has one field per column, see get_dtype
+#   (2) the predicates on int and bool fields and the equalities on string fields are evaluated
+#       as masks over the columns of the array
+#   (3) only the records which pass all the masks are turned into tuples
+# note: the field values are right-aligned text, so an int column is computed from its digits by
+#       array arithmetic, and a string constant is right-aligned in the same way before it is compared
+# the mode is optional and it is off by default, it is turned on by VECTOR_SCAN=True, then a full
+# scan writes the dirty blocks of its table back first and reads the file without the buffer pool,
+# so EXPLAIN ANALYZE shows no block read by it, and it is chosen before a parallel scan or read-ahead
+# usage:
+#       vector_db.VECTOR_SCAN = True
+#       if vector_db.is_enabled():
+#           for record in vector_db.scan(table_obj, [(1, operator.gt, 40, None)]):
+#               ...
+#-----------------------------------------------
+
+import os
+
+try:
+    import numpy
+except ImportError:  # the full scans read the records one by one by storage_db.Storage.cursor
+    numpy = None
+
+from common_db import BLOCK_SIZE
+from storage_db import BLOCK_HEAD_STRUCT, TOMBSTONE
+
+
+VECTOR_SCAN=False        # whether the full scans of queries are vectorized when numpy is installed
+VECTOR_CHUNK_BLOCKS=256  # the number of blocks mapped and decoded at a time
+SPACE=ord(' ')
+
+
+#------------------------------------------
+# whether the vectorized scans are used
+#-------------------------------------------
+def is_enabled():
+    return numpy is not None and VECTOR_SCAN
+
+
+#------------------------------------------
+# whether a predicate can be evaluated as a mask over the columns
+# input:
+#       codec     : the codec_db.RecordCodec of the table
+#       predicate : (field_index, op, value, other_index), see query_plan_db.Filter
+#-------------------------------------------
+def can_vectorize(codec, predicate):
+    field_index, op, value, other_index = predicate
+    field_type = codec.field_list[field_index][1]
+    if other_index is not None:
+        return field_type in (2, 3) and codec.field_list[other_index][1] == field_type
+    return field_type in (2, 3) or op == '='
+
+
+#------------------------------------------
+# the structured dtype of one record, the head of the record is skipped
+#-------------------------------------------
+def get_dtype(codec):
+    return numpy.dtype({'names': ['f%d' % i for i in range(len(codec.field_list))],
+                        'formats': ['S%d' % field[2] for field in codec.field_list],
+                        'offsets': [codec.head_len + begin for begin in codec.begin_list],
+                        'itemsize': codec.head_len + codec.content_len})
+
+
+#------------------------------------------
+# one column of the records
+# input:
+#       record_array : the structured array of the records
+#       codec
+#       field_index
+# output:
+#       an array of int64 for an int field, of bool for a bool field, or of the stored bytes for a string field
+#-------------------------------------------
+def get_column(record_array, codec, field_index):
+    field_type, length = codec.field_list[field_index][1:]
+    column = record_array['f%d' % field_index]
+    if field_type in (0, 1):
+        return column
+    byte_matrix = numpy.ascontiguousarray(column).view(numpy.uint8).reshape(len(column), length)
+    if field_type == 3:
+        return (byte_matrix != SPACE).any(axis=1)
+
+    # the digits are right-aligned, so the value is the sum of the digits multiplied by the powers of 10
+    is_digit = (byte_matrix >= ord('0')) & (byte_matrix <= ord('9'))
+    digit_matrix = numpy.where(is_digit, byte_matrix.astype(numpy.int64) - ord('0'), 0)
+    value = digit_matrix.dot(10 ** numpy.arange(length - 1, -1, -1, dtype=numpy.int64))
+    return numpy.where((byte_matrix == ord('-')).any(axis=1), -value, value)
+
+
+#------------------------------------------
+# the mask of the records which satisfy a predicate
+# input:
+#       record_array
+#       codec
+#       check : (field_index, compare, value, other_index), compare is a function of the operator module
+#-------------------------------------------
+def get_mask(record_array, codec, check):
+    field_index, compare, value, other_index = check
+    column = get_column(record_array, codec, field_index)
+    if other_index is not None:
+        return compare(column, get_column(record_array, codec, other_index))
+    if codec.field_list[field_index][1] in (0, 1):  # the constant is stored in the same way as the field
+        value = numpy.bytes_(value.rjust(codec.field_list[field_index][2]))
+    return compare(column, value)
+
+
+#------------------------------------------
+# to turn the records of a structured array into tuples, which are the same as those of Storage.cursor
+#-------------------------------------------
+def to_records(record_array, codec):
+    column_list = []
+    for field_index in range(len(codec.field_list)):
+        column = get_column(record_array, codec, field_index).tolist()
+        if codec.field_list[field_index][1] in (0, 1):
+            column = [value.strip() for value in column]
+        column_list.append(column)
+    return zip(*column_list)
+
+
+#------------------------------------------
+# to scan a table by blocks of records, the records are filtered by masks before they are turned into tuples
+# input:
+#       table_obj  : the storage_db.Storage of the table
+#       check_list : a list of (field_index, compare, value, other_index), see get_mask,
+#                    every one of them must pass can_vectorize
+# output:
+#       a generator of records in the order of Storage.cursor
+# note: the dirty blocks of the table in the buffer pool are written back first, so the map reads them too
+#-------------------------------------------
+def scan(table_obj, check_list):
+    codec = table_obj.codec
+    table_obj.buffer_pool.flush_file(table_obj.file_name)
+    num_of_blocks = min(table_obj.data_block_num + 1, os.path.getsize(table_obj.file_name) // BLOCK_SIZE)
+    if num_of_blocks <= 1:
+        return
+
+    max_num_of_records = table_obj.get_max_record_num()
+    record_area = max_num_of_records * (codec.head_len + codec.content_len)  # the records are at the end of a block
+    dtype = get_dtype(codec)
+    file_map = numpy.memmap(table_obj.file_name, dtype=numpy.uint8, mode='r', shape=(num_of_blocks, BLOCK_SIZE))
+    slot_array = numpy.arange(max_num_of_records)
+
+    for first_block in range(1, num_of_blocks, VECTOR_CHUNK_BLOCKS):
+        block_matrix = file_map[first_block:first_block + VECTOR_CHUNK_BLOCKS]
+        num_of_records = block_matrix[:, 4:8].copy().view('>i4').ravel()
+        offset_matrix = block_matrix[:, BLOCK_HEAD_STRUCT.size:BLOCK_HEAD_STRUCT.size + 4 * max_num_of_records]
+        offset_matrix = offset_matrix.copy().view('>i4')
+        is_valid = (slot_array < num_of_records[:, None]) & (offset_matrix != TOMBSTONE)  # the deleted records are skipped
+
+        # the record of slot i is the i-th from the end of its block, so the records are reversed per block
+        record_matrix = numpy.ascontiguousarray(block_matrix[:, BLOCK_SIZE - record_area:]).view(dtype)
+        record_array = record_matrix[:, ::-1][is_valid]
+        table_obj.bytes_decoded += len(record_array) * codec.content_len
+
+        for check in check_list:
+            record_array = record_array[get_mask(record_array, codec, check)]
+        for record in to_records(record_array, codec):
+            yield record
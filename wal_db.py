@@ -0,0 +1,258 @@
+#-----------------------------------------------
+# wal_db.py
+#-----------------------------------------------
+# the module is the write-ahead log of the program
+# the changed bytes of modified blocks are appended to the log before the
+# blocks are written back to .dat, .ind and all.sch files
+#   (1) a commit appends a commit record, the log is synced to disk once for a
+#       group of commits (GROUP_COMMIT_SIZE commits or GROUP_COMMIT_WINDOW seconds),
+#       a timer thread syncs the log when no later commit comes within the window
+#   (2) a checkpoint writes all the dirty blocks of the buffer pool back to
+#       their files, syncs the files and empties the log
+#   (3) a dirty block which is written back before its commit is logged with
+#       its bytes before the change (an undo record) as well
+#   (4) at startup the committed changes in the log are written to their
+#       files again, the pages after the last commit record are ignored and
+#       the undo records after it are written back in reverse order, so the
+#       blocks of an unfinished transaction are the same as before it
+#-----------------------------------------------
+
+import os
+import time
+import threading
+import atexit
+import struct
+import zlib
+
+import common_db
+import buffer_db
+from common_db import BLOCK_SIZE
+
+
+# structure of one log record
+# -------------------------------------
+# record_type|name_len|block_id|offset|data_len|file_name|data|crc
+# note: data is the changed bytes of the block beginning at offset, or the bytes before
+#       the change in an undo record, file_name and data exist only in page and undo records,
+#       crc is computed on all the bytes before it
+# -------------------------------------
+PAGE_RECORD_TYPE=1
+COMMIT_RECORD_TYPE=2
+UNDO_RECORD_TYPE=3
+RECORD_HEAD_FORMAT='!iiiii'
+RECORD_CRC_FORMAT='!I'
+
+WAL_FILE_NAME='db.wal'          # the log file in the working directory
+GROUP_COMMIT_SIZE=32            # the log is synced after so many commits
+GROUP_COMMIT_WINDOW=0.05        # or after so many seconds since the last sync
+CHECKPOINT_SIZE=1024*BLOCK_SIZE # a checkpoint is done when the log grows beyond it
+
+
+class WriteAheadLog(object):
+
+    #------------------------------
+    # constructor of the class
+    # input:
+    #       file_name   : the log file
+    #       group_size  : the number of commits per sync, 1 means syncing at every commit
+    #       window      : the maximum seconds a commit waits for its sync, the log is synced
+    #                     by a timer thread if no later commit syncs it within the window
+    #-------------------------------------
+    def __init__(self, file_name=WAL_FILE_NAME, group_size=GROUP_COMMIT_SIZE, window=GROUP_COMMIT_WINDOW):
+        self.file_name = file_name
+        self.group_size = group_size
+        self.window = window
+        self.f_handle = open(file_name, 'ab+')
+        self.pending_commits = 0  # the commits which are not synced yet
+        self.unsynced = False  # whether there are records which are not synced yet
+        self.undo_pending = False  # whether there are undo records after the last commit record
+        self.uncommitted = False  # whether there are page or undo records after the last commit record
+        self.last_sync_time = time.time()
+        self.num_of_syncs = 0
+        self.lock = threading.RLock()  # the log is synced by the timer thread too
+        self.timer = None  # the threading.Timer which syncs the pending commits
+
+    def write_record(self, record_type, file_name=b'', block_id=0, offset=0, data=b''):
+        buf = struct.pack(RECORD_HEAD_FORMAT, record_type, len(file_name), block_id, offset, len(data)) + \
+            file_name + bytes(data)
+        with self.lock:
+            self.f_handle.write(buf + struct.pack(RECORD_CRC_FORMAT, zlib.crc32(buf)))
+            self.unsynced = True
+            self.uncommitted = record_type != COMMIT_RECORD_TYPE
+
+    #------------------------------
+    # append the changed bytes of a block to the log
+    # input:
+    #       file_name
+    #       block_id
+    #       offset  : where the changed bytes begin in the block
+    #       data    : the changed bytes
+    #-------------------------------------
+    def append_page(self, file_name, block_id, offset, data):
+        self.write_record(PAGE_RECORD_TYPE, os.fsencode(file_name), block_id, offset, data)
+
+    #------------------------------
+    # append the bytes of a block before an uncommitted change to the log, it is called
+    # before the block is written back to its file
+    # input:
+    #       file_name
+    #       block_id
+    #       offset  : where the bytes begin in the block
+    #       data    : the bytes before the change
+    #-------------------------------------
+    def append_undo(self, file_name, block_id, offset, data):
+        with self.lock:
+            self.write_record(UNDO_RECORD_TYPE, os.fsencode(file_name), block_id, offset, data)
+            self.undo_pending = True
+
+    #------------------------------
+    # commit the pages appended since the last commit, the log is synced by group
+    # note: nothing is written if no page has been appended, e.g. after a query
+    #-------------------------------------
+    def commit(self):
+        with self.lock:
+            if self.f_handle.closed or not self.uncommitted:  # the log is closed at exit after the last checkpoint
+                return
+            self.write_record(COMMIT_RECORD_TYPE)
+            self.undo_pending = False
+            self.pending_commits += 1
+            if self.pending_commits >= self.group_size or time.time() - self.last_sync_time >= self.window:
+                self.sync()
+            elif self.timer is None:  # the commit is synced at the end of the window at the latest
+                self.timer = threading.Timer(self.window, self.sync_by_timer)
+                self.timer.daemon = True
+                self.timer.start()
+            if self.f_handle.tell() >= CHECKPOINT_SIZE:
+                self.checkpoint()
+
+    def sync_by_timer(self):
+        with self.lock:
+            self.timer = None
+            if self.pending_commits > 0 and not self.f_handle.closed:
+                self.sync()
+
+    #------------------------------
+    # write the log to disk
+    #-------------------------------------
+    def sync(self):
+        with self.lock:
+            if self.unsynced:
+                self.f_handle.flush()
+                os.fsync(self.f_handle.fileno())
+                self.num_of_syncs += 1
+            self.unsynced = False
+            self.pending_commits = 0
+            self.last_sync_time = time.time()
+
+    #------------------------------
+    # write the dirty blocks back to their files and empty the log
+    # note: the log is kept if a transaction is not committed yet, since its undo records are
+    #       needed to undo the blocks written back
+    #-------------------------------------
+    def checkpoint(self):
+        with self.lock:
+            self.sync()
+            buffer_db.get_buffer_pool().sync_all()
+            if self.undo_pending:
+                self.sync()
+                return
+            self.f_handle.seek(0)
+            self.f_handle.truncate(0)
+            self.f_handle.flush()
+            os.fsync(self.f_handle.fileno())
+
+    #------------------------------
+    # write the committed changes in the log to the files again
+    # output:
+    #       the number of committed transactions which are replayed
+    #-------------------------------------
+    def replay(self):
+        pool = buffer_db.get_buffer_pool()
+        head_len = struct.calcsize(RECORD_HEAD_FORMAT)
+        crc_len = struct.calcsize(RECORD_CRC_FORMAT)
+        num_of_commits = 0
+        page_list = []  # the pages after the last commit record
+        undo_list = []  # the undo records after the last commit record
+
+        self.f_handle.seek(0)
+        while True:
+            head = self.f_handle.read(head_len)
+            if len(head) < head_len:
+                break
+            record_type, name_len, block_id, offset, data_len = struct.unpack(RECORD_HEAD_FORMAT, head)
+            body_len = name_len + data_len
+            body = self.f_handle.read(body_len)
+            crc = self.f_handle.read(crc_len)
+            if len(body) < body_len or len(crc) < crc_len or \
+                    struct.unpack(RECORD_CRC_FORMAT, crc)[0] != zlib.crc32(head + body):
+                print('the log is broken after', num_of_commits, 'commits, the rest is ignored')
+                break
+
+            if record_type == PAGE_RECORD_TYPE:
+                page_list.append((body[:name_len], block_id, offset, body[name_len:]))
+            elif record_type == UNDO_RECORD_TYPE:
+                undo_list.append((body[:name_len], block_id, offset, body[name_len:]))
+            elif record_type == COMMIT_RECORD_TYPE:
+                write_pages(pool, page_list)
+                page_list = []
+                undo_list = []
+                num_of_commits += 1
+
+        # the blocks of the unfinished transaction are undone, the last change first
+        write_pages(pool, reversed(undo_list))
+        self.undo_pending = False
+
+        self.f_handle.seek(0, os.SEEK_END)
+        if num_of_commits > 0:
+            print(num_of_commits, 'committed transactions are replayed from', self.file_name)
+        if undo_list:
+            print(len(undo_list), 'changes of an unfinished transaction are undone')
+        pool.commit()  # the blocks written again are committed, so the checkpoint does not log them as undone
+        self.checkpoint()
+        return num_of_commits
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.sync()
+            self.f_handle.close()
+
+
+#------------------------------------------
+# to write the bytes of log records into their blocks through the buffer pool
+# input:
+#       pool        : the buffer_db.BufferPool
+#       page_list   : a list of (file_name, block_id, offset, data)
+#-------------------------------------------
+def write_pages(pool, page_list):
+    for (file_name, block_id, offset, data) in page_list:
+        page = pool.pin(file_name, block_id)
+        page[offset:offset + len(data)] = data
+        pool.unpin(file_name, block_id, True)
+
+
+#------------------------------------------
+# to get the global_wal in common_db.py, it is created at the first call
+#-------------------------------------------
+def get_wal():
+    if common_db.global_wal is None:
+        common_db.global_wal = WriteAheadLog()
+        atexit.register(checkpoint_at_exit)
+    return common_db.global_wal
+
+
+#------------------------------------------
+# the dirty blocks are written back when the program exits
+#-------------------------------------------
+def checkpoint_at_exit():
+    if common_db.global_wal is not None:
+        common_db.global_wal.checkpoint()
+
+
+#------------------------------------------
+# to replay the log at startup, it is called before any table is opened
+#-------------------------------------------
+def recover():
+    return get_wal().replay()